@@ -0,0 +1,542 @@
+"""
+JSON API server module.
+
+Serves users, habits, completions and analytics over HTTP/JSON (e.g. for dashboards and mobile sync):
+- stdlib asyncio HTTP/1.1 server with keep-alive, no external dependencies
+- blocking SQLite work runs on a bounded thread pool
+- every request runs on its own connection from a ConnectionPool
+- request latency metrics per route, served at GET /metrics
+- reuses the Database facade and the core classes: streaks and analytics behave exactly like in the cli
+
+Endpoints:
+    GET    /users
+    POST   /users                                            {"username": "..."}
+    GET    /users/{user_id}
+    GET    /users/{user_id}/habits                           optional ?frequency=daily|weekly
+    POST   /users/{user_id}/habits                           {"name": "...", "frequency": "daily|weekly"}
+    GET    /users/{user_id}/habits/{habit_name}
+    POST   /users/{user_id}/habits/{habit_name}/completions  optional {"date": "YYYY-MM-DD"} (defaults to today)
+    DELETE /users/{user_id}/habits/{habit_name}/completions/{YYYY-MM-DD}
+    GET    /users/{user_id}/analytics
+    GET    /metrics
+
+Run:
+    python -m api.server --db habit_tracker.db --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from core.analytics import Analytics
+from core.habit import Habit
+from core.periods import FREQUENCIES, is_frequency
+from core.user import User
+from db_and_managers.connection_pool import ConnectionPool
+from db_and_managers.database import Database
+from db_and_managers import manager_habit_db as habit_db
+from db_and_managers import manager_user_db as user_db
+from helpers.helper_functions import transaction
+
+# Largest accepted request body (bytes)
+MAX_BODY_SIZE = 64 * 1024
+
+
+class ApiError(Exception):
+    """
+    An error answered to the client as a JSON error response.
+
+    Attributes:
+        status:  An integer HTTP status code.
+        message: A string describing the error.
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initializes the ApiError with its HTTP status and message."""
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LatencyMetrics:
+    """
+    Request-level latency metrics per route.
+
+    - keeps the count, error count, total and maximum latency of every route
+    - keeps the most recent latencies of every route for percentiles
+
+    Attributes:
+        sample_size: An integer as the number of recent latencies kept per route.
+    """
+
+    def __init__(self, sample_size: int = 1000) -> None:
+        """Initializes empty metrics."""
+        self.sample_size = sample_size
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: str, seconds: float, status: int) -> None:
+        """
+        Records one request.
+
+        Args:
+            route:   The route name.
+            seconds: The request latency.
+            status:  The HTTP status code of the response.
+        """
+        stats = self._routes.setdefault(route, {
+            "count": 0, "errors": 0, "total": 0.0, "max": 0.0, "samples": deque(maxlen=self.sample_size)
+        })
+        stats["count"] += 1
+        stats["errors"] += status >= 500
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        stats["samples"].append(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarizes the metrics of every route.
+
+        Returns:
+            A dict of route name -> count, errors, average, maximum and p50/p95/p99 latencies in milliseconds.
+        """
+        return {
+            route: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total"] / stats["count"] * 1000, 3),
+                "max_ms": round(stats["max"] * 1000, 3),
+                "p50_ms": _percentile(stats["samples"], 50),
+                "p95_ms": _percentile(stats["samples"], 95),
+                "p99_ms": _percentile(stats["samples"], 99),
+            }
+            for route, stats in self._routes.items()
+        }
+
+def _percentile(samples: Deque[float], percent: int) -> float:
+    """Returns the given percentile of the samples in milliseconds."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return round(ordered[index] * 1000, 3)
+
+
+class ApiServer:
+    """
+    The asyncio HTTP/JSON server over the Database facade.
+
+    Attributes:
+        db_filepath: A string representing the path to the SQLite database file.
+        host:        A string as the interface to listen on.
+        port:        An integer as the port to listen on (0 picks a free port, updated on start).
+        db:          The Database instance serving the requests.
+        pool:        The ConnectionPool handing out one connection per request.
+        metrics:     The LatencyMetrics of all requests.
+    """
+
+    def __init__(self, db_filepath: str = "habit_tracker.db", host: str = "127.0.0.1", port: int = 8080,
+                 max_workers: int = 8) -> None:
+        """
+        Initializes the server, its thread pool and its connection pool.
+
+        Args:
+            db_filepath: Path to the SQLite database file.
+            host:        Interface to listen on.
+            port:        Port to listen on.
+            max_workers: Number of worker threads and pooled connections.
+        """
+        self.db_filepath = db_filepath
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+
+        self.db = Database(db_filepath) # Creates the tables if needed
+        self.pool = ConnectionPool(db_filepath, size=max_workers)
+        self.metrics = LatencyMetrics()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api-worker")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        # (method, path pattern, route name, handler)
+        self._routes: List[Tuple[str, re.Pattern, str, Callable]] = [
+            ("GET", re.compile(r"/users"), "list_users", self._list_users),
+            ("POST", re.compile(r"/users"), "create_user", self._create_user),
+            ("GET", re.compile(r"/users/(\d+)"), "get_user", self._get_user),
+            ("GET", re.compile(r"/users/(\d+)/habits"), "list_habits", self._list_habits),
+            ("POST", re.compile(r"/users/(\d+)/habits"), "create_habit", self._create_habit),
+            ("GET", re.compile(r"/users/(\d+)/habits/([^/]+)"), "get_habit", self._get_habit),
+            ("POST", re.compile(r"/users/(\d+)/habits/([^/]+)/completions"), "add_completion",
+             self._add_completion),
+            ("DELETE", re.compile(r"/users/(\d+)/habits/([^/]+)/completions/([^/]+)"), "delete_completion",
+             self._delete_completion),
+            ("GET", re.compile(r"/users/(\d+)/analytics"), "analytics", self._analytics),
+        ]
+
+    # ------------------
+    # Server lifecycle
+    # ------------------
+    async def start(self) -> None:
+        """Starts listening; the actual port is available in self.port afterwards."""
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Starts the server (if needed) and serves until canceled."""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stops listening and releases the worker threads and connections."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    # ------------------
+    # HTTP handling
+    # ------------------
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Reads requests from one client connection and answers them until the client is done."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request."}, False)
+                    break
+
+                # Headers
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                # Body
+                content_length = headers.get("content-length") or "0"
+                if not (content_length.isascii() and content_length.isdigit()):
+                    await self._write_response(writer, HTTPStatus.BAD_REQUEST,
+                                               {"error": "Invalid Content-Length header."}, False)
+                    break
+                length = int(content_length)
+                if length > MAX_BODY_SIZE:
+                    await self._write_response(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                               {"error": "Request body too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._dispatch(method.upper(), target, body)
+
+                # HTTP/1.1 keeps the connection open unless the client asks otherwise
+                connection_header = headers.get("connection", "").lower()
+                keep_alive = connection_header != "close" if version == "HTTP/1.1" else connection_header == "keep-alive"
+
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # Client went away or sent garbage
+        finally:
+            writer.close()
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        """Writes one JSON response."""
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        """
+        Routes one request and runs its handler on the thread pool.
+
+        Returns:
+            A tuple of (HTTP status, JSON payload).
+        """
+        start = time.perf_counter()
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        route_name = "unknown"
+
+        if method == "GET" and path == "/metrics":
+            route_name = "metrics"
+            status, payload = HTTPStatus.OK, self.metrics.snapshot()
+        else:
+            route_name, handler, params, status, payload = self._route(method, path)
+
+            if handler is not None:
+                try:
+                    data = json.loads(body) if body else {}
+                except ValueError:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": "Invalid JSON body."}
+                else:
+                    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+                    # Bounded: at most max_workers requests wait on the db at once
+                    async with self._slots:
+                        status, payload = await asyncio.get_running_loop().run_in_executor(
+                            self._executor, self._run_handler, handler, params, query, data
+                        )
+
+        self.metrics.record(route_name, time.perf_counter() - start, status)
+        return status, payload
+
+    def _route(self, method: str, path: str) -> Tuple[str, Optional[Callable], List[str], int, Any]:
+        """
+        Finds the handler of a request.
+
+        Returns:
+            A tuple of (route name, handler or None, path parameters, error status, error payload).
+        """
+        path_matches = False
+        for route_method, pattern, route_name, handler in self._routes:
+            match = pattern.fullmatch(path)
+            if match:
+                path_matches = True
+                if route_method == method:
+                    return route_name, handler, [unquote(param) for param in match.groups()], HTTPStatus.OK, None
+
+        if path_matches:
+            return "unknown", None, [], HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Method not allowed."}
+        return "unknown", None, [], HTTPStatus.NOT_FOUND, {"error": "Not found."}
+
+    def _run_handler(self, handler: Callable, params: List[str], query: Dict[str, str], data: Any) -> Tuple[int, Any]:
+        """Runs a handler on a worker thread with its own pooled connection."""
+        try:
+            with self.pool.connection():
+                return handler(params, query, data)
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except TimeoutError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+
+    # ------------------
+    # Handlers (run on worker threads)
+    # ------------------
+    def _list_users(self, params, query, data) -> Tuple[int, Any]:
+        """GET /users"""
+        return HTTPStatus.OK, [_user_json(user) for user in self.db.load_users()]
+
+    def _create_user(self, params, query, data) -> Tuple[int, Any]:
+        """POST /users"""
+        username = _required_str(data, "username").title() # Same normalization as the cli
+        if user_db.username_exists(username):
+            raise ApiError(HTTPStatus.CONFLICT, f"Username '{username}' already exists.")
+
+        user = User(username=username)
+        try:
+            self.db.save_user(user)
+        except sqlite3.IntegrityError:
+            # Another request created the same username in between (the pool rolls the connection back)
+            raise ApiError(HTTPStatus.CONFLICT, f"Username '{username}' already exists.") from None
+        return HTTPStatus.CREATED, _user_json(user)
+
+    def _get_user(self, params, query, data) -> Tuple[int, Any]:
+        """GET /users/{user_id}"""
+        user = self._load_user(params[0])
+        return HTTPStatus.OK, _user_json(user)
+
+    def _list_habits(self, params, query, data) -> Tuple[int, Any]:
+        """GET /users/{user_id}/habits"""
+        user = self._load_user(params[0], with_habits=True)
+        analytics = Analytics(user)
+        frequency = query.get("frequency")
+        habits = analytics.list_habits_by_periodicity(frequency) if frequency else analytics.list_all_habits()
+        return HTTPStatus.OK, [_habit_json(habit) for habit in habits]
+
+    def _create_habit(self, params, query, data) -> Tuple[int, Any]:
+        """POST /users/{user_id}/habits"""
+        user = self._load_user(params[0])
+        name = _required_str(data, "name").title() # Same normalization as the cli
+        frequency = _required_str(data, "frequency").lower()
+
+        if not is_frequency(frequency):
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Frequency must be one of {', '.join(FREQUENCIES)} or '<N>-day'.")
+        if habit_db.habit_name_exists(user, name):
+            raise ApiError(HTTPStatus.CONFLICT, f"Habit '{name}' already exists.")
+
+        habit = Habit()
+        habit.name = name
+        habit.frequency = frequency
+        habit.create_date()
+        self.db.save_habits(user, new_habit=habit)
+        return HTTPStatus.CREATED, _habit_json(habit)
+
+    def _get_habit(self, params, query, data) -> Tuple[int, Any]:
+        """GET /users/{user_id}/habits/{habit_name}"""
+        user = self._load_user(params[0], with_habits=True)
+        habit = _find_habit(user, params[1])
+        return HTTPStatus.OK, _habit_json(habit, with_completions=True)
+
+    def _add_completion(self, params, query, data) -> Tuple[int, Any]:
+        """POST /users/{user_id}/habits/{habit_name}/completions"""
+        completion_date = _parse_date(data.get("date")) if data.get("date") else datetime.now().date()
+        if completion_date > datetime.now().date():
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Future dates can't be completed.")
+
+        # Load, check and save under the write lock: concurrent requests can't overwrite each other's dates
+        with transaction(immediate=True):
+            user = self._load_user(params[0], with_habits=True)
+            habit = _find_habit(user, params[1])
+            if not self.db.add_completion(user, habit, completion_date):
+                raise ApiError(HTTPStatus.CONFLICT, f"'{habit.name}' is already completed for {completion_date}.")
+
+        return HTTPStatus.CREATED, _habit_json(habit)
+
+    def _delete_completion(self, params, query, data) -> Tuple[int, Any]:
+        """DELETE /users/{user_id}/habits/{habit_name}/completions/{date}"""
+        completion_date = _parse_date(params[2])
+
+        # Same read-modify-write as _add_completion()
+        with transaction(immediate=True):
+            user = self._load_user(params[0], with_habits=True)
+            habit = _find_habit(user, params[1])
+            if not self.db.remove_completion(user, habit, completion_date):
+                raise ApiError(HTTPStatus.NOT_FOUND, f"'{habit.name}' has no completion on {completion_date}.")
+
+        return HTTPStatus.OK, _habit_json(habit)
+
+    def _analytics(self, params, query, data) -> Tuple[int, Any]:
+        """GET /users/{user_id}/analytics"""
+        user = self._load_user(params[0], with_habits=True)
+        if not user.habits:
+            return HTTPStatus.OK, {"habits": 0}
+
+        analytics = Analytics(user)
+        longest_name, longest_streak = analytics.longest_streak_all_habits()
+        most_name, most_count = analytics.most_completed_habit()
+        least_name, least_count = analytics.least_completed_habit()
+
+        by_periodicity = {}
+        for periodicity in _frequencies_of(user.habits):
+            name, streak = analytics.longest_streak_by_periodicity(periodicity)
+            most_p_name, most_p_count = analytics.most_completed_by_periodicity(periodicity)
+            least_p_name, least_p_count = analytics.least_completed_by_periodicity(periodicity)
+            by_periodicity[periodicity] = {
+                "longest_streak": {"habit": name, "streak": streak},
+                "most_completed": {"habit": most_p_name, "completions": most_p_count},
+                "least_completed": {"habit": least_p_name, "completions": least_p_count},
+                "average_streak": round(analytics.average_streak_by_periodicity(periodicity), 2),
+            }
+
+        return HTTPStatus.OK, {
+            "habits": len(user.habits),
+            "longest_streak": {"habit": longest_name, "streak": longest_streak},
+            "most_completed": {"habit": most_name, "completions": most_count},
+            "least_completed": {"habit": least_name, "completions": least_count},
+            "average_streak": round(analytics.average_streak_all_habits(), 2),
+            "by_periodicity": by_periodicity,
+        }
+
+    def _load_user(self, user_id: str, with_habits: bool = False) -> User:
+        """Loads a user (and optionally their habits) or answers 404."""
+        user = self.db.load_user(int(user_id))
+        if user is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No user with ID {user_id}.")
+        if with_habits:
+            self.db.load_habits(user)
+        return user
+
+# ------------------
+# JSON helpers
+# ------------------
+def _user_json(user: User) -> Dict[str, Any]:
+    """Converts a User to its JSON representation."""
+    return {"user_id": user.user_id, "username": user.username}
+
+def _habit_json(habit: Habit, with_completions: bool = False) -> Dict[str, Any]:
+    """Converts a Habit to its JSON representation."""
+    habit_data = {
+        "name": habit.name,
+        "frequency": habit.frequency,
+        "creation_date": habit.creation_date.isoformat(),
+        "completions_count": habit.completions_count,
+        "current_streak": habit.streaks.current_streak,
+        "longest_streak": habit.streaks.longest_streak,
+        "broken_streak_lengths": list(habit.streaks.broken_streak_lengths),
+    }
+    if with_completions:
+        habit_data["completion_dates"] = [completion.isoformat() for completion in sorted(habit.completion_dates)]
+    return habit_data
+
+def _frequencies_of(habits: List[Habit]) -> List[str]:
+    """The frequencies of the given habits: built-in ones in their usual order, then the N-day cycles by N."""
+    present = {habit.frequency for habit in habits if is_frequency(habit.frequency)}
+    cycles = sorted(present.difference(FREQUENCIES), key=lambda frequency: int(frequency.split("-")[0]))
+    return [frequency for frequency in FREQUENCIES if frequency in present] + cycles
+
+def _find_habit(user: User, habit_name: str) -> Habit:
+    """Finds a user's habit by name (case-insensitive) or answers 404."""
+    habit = next((h for h in user.habits if h.name.lower() == habit_name.strip().lower()), None)
+    if habit is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No habit named '{habit_name}'.")
+    return habit
+
+def _required_str(data: Any, key: str) -> str:
+    """Reads a required non-empty string field from a JSON body or answers 400."""
+    value = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Field '{key}' is required.")
+    return value.strip()
+
+def _parse_date(value: Any):
+    """Parses a YYYY-MM-DD date or answers 400."""
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid date '{value}', expected YYYY-MM-DD.") from None
+
+def main() -> None:
+    """Command-line entry point: python -m api.server"""
+    parser = argparse.ArgumentParser(description="HabitTracker JSON API server")
+    parser.add_argument("--db", default="habit_tracker.db", help="SQLite database file")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=8, help="worker threads and pooled db connections")
+    args = parser.parse_args()
+
+    server = ApiServer(args.db, args.host, args.port, args.workers)
+
+    async def run():
+        await server.start()
+        print(f"HabitTracker API listening on http://{server.host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+"Complete today" latency benchmark.
+
+Measures the in-memory check-off path used by Database.complete_habit_today() for growing histories:
+- the O(1) "already completed this period?" check
+- appending today's date and the CASE 1 streak update
+
+Run from the project root:
+    python -m benchmarks.bench_complete_today [--repeat N] [--max-ratio R]
+
+Expected: flat latency per check-off from 10 to 100,000 completions. The period index is built once per habit
+(on the first check-off, like when a habit is first checked in the app): an untimed warm-up check-off builds it.
+The run fails if the slowest size is more than --max-ratio times slower than the fastest.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from core.habit import Habit
+from db_and_managers.manager_completion_db import apply_completion, is_duplicate_completion
+
+HISTORY_SIZES = [10, 100, 1_000, 10_000, 100_000]
+
+
+def _habit_with_history(frequency: str, size: int) -> Habit:
+    """Creates a habit with one completion per period, ending in the period before today's."""
+    step = 7 if frequency == "weekly" else 1
+    today = datetime.now().date()
+
+    habit = Habit()
+    habit.name = f"{frequency.title()} {size}"
+    habit.frequency = frequency
+    habit.completion_dates = [today - timedelta(days=step * offset) for offset in range(size, 0, -1)]
+    habit.streaks.get_current_streak(frequency, habit.completion_dates, sample_data=True)
+    return habit
+
+def _time_check_off(habit: Habit, repeat: int) -> float:
+    """
+    Times check-offs for today, undoing each one afterwards.
+
+    - one untimed warm-up check-off first: it builds the period index (a one-time cost per habit)
+
+    Returns:
+        The average latency of one check-off in microseconds.
+    """
+    today = datetime.now().date()
+    current_streak = habit.streaks.current_streak
+    longest_streak = habit.streaks.longest_streak
+
+    def undo() -> None:
+        habit.completion_dates.pop()
+        habit.streaks.current_streak = current_streak
+        habit.streaks.longest_streak = longest_streak
+
+    if not is_duplicate_completion(habit, today):
+        apply_completion(habit, today)
+    undo()
+
+    elapsed = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if not is_duplicate_completion(habit, today):
+            apply_completion(habit, today)
+        elapsed += time.perf_counter() - start
+
+        # Undo outside the timed section
+        undo()
+
+    return elapsed / repeat * 1_000_000
+
+def run(repeat: int = 1_000) -> List[dict]:
+    """
+    Runs the benchmark for daily and weekly habits of every history size.
+
+    Args:
+        repeat: Check-offs timed per habit.
+    Returns:
+        A list of dicts with frequency, size and average latency in microseconds.
+    """
+    results = []
+    for frequency in ["daily", "weekly"]:
+        for size in HISTORY_SIZES:
+            habit = _habit_with_history(frequency, size)
+            results.append({"frequency": frequency, "size": size, "us": _time_check_off(habit, repeat)})
+    return results
+
+def latency_ratios(results: List[dict]) -> Dict[str, float]:
+    """
+    The slowest latency divided by the fastest one, per frequency (1.0 is perfectly flat).
+
+    Args:
+        results: The results of run().
+    Returns:
+        The ratio by frequency.
+    """
+    latencies: Dict[str, List[float]] = {}
+    for result in results:
+        latencies.setdefault(result["frequency"], []).append(result["us"])
+    return {frequency: max(values) / min(values) for frequency, values in latencies.items()}
+
+def main() -> None:
+    """Command-line entry point: python -m benchmarks.bench_complete_today"""
+    parser = argparse.ArgumentParser(description="'Complete today' latency per history size")
+    parser.add_argument("--repeat", type=int, default=1_000, help="check-offs timed per habit")
+    parser.add_argument("--max-ratio", type=float, default=3.0, help="largest allowed slowest/fastest latency ratio")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print(f"{'frequency':<10} {'completions':>12} {'us/check-off':>14}")
+    for result in results:
+        print(f"{result['frequency']:<10} {result['size']:>12,} {result['us']:>14.2f}")
+
+    ratios = latency_ratios(results)
+    print()
+    for frequency, ratio in ratios.items():
+        print(f"{frequency:<10} slowest/fastest: {ratio:.2f}x")
+    if max(ratios.values()) > args.max_ratio:
+        raise SystemExit(f"Latency isn't flat: more than {args.max_ratio}x between history sizes.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Day bitmap benchmark.
+
+Measures streak recalculation (CASE 2) and one calendar month of a daily habit for each history representation:
+- dates: the period id loop and a scan over the date objects (plain list of dates)
+- bitmap: runs of set bits and a shifted window of the habit's day bitmap (CompletionDates)
+
+Run from the project root:
+    python -m benchmarks.bench_day_bitmap [--repeat N]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from core.completion_dates import CompletionDates
+from core.streaks import Streaks
+from db_and_managers.blob_codec import encode_dates
+
+HISTORY_SIZES = [30, 365, 1_825, 3_650]
+
+
+def _time(function, repeat: int) -> float:
+    """
+    Times a function without arguments.
+
+    Returns:
+        The average latency in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+def run(repeat: int = 200) -> List[dict]:
+    """
+    Runs the benchmark for every history size.
+
+    Args:
+        repeat: Calculations timed per size and representation.
+    Returns:
+        A list of dicts with size, column bytes and average streak and calendar latencies per representation.
+    """
+    today = datetime.now().date()
+    results = []
+    for size in HISTORY_SIZES:
+        # Every 7th day missed: many short runs
+        dates = [today - timedelta(days=offset) for offset in range(size, -1, -1) if offset % 7]
+        completion_dates = CompletionDates(dates)
+        completion_dates.bitmap() # Kept current by the habit once built
+
+        streaks = Streaks()
+        results.append({
+            "size": size,
+            "storage": "dates",
+            "bytes": len(encode_dates(dates, binary=True, bitmap=False)),
+            "streak_us": _time(lambda: streaks._get_current_streak_case_2("daily", dates), repeat),
+            "calendar_us": _time(lambda: [d.day for d in dates if d.year == today.year and d.month == today.month],
+                                 repeat),
+        })
+        results.append({
+            "size": size,
+            "storage": "bitmap",
+            "bytes": len(encode_dates(completion_dates, binary=True, bitmap=True)),
+            "streak_us": _time(lambda: streaks._get_current_streak_case_2("daily", completion_dates), repeat),
+            "calendar_us": _time(lambda: completion_dates.bitmap().days_in_month(today.year, today.month), repeat),
+        })
+    return results
+
+def main() -> None:
+    """Command-line entry point: python -m benchmarks.bench_day_bitmap"""
+    parser = argparse.ArgumentParser(description="Daily streaks and calendar months: date lists vs day bitmaps")
+    parser.add_argument("--repeat", type=int, default=200, help="calculations timed per size and representation")
+    args = parser.parse_args()
+
+    print(f"{'completions':>12} {'storage':<8} {'bytes':>8} {'streaks us':>11} {'calendar us':>12}")
+    for result in run(args.repeat):
+        print(f"{result['size']:>12,} {result['storage']:<8} {result['bytes']:>8,} "
+              f"{result['streak_us']:>11.1f} {result['calendar_us']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Column decoding benchmark.
+
+Measures how long loading one habit's completion dates and streak history takes for each column encoding:
+- text: comma separated dates and lengths (legacy rows)
+- blob: packed uint32 BLOBs read through a memoryview (config.DB_BLOB_ENCODING)
+
+Run from the project root:
+    python -m benchmarks.bench_decode [--repeat N]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from db_and_managers.blob_codec import decode_dates, decode_lengths, encode_dates, encode_lengths
+
+HISTORY_SIZES = [30, 365, 1_825]
+
+
+def _time_decode(dates_value, lengths_value, repeat: int) -> float:
+    """
+    Times decoding both columns.
+
+    Returns:
+        The average latency in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decode_dates(dates_value)
+        decode_lengths(lengths_value)
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+def run(repeat: int = 200) -> List[dict]:
+    """
+    Runs the benchmark for every history size.
+
+    Args:
+        repeat: Decodes timed per size and encoding.
+    Returns:
+        A list of dicts with size, column bytes and average latency per encoding.
+    """
+    today = datetime.now().date()
+    results = []
+    for size in HISTORY_SIZES:
+        dates = [today - timedelta(days=offset) for offset in range(size, 0, -1)]
+        lengths = list(range(1, size // 10 + 1))
+
+        for encoding, binary in [("text", False), ("blob", True)]:
+            dates_value = encode_dates(dates, binary)
+            lengths_value = encode_lengths(lengths, binary)
+            results.append({
+                "size": size,
+                "encoding": encoding,
+                "bytes": len(dates_value) + len(lengths_value),
+                "us": _time_decode(dates_value, lengths_value, repeat),
+            })
+    return results
+
+def main() -> None:
+    """Command-line entry point: python -m benchmarks.bench_decode"""
+    parser = argparse.ArgumentParser(description="Completion and streak history decoding per encoding")
+    parser.add_argument("--repeat", type=int, default=200, help="decodes timed per size and encoding")
+    args = parser.parse_args()
+
+    print(f"{'completions':>12} {'encoding':<9} {'bytes':>8} {'us/habit':>10}")
+    for result in run(args.repeat):
+        print(f"{result['size']:>12,} {result['encoding']:<9} {result['bytes']:>8,} {result['us']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
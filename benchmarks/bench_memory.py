@@ -0,0 +1,101 @@
+"""
+Memory benchmark for the core models.
+
+Measures the bytes allocated per loaded habit (Habit, Streaks, completion dates and broken streak history)
+for a tenant-sized working set, next to a baseline of the previous dict-backed models with plain lists.
+
+Run from the project root:
+    python -m benchmarks.bench_memory [--habits N] [--completions N]
+"""
+
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from core.habit import Habit
+
+
+class _DictStreaks:
+    """Baseline: the previous dict-backed Streaks layout."""
+
+    def __init__(self):
+        self.current_streak = 0
+        self.longest_streak = 0
+        self.broken_streak_lengths = []
+
+
+class _DictHabit:
+    """Baseline: the previous dict-backed Habit layout."""
+
+    def __init__(self):
+        self.name = None
+        self.frequency = None
+        self.creation_date = None
+        self.completion_dates = []
+        self._completion_loader = None
+        self._stored_completions_count = None
+        self.streaks = _DictStreaks()
+
+
+def _fill(habit, index: int, completions: int) -> None:
+    """Gives a habit a name, a frequency, completion dates and a broken streak history."""
+    today = datetime.now().date()
+    habit.name = f"Habit {index}"
+    habit.frequency = "daily"
+    habit.creation_date = today - timedelta(days=completions)
+    habit.completion_dates = [today - timedelta(days=offset) for offset in range(completions, 0, -1)]
+    habit.streaks.current_streak = completions
+    habit.streaks.longest_streak = completions
+    habit.streaks.broken_streak_lengths = [3, 5, 8, 13]
+
+def _bytes_per_habit(factory: Callable[[], object], habits: int, completions: int) -> float:
+    """
+    Measures the memory allocated for many habits.
+
+    Returns:
+        The average number of bytes per habit.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    working_set: List[object] = []
+    for index in range(habits):
+        habit = factory()
+        _fill(habit, index, completions)
+        working_set.append(habit)
+
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return allocated / habits
+
+def run(habits: int = 10_000, completions: int = 30) -> List[dict]:
+    """
+    Runs the benchmark for the baseline and the current models.
+
+    Args:
+        habits: Habits in the working set.
+        completions: Completion dates per habit.
+    Returns:
+        A list of dicts with the model name and the bytes per habit.
+    """
+    return [
+        {"model": "dict-backed (baseline)", "bytes": _bytes_per_habit(_DictHabit, habits, completions)},
+        {"model": "current", "bytes": _bytes_per_habit(Habit, habits, completions)},
+    ]
+
+def main() -> None:
+    """Command-line entry point: python -m benchmarks.bench_memory"""
+    parser = argparse.ArgumentParser(description="Bytes per loaded habit")
+    parser.add_argument("--habits", type=int, default=10_000, help="habits in the working set")
+    parser.add_argument("--completions", type=int, default=30, help="completion dates per habit")
+    args = parser.parse_args()
+
+    print(f"{'model':<26} {'bytes/habit':>12}")
+    for result in run(args.habits, args.completions):
+        print(f"{result['model']:<26} {result['bytes']:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Sharding benchmark.
+
+Measures the write throughput of parallel writers against one db file and against sharded dbs (see sharding.py):
+- every writer thread checks off habits of its own users, one commit per check-off
+- with one file, every commit waits for the single db lock; with shards, writers of different shards don't
+- reports check-offs per second for every shard count
+
+Run from the project root:
+    python -m benchmarks.bench_shards [--shards 1 2 4] [--writers N] [--writes N] [--dir PATH]
+
+The result depends on the disk: commits are bounded by fsync latency, which shards overlap.
+Use --dir to run on the disk the db lives on (the default is the system's temporary directory).
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import List
+
+from core.habit import Habit
+from core.user import User
+from db_and_managers.manager_habit_db import habit_state
+from db_and_managers.sharding import ShardedBackend
+
+
+def _writer(backend: ShardedBackend, users: List[User], writes: int, start: threading.Barrier) -> None:
+    """Checks off the habits of the given users in turn, one transaction per check-off."""
+    habits = {user.user_id: backend.load_habits(user)[0] for user in users}
+    start.wait()
+    for write_nr in range(writes):
+        user = users[write_nr % len(users)]
+        habit = habits[user.user_id]
+        habit.completion_dates.append(date(2000, 1, 1) + timedelta(days=write_nr))
+        backend.save_habit_states([habit_state(user, habit)])
+
+def run(shards: int, writers: int = 8, writes: int = 200, directory: str = None) -> float:
+    """
+    Runs the parallel writers against a new sharded db.
+
+    Args:
+        shards: Number of shard files.
+        writers: Writer threads.
+        writes: Check-offs per writer.
+        directory: Where to create the db files (None: a temporary directory).
+    Returns:
+        Check-offs per second.
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as db_dir:
+        backend = ShardedBackend(os.path.join(db_dir, "bench_shards.db"), shards)
+
+        # Every writer owns users on one shard, the writers are spread over the shards evenly
+        users_by_shard = {shard: [] for shard in range(shards)}
+        user_nr = 0
+        while min(len(users) for users in users_by_shard.values()) < writers:
+            user = User(username=f"User {user_nr:05}")
+            backend.save_user(user)
+            habit = Habit()
+            habit.name = "Check-Off"
+            habit.frequency = "daily"
+            habit.create_date()
+            backend.save_habits(user, habit)
+            users_by_shard[backend.shard_of(user.user_id)].append(user)
+            user_nr += 1
+
+        start = threading.Barrier(writers + 1)
+        threads = [
+            threading.Thread(target=_writer, args=(backend, [users_by_shard[writer_nr % shards][writer_nr // shards]],
+                                                   writes, start))
+            for writer_nr in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        backend.close()
+    return writers * writes / elapsed
+
+def main() -> None:
+    """Command-line entry point: python -m benchmarks.bench_shards"""
+    parser = argparse.ArgumentParser(description="Parallel write throughput by number of shards")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="shard counts to compare")
+    parser.add_argument("--writers", type=int, default=8, help="writer threads")
+    parser.add_argument("--writes", type=int, default=200, help="check-offs per writer")
+    parser.add_argument("--dir", default=None, help="directory for the db files")
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'shards':>6} {'check-offs/s':>13} {'speedup':>8}")
+    for shards in args.shards:
+        rate = run(shards, args.writers, args.writes, args.dir)
+        baseline = baseline or rate
+        print(f"{shards:>6} {rate:>13.0f} {rate / baseline:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Storage backend benchmark.
+
+Runs the same simulated workload through the Database facade on every storage backend (see storage.py):
+- create: users and their habits, one transaction per user
+- complete: a year of completions per habit (one range completion each)
+- reload: every user's habits, with their completion dates
+- delete: every user with all their data
+
+Run from the project root:
+    python -m benchmarks.bench_storage [--users N] [--habits N]
+
+New backends are measured by adding them to BACKENDS.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from core.habit import Habit
+from core.user import User
+from db_and_managers.database import Database
+from db_and_managers.name_cache import close_name_caches
+from db_and_managers.storage import MemoryBackend, SQLiteBackend, StorageBackend
+
+# Backends by name: (temporary directory) -> empty backend
+BACKENDS: Dict[str, Callable[[str], StorageBackend]] = {
+    "sqlite": lambda directory: SQLiteBackend(os.path.join(directory, "bench_storage.db")),
+    "memory": lambda directory: MemoryBackend(),
+}
+
+
+def _workload(db: Database, users: int, habits: int) -> Dict[str, float]:
+    """
+    Runs the workload on a Database.
+
+    Returns:
+        The seconds of each phase.
+    """
+    today = datetime.now().date()
+    timings = {}
+
+    start = time.perf_counter()
+    all_users = []
+    for user_nr in range(users):
+        user = User(username=f"User {user_nr:05}")
+        with db.transaction():
+            db.save_user(user)
+            for habit_nr in range(habits):
+                habit = Habit()
+                habit.name = f"Habit {habit_nr}"
+                habit.frequency = "daily" if habit_nr % 2 else "weekly"
+                habit.create_date()
+                db.save_habits(user, habit)
+        all_users.append(user)
+    timings["create"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user in all_users:
+        for habit in db.load_habits(user):
+            db.add_completion_range(user, habit, today - timedelta(days=364), today)
+    timings["complete"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user in all_users:
+        for habit in db.load_habits(user):
+            len(habit.completion_dates)
+    timings["reload"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user in all_users:
+        db.storage.delete_user(user)
+    timings["delete"] = time.perf_counter() - start
+    return timings
+
+def run(users: int = 50, habits: int = 5) -> List[dict]:
+    """
+    Runs the workload on every backend.
+
+    Args:
+        users: Simulated users.
+        habits: Habits per user.
+    Returns:
+        A list of dicts with the backend name and the milliseconds of each phase.
+    """
+    results = []
+    for name, make_backend in BACKENDS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            timings = _workload(Database(backend=make_backend(directory)), users, habits)
+            close_name_caches()
+        results.append({"backend": name, **{phase: seconds * 1_000 for phase, seconds in timings.items()}})
+    return results
+
+def main() -> None:
+    """Command-line entry point: python -m benchmarks.bench_storage"""
+    parser = argparse.ArgumentParser(description="The same workload on every storage backend")
+    parser.add_argument("--users", type=int, default=50, help="simulated users")
+    parser.add_argument("--habits", type=int, default=5, help="habits per user")
+    args = parser.parse_args()
+
+    results = run(args.users, args.habits)
+    print(f"{'backend':<8} {'create ms':>10} {'complete ms':>12} {'reload ms':>10} {'delete ms':>10} {'total ms':>10}")
+    for result in results:
+        total = sum(result[phase] for phase in ["create", "complete", "reload", "delete"])
+        print(f"{result['backend']:<8} {result['create']:>10.1f} {result['complete']:>12.1f} "
+              f"{result['reload']:>10.1f} {result['delete']:>10.1f} {total:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ It includes:
         - adding today's completion
         - adding past date completion
         - completion deletion
+        - completing or deleting a range of dates, optionally only on some weekdays
 """
 
 import calendar
@@ -38,11 +39,10 @@ def display_habit_calendar(
     # Days outside the month = 0
     cal = calendar.monthcalendar(year, month)
 
-    # Create a list of days that have completions for this month
-    completion_days = []
-    for date in habit.completion_dates:
-        if date.year == year and date.month == month:
-            completion_days.append(date.day)
+    # Days that have completions for this month, read from the habit's day bitmap (1 bit per day)
+    # instead of iterating the whole completion history
+    day_bitmap = habit.completion_dates.bitmap()
+    completion_days = set(day_bitmap.days_in_month(year, month))
 
     # Get full month name
     month_name = calendar.month_name[month]
@@ -75,6 +75,8 @@ def display_habit_calendar(
                     week_str += " " + str(day) + " "
         print(week_str)
     print(f"{GRAY}        ---------------------------------{RES}")
+    # Monthly count with one popcount
+    print(f"        {GRAY}Completed days this month:{RES} {day_bitmap.count_in_month(year, month)}")
 
 def view_completions_calendar(ht, habit: Habit) -> None:
     """
@@ -111,6 +113,8 @@ def view_completions_calendar(ht, habit: Habit) -> None:
         1 - Complete for today {GREEN}(^_^)/{RES}
         2 - Complete for a past date
         3 - {RED}Delete{RES} a completion
+        4 - Complete a range of past dates
+        5 - {RED}Delete{RES} completions in a date range
         
         {enter()} Back to Habit Details Menu - - -""")
 
@@ -182,6 +186,20 @@ def view_completions_calendar(ht, habit: Habit) -> None:
             # Refreshing Analytics instance
             ht.analytics = Analytics(ht.logged_in_user)
 
+        elif choice == "4":
+            # Complete a range of past dates
+            ht.db.complete_habit_range(ht.logged_in_user, habit)
+
+            # Refreshing Analytics instance
+            ht.analytics = Analytics(ht.logged_in_user)
+
+        elif choice == "5":
+            # Delete completions in a date range
+            ht.db.delete_completion_range(ht.logged_in_user, habit)
+
+            # Refreshing Analytics instance
+            ht.analytics = Analytics(ht.logged_in_user)
+
         elif choice == "":
             # Return to My Habit Details Menu
             return
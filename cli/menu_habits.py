@@ -5,19 +5,19 @@ Main interface menu for habit management functionality.
 It manages:
 - creating new habits
 - viewing all habits or sorted by periodicity through the Analytics class
+- paged habit lists with name filtering and sorting by name, streak or completions
 - habit selection from the lists for individual view
+- completing all habits due today at once
 - redirects to habit creation when no habits exist
 - going back to My Habit Tracker Menu
 - app exiting
 """
 
 import time
-from typing import List
 
 from core.analytics import Analytics
 from .menu_habit_detail import menu_habit_detail
-from core.habit import Habit
-from helpers.helper_functions import reload_cli, check_exit_cmd, exit_msg, enter, invalid_input
+from helpers.helper_functions import reload_cli, check_exit_cmd, exit_msg, enter, invalid_input, good_job
 from helpers.text_formating import BLUE, RES, GRAY, GREEN
 
 def menu_habits(ht):
@@ -39,12 +39,13 @@ def menu_habits(ht):
         2 - My daily habits
         3 - My weekly habits
         4 - {GREEN}New{RES} habit
+        5 - {GREEN}Complete{RES} all habits due today
         
         {enter()} Back to My Habit Tracker
         """)
 
         # Get user choice
-        choice = input("        Enter your choice (1-4): ").strip()
+        choice = input("        Enter your choice (1-5): ").strip()
 
         # Check for exit command
         check_exit_cmd(choice)
@@ -52,18 +53,15 @@ def menu_habits(ht):
         # Handle menu options
         if choice == "1":
             # List all habits
-            all_habits = ht.analytics.list_all_habits()
-            display_habits_and_select(ht, all_habits, "All", None)
+            display_habits_and_select(ht, "All", None)
 
         elif choice == "2":
             # Filter and display daily habits
-            daily_habits = ht.analytics.list_habits_by_periodicity("daily")
-            display_habits_and_select(ht, daily_habits, "Daily", "daily")
+            display_habits_and_select(ht, "Daily", "daily")
 
         elif choice == "3":
             # Filter and display weekly habits
-            weekly_habits = ht.analytics.list_habits_by_periodicity("weekly")
-            display_habits_and_select(ht, weekly_habits, "Weekly", "weekly")
+            display_habits_and_select(ht, "Weekly", "weekly")
 
         elif choice == "4":
             reload_cli()
@@ -78,6 +76,22 @@ def menu_habits(ht):
             # Refreshing Analytics instance
             ht.analytics = Analytics(ht.logged_in_user)
 
+        elif choice == "5":
+            # Complete every habit not completed for its current period yet
+            completed = ht.db.complete_all_due_today(ht.logged_in_user)
+
+            if completed:
+                print(f"\n        {GREEN}Completed{RES} {len(completed)} habit(s):")
+                for habit in completed:
+                    print(f"        - {habit.name}")
+                good_job() # Helper
+            else:
+                print(f"\n        {GRAY}All your habits are already completed for today!{RES}")
+            input(f"\n{enter()} to return...")
+
+            # Refreshing Analytics instance
+            ht.analytics = Analytics(ht.logged_in_user)
+
         elif choice == "":
             # Return to My Habit Tracker Menu
             return
@@ -86,16 +100,28 @@ def menu_habits(ht):
             # Handle invalid input
             invalid_input()
 
-def display_habits_and_select(ht, habits: List[Habit], display_type: str, set_frequency: str = None) -> None:
+# Habits shown per page of a habit list
+HABIT_PAGE_SIZE = 10
+
+# Sort orders offered by habit lists: (sort key of HabitIndex, label)
+HABIT_SORTS = [("name", "name"), ("streak", "current streak"), ("completions", "completions")]
+
+def display_habits_and_select(ht, display_type: str, set_frequency: str = None) -> None:
     """
-    Displays an indexed list of habits and allows the user to select one for detailed view.
+    Displays a paged, indexed list of habits and allows the user to select one for detailed view.
+
+    - pages come from the user's sorted habit indexes (see core/habit_index.py): no full sort per render
+    - filters by a part of the habit name and sorts by name, current streak or completions count
 
     Args:
         ht:            The HabitTracker instance managing app state.
-        habits:        List of Habit objects to display.
         display_type:  Type of habits being displayed ("All", "Daily", "Weekly").
-        set_frequency: Pre-set frequency for new habits("Daily", "Weekly", or None).
+        set_frequency: Pre-set frequency for new habits("Daily", "Weekly", or None),
+                       also used to filter the listed habits.
     """
+    habit_index = ht.analytics.habit_index()
+    habits, _ = habit_index.page(limit=1, frequency=set_frequency)
+
     # Check if there are no habits to display
     if not habits:
         # If no habits, display a message based on the habit type
@@ -144,46 +170,84 @@ def display_habits_and_select(ht, habits: List[Habit], display_type: str, set_fr
                 ht.analytics = Analytics(ht.logged_in_user)
                 return
 
-    # If there are habits to display, show them
+    # If there are habits to display, show them page by page
+    sort_nr = 0          # Index in HABIT_SORTS
+    contains = ""        # Name filter
+    page_starts = [None] # Cursor of every page up to the current one
+
     while True:
+        sort, sort_label = HABIT_SORTS[sort_nr]
+        habits, next_page = habit_index.page(sort, page_starts[-1], HABIT_PAGE_SIZE, set_frequency, contains)
+
+        filter_label = f", names containing '{contains}'" if contains else ""
+
         reload_cli()
         exit_msg(ht.logged_in_user)
         print(f"""
         {BLUE}- - - '{display_type.title()}' Habits - - -{RES}
+        {GRAY}page {len(page_starts)}, sorted by {sort_label}{filter_label}{RES}
         """)
 
         # Display habits with indexing
         for idx, habit in enumerate(habits, 1):
+            # Sort value next to the name when sorted by streak or completions
+            if sort == "streak":
+                detail = f" {GRAY}streak {habit.streaks.current_streak}{RES}"
+            elif sort == "completions":
+                detail = f" {GRAY}{habit.completions_count} completions{RES}"
+            else:
+                detail = ""
+
             # For daily, weekly habits
             if habit.frequency in ["daily", "weekly"]:
-                print(f"        {idx} - {habit.name}")
+                print(f"        {idx} - {habit.name}{detail}")
             # For all habits
             else:
-                print(f"        {idx} - {habit.name} ({habit.frequency})")
-
+                print(f"        {idx} - {habit.name} ({habit.frequency}){detail}")
+        if not habits:
+            print(f"        {GRAY}No habit names contain '{RES}{contains}{GRAY}'.{RES}")
+
+        # Paging, filter and sort options
+        print()
+        if next_page is not None:
+            print("        N - Next page")
+        if len(page_starts) > 1:
+            print("        P - Previous page")
+        print(f"        F - Filter by name{' (ENTER to show all)' if contains else ''}")
+        print(f"        S - Sort by {HABIT_SORTS[(sort_nr + 1) % len(HABIT_SORTS)][1]}")
         print(f"\n        {enter()} Back to My Habits Menu")
 
         # Get user selection
-        choice = input(f"\n        Enter your choice (1-{len(habits)}): ").strip()
+        choice = input(f"\n        Enter your choice (1-{len(habits)}, N/P/F/S): ").strip()
 
         # Check for exit command
         check_exit_cmd(choice)
 
-        try:
-            if choice == "":
-                return
+        if choice == "":
+            return
 
-            elif 1 <= int(choice) <= len(habits):
-                # Get the selected habit
-                selected_habit = habits[int(choice) - 1]
-                # Open detail menu for selected habit
-                menu_habit_detail(ht, selected_habit)
-                return # Return the user to the My Habits Menu after he views the habit details
+        elif choice.upper() == "N" and next_page is not None:
+            page_starts.append(next_page)
 
-            else:
-                # Handle invalid int input
-                invalid_input()
+        elif choice.upper() == "P" and len(page_starts) > 1:
+            page_starts.pop()
 
-        except ValueError:
-            # Handle invalid str input
-            invalid_input()
\ No newline at end of file
+        elif choice.upper() == "F":
+            contains = input(f"\n        Part of the habit name or {enter()} to show all: ").strip()
+            check_exit_cmd(contains)
+            page_starts = [None]
+
+        elif choice.upper() == "S":
+            sort_nr = (sort_nr + 1) % len(HABIT_SORTS)
+            page_starts = [None]
+
+        elif choice.isdigit() and 1 <= int(choice) <= len(habits):
+            # Get the selected habit
+            selected_habit = habits[int(choice) - 1]
+            # Open detail menu for selected habit
+            menu_habit_detail(ht, selected_habit)
+            return # Return the user to the My Habits Menu after he views the habit details
+
+        else:
+            # Handle invalid input
+            invalid_input()
@@ -1,7 +1,7 @@
 """
 Configuration settings for the habit tracker app.
 
-This module defines global configuration variable and provides functions to modify them at runtime.
+This module defines global configuration variables and provides functions to modify them at runtime.
 It centralizes configuration value.
 """
 
@@ -17,4 +17,67 @@ def set_db_filepath(filepath: str):
         filepath: The new db filepath to use.
     """
     global DB_FILEPATH
-    DB_FILEPATH = filepath
\ No newline at end of file
+    DB_FILEPATH = filepath
+
+# Store completion dates and streak histories of new writes as binary BLOBs (see db_and_managers/blob_codec.py)
+# Text and BLOB rows are both read transparently, so this can be switched on for an existing db
+DB_BLOB_ENCODING = False
+
+def set_db_blob_encoding(enabled: bool):
+    """
+    Switches the binary column encoding of new writes on or off at runtime.
+
+    Parameters:
+        enabled: True to write BLOBs, False to write comma separated text.
+    """
+    global DB_BLOB_ENCODING
+    DB_BLOB_ENCODING = enabled
+
+# Store BLOB completion dates as day bitmaps (1 bit per day, see core/day_bitmap.py) whenever that's smaller
+# than packed dates: about 230 bytes for five years of daily completions. Needs DB_BLOB_ENCODING.
+DB_DAY_BITMAP_ENCODING = False
+
+def set_db_day_bitmap_encoding(enabled: bool):
+    """
+    Switches the day bitmap encoding of new BLOB writes on or off at runtime.
+
+    Parameters:
+        enabled: True to write day bitmaps when they are smaller, False to always write packed dates.
+    """
+    global DB_DAY_BITMAP_ENCODING
+    DB_DAY_BITMAP_ENCODING = enabled
+
+# Append every habit change to the event log and keep replayable snapshots (see db_and_managers/event_log.py)
+# Habits created before it's switched on get a baseline snapshot at startup
+DB_EVENT_LOG = False
+
+def set_db_event_log(enabled: bool):
+    """
+    Switches the completion event log on or off at runtime.
+
+    Parameters:
+        enabled: True to append habit changes to the event log, False to only update the habit tables.
+    """
+    global DB_EVENT_LOG
+    DB_EVENT_LOG = enabled
+
+# Retry policy for db connections and locked/busy statements (see helpers/db_retry.py)
+DB_RETRY_POLICY = {
+    "busy_timeout": 5.0, # Seconds SQLite itself waits on a lock before failing
+    "max_attempts": 6,   # Attempts per operation, first try included
+    "base_delay": 0.05,  # Backoff before the first retry (seconds), doubled for every further retry
+    "max_delay": 1.0,    # Largest backoff (seconds)
+    "max_elapsed": 30.0  # Maximum time spent on one operation, retries included (seconds)
+}
+
+def set_db_retry_policy(**settings):
+    """
+    Changes settings of the db retry policy at runtime.
+
+    Parameters:
+        settings: Any of busy_timeout, max_attempts, base_delay, max_delay, max_elapsed.
+    """
+    unknown = set(settings) - set(DB_RETRY_POLICY)
+    if unknown:
+        raise ValueError(f"Unknown retry policy settings: {', '.join(sorted(unknown))}")
+    DB_RETRY_POLICY.update(settings)
@@ -2,6 +2,7 @@ from typing import List, Tuple
 
 from .user import User
 from .habit import Habit
+from .habit_index import HabitIndex
 
 class Analytics:
     """
@@ -25,6 +26,20 @@ class Analytics:
             user: Central identity for all analytics operations.
         """
         self.user = user # Storing the user reference for analytics operations
+        self._habit_index = None # Sorted habit indexes for paged lists, built on first use
+
+    def habit_index(self) -> HabitIndex:
+        """
+        The user's sorted habit indexes, for paged, filtered and sorted habit lists.
+
+        - kept by the Analytics instance: the indexes are maintained incrementally between renders
+
+        Returns:
+            The HabitIndex of the user.
+        """
+        if self._habit_index is None:
+            self._habit_index = HabitIndex(self.user)
+        return self._habit_index
 
     # Task requirement: "return a list of all currently tracked habits"
     def list_all_habits(self) -> List[Habit]:
@@ -130,7 +145,7 @@ class Analytics:
         # Map each habit to a tuple of (name, completion_count)
         # Then find the tuple with the highest count
         most_completed = max(
-            map(lambda habit: (habit.name, len(habit.completion_dates)), self.user.habits),
+            map(lambda habit: (habit.name, habit.completions_count), self.user.habits),
             key=lambda x: x[1] # Max counts the 2nd element (completion count)
         )
 
@@ -154,8 +169,8 @@ class Analytics:
             return "None", 0
 
         # Find the habit with the max number of completions
-        max_habit = max(habits, key=lambda h: len(h.completion_dates)) # Max counts the nr. of completions
-        return max_habit.name, len(max_habit.completion_dates)
+        max_habit = max(habits, key=lambda h: h.completions_count) # Max counts the nr. of completions
+        return max_habit.name, max_habit.completions_count
 
     def least_completed_habit(self) -> tuple:
         """
@@ -167,7 +182,7 @@ class Analytics:
         # Map each habit to a tuple of (name, completion_count)
         # Then find the tuple with the lowest count
         least_completed = min(
-            map(lambda habit: (habit.name, len(habit.completion_dates)), self.user.habits),
+            map(lambda habit: (habit.name, habit.completions_count), self.user.habits),
             key=lambda x: x[1] # Min counts the 2nd element (completion_count)
         )
 
@@ -191,8 +206,8 @@ class Analytics:
             return "None", 0
 
         # Find the habit with the minimum number of completions
-        min_habit = min(habits, key=lambda h: len(h.completion_dates)) # Min counts the nr. of completions
-        return min_habit.name, len(min_habit.completion_dates)
+        min_habit = min(habits, key=lambda h: h.completions_count) # Min counts the nr. of completions
+        return min_habit.name, min_habit.completions_count
 
     def average_streak_length_habit(self, habit_name: str) -> float:
         """
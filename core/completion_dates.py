@@ -0,0 +1,294 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .day_bitmap import DayBitmap
+from .periods import get_period
+
+# One shared date object per calendar day: histories of all habits point to the same few thousand dates
+# instead of each holding its own copies (32 bytes per date object)
+_calendar: Dict[date, date] = {}
+_intern = _calendar.setdefault
+
+def intern_date(completion_date: date) -> date:
+    """
+    The shared date object equal to a date.
+
+    Args:
+        completion_date: Any date.
+    Returns:
+        The interned date object.
+    """
+    return _intern(completion_date, completion_date)
+
+# Interned dates by day ordinal, for decoding packed ordinals without constructing date objects
+_by_ordinal: Dict[int, date] = {}
+
+def date_from_ordinal(ordinal: int) -> date:
+    """
+    The interned date of a day ordinal (see date.toordinal()).
+
+    Args:
+        ordinal: The day ordinal.
+    Returns:
+        The interned date object.
+    """
+    completion_date = _by_ordinal.get(ordinal)
+    if completion_date is None:
+        completion_date = _by_ordinal[ordinal] = intern_date(date.fromordinal(ordinal))
+    return completion_date
+
+# Recorded changes of dates which were rewritten as a whole (never mutated): unknown without the stored dates
+_REWRITTEN: Counter = Counter()
+
+def dates_from_ordinals(ordinals: Iterable[int]) -> List[date]:
+    """
+    The interned dates of many day ordinals, e.g. decoded from a BLOB.
+
+    Args:
+        ordinals: The day ordinals.
+    Returns:
+        The list of interned date objects, in the same order.
+    """
+    ordinals = ordinals.tolist() if hasattr(ordinals, "tolist") else list(ordinals)
+    try:
+        return list(map(_by_ordinal.__getitem__, ordinals))
+    except KeyError:
+        # First time some of these days are seen
+        return [date_from_ordinal(ordinal) for ordinal in ordinals]
+
+
+class CompletionDates(list):
+    """
+    The list of dates when a habit was completed, kept sorted, with a hashed period index.
+
+    - behaves like a plain list of dates (equality, iteration, slicing, len, ...)
+    - stores interned date objects shared by all habits (see intern_date())
+    - keeps the dates in ascending order: appending the newest date is O(1), older dates are inserted in place
+    - the latest completion is always the last item: O(1) through the last property
+    - keeps a count of completions per period id of every frequency asked for, updated on every change
+    - answers "is this date/period completed?" in O(1) instead of scanning the list
+    - offers a day bitmap of the history (see bitmap()) for streak runs, counts and calendar cells
+    - records the dates added and removed since the last save (see take_changes()) for the event log
+
+    The index only counts dates, so duplicate dates (which the managers prevent) are still handled correctly.
+    A frequency's period counter is built on its first lookup (a habit only ever asks for its own frequency),
+    so habits which are only displayed or analyzed never pay for an index. The same goes for the day bitmap.
+    """
+
+    __slots__ = ("_periods", "_bitmap", "_changes") # No per-instance __dict__
+
+    def __init__(self, dates: Iterable[date] = (), bitmap: Optional[DayBitmap] = None) -> None:
+        """
+        Initializes the sorted list of interned dates.
+
+        Args:
+            dates: The completion dates, in any order.
+            bitmap: The DayBitmap of the same dates if it is already at hand (e.g. decoded from the db).
+        """
+        super().__init__(intern_date(completion_date) for completion_date in dates)
+        self._restore_order()
+        self._rebuild_index()
+        self._bitmap = bitmap
+        self._changes: Optional[Counter] = None # Net count change per date since the last save, None if none
+
+    def _restore_order(self) -> None:
+        """Sorts the dates (O(n) when they are already sorted, as dates from the db usually are)."""
+        super().sort()
+
+    def _rebuild_index(self) -> None:
+        """Drops the period counters and the day bitmap: they are rebuilt on their next lookup."""
+        self._periods: Optional[Dict[str, Counter]] = None
+        self._bitmap: Optional[DayBitmap] = None
+
+    def _record(self, completion_date: date, count: int) -> None:
+        """Records a date added (+1) or removed (-1) since the last save."""
+        if self._changes is _REWRITTEN:
+            return
+        if self._changes is None:
+            self._changes = Counter()
+        self._changes[completion_date] += count
+        if not self._changes[completion_date]:
+            del self._changes[completion_date]
+
+    def _index_add(self, completion_date: date) -> None:
+        """Counts one added date."""
+        self._record(completion_date, 1)
+        if self._bitmap is not None:
+            self._bitmap.add(completion_date)
+        if self._periods:
+            for frequency, counter in self._periods.items():
+                counter[get_period(frequency).period_id(completion_date)] += 1
+
+    def _index_remove(self, completion_date: date) -> None:
+        """Uncounts one removed date."""
+        self._record(completion_date, -1)
+        if self._bitmap is not None:
+            # Clear the day's bit unless a duplicate of the date is left
+            position = bisect_left(self, completion_date)
+            if position == len(self) or self[position] != completion_date:
+                self._bitmap.discard(completion_date)
+        if self._periods:
+            for frequency, counter in self._periods.items():
+                _uncount(counter, get_period(frequency).period_id(completion_date))
+
+    def _period_counter(self, frequency: str) -> Counter:
+        """The completions per period id of a frequency, built on first use."""
+        if self._periods is None:
+            self._periods = {}
+        counter = self._periods.get(frequency)
+        if counter is None:
+            to_id = get_period(frequency).period_id
+            counter = self._periods[frequency] = Counter(to_id(completion_date) for completion_date in self)
+        return counter
+
+    # --------------
+    # Period lookups
+    # --------------
+    @property
+    def last(self) -> Optional[date]:
+        """The latest completion date in O(1), or None if there are no completions."""
+        return self[-1] if self else None
+
+    def __contains__(self, completion_date) -> bool:
+        """O(1) check if a date is completed."""
+        if not isinstance(completion_date, date):
+            return False
+        return self._period_counter("daily").get(completion_date.toordinal(), 0) > 0
+
+    def bitmap(self) -> DayBitmap:
+        """
+        The completions as a DayBitmap (one bit per day), built on first use and kept current afterwards.
+
+        Returns:
+            The DayBitmap of the completed days (duplicate dates share one bit).
+        """
+        if self._bitmap is None:
+            self._bitmap = DayBitmap.from_dates(self)
+        return self._bitmap
+
+    def has_period(self, frequency: str, completion_date: date) -> bool:
+        """
+        Checks if the period of a date is already completed.
+
+        Args:
+            frequency: The habit frequency (see core/periods.py).
+            completion_date: Any date of the period to check.
+        Returns:
+            True if the period of the date (day, week, month, ...) has a completion.
+        """
+        return self._period_counter(frequency).get(get_period(frequency).period_id(completion_date), 0) > 0
+
+    # ---------------------------
+    # Changes since the last save
+    # ---------------------------
+    def take_changes(self) -> Optional[Tuple[List[date], List[date]]]:
+        """
+        The dates added and removed since the last save, then records anew from the current dates.
+
+        Returns:
+            (added dates, removed dates), each sorted, or None if the dates were rewritten as a whole
+            (e.g. cleared or replaced): only a comparison with the stored dates tells the changes then.
+        """
+        changes = self._changes
+        self._changes = None
+        if changes is _REWRITTEN:
+            return None
+        if changes is None:
+            return [], []
+        return sorted((+changes).elements()), sorted((-changes).elements())
+
+    def mark_saved(self) -> None:
+        """Takes the current dates as the stored ones (e.g. just loaded): changes are recorded from here."""
+        self._changes = None
+
+    def mark_rewritten(self) -> None:
+        """Forgets the recorded changes after the dates were rewritten as a whole (see take_changes())."""
+        self._changes = _REWRITTEN
+
+    # ----------------------------------------
+    # List mutations keeping the index current
+    # ----------------------------------------
+    def append(self, completion_date: date) -> None:
+        """Adds a date at its sorted position (O(1) for the newest date)."""
+        completion_date = intern_date(completion_date)
+        if not self or completion_date >= self[-1]:
+            super().append(completion_date)
+        else:
+            super().insert(bisect_right(self, completion_date), completion_date)
+        self._index_add(completion_date)
+
+    def insert(self, index, completion_date: date) -> None:
+        """Adds a date at its sorted position: the index is ignored to keep the order."""
+        self.append(completion_date)
+
+    def extend(self, dates: Iterable[date]) -> None:
+        """Adds many dates, then restores the order once (a merge of two sorted runs when the dates are sorted)."""
+        dates = [intern_date(completion_date) for completion_date in dates]
+        super().extend(dates)
+        self._restore_order()
+        for completion_date in dates:
+            self._index_add(completion_date)
+
+    def __iadd__(self, dates: Iterable[date]) -> "CompletionDates":
+        """Adds many dates (+=)."""
+        self.extend(dates)
+        return self
+
+    def remove(self, completion_date: date) -> None:
+        """Removes the first occurrence of a date."""
+        super().remove(completion_date)
+        self._index_remove(completion_date)
+
+    def pop(self, index=-1) -> date:
+        """Removes and returns the date at a position."""
+        completion_date = super().pop(index)
+        self._index_remove(completion_date)
+        return completion_date
+
+    def clear(self) -> None:
+        """Removes all dates."""
+        super().clear()
+        self._rebuild_index()
+        self.mark_rewritten()
+
+    def __setitem__(self, index, value) -> None:
+        """Replaces dates by index or slice."""
+        if isinstance(index, slice):
+            value = [intern_date(completion_date) for completion_date in value]
+        else:
+            value = intern_date(value)
+        super().__setitem__(index, value)
+        self._restore_order()
+        self._rebuild_index()
+        self.mark_rewritten()
+
+    def __delitem__(self, index) -> None:
+        """Deletes dates by index or slice."""
+        super().__delitem__(index)
+        self._rebuild_index()
+        self.mark_rewritten()
+
+    def __imul__(self, times: int) -> "CompletionDates":
+        """Repeats the dates (*=)."""
+        super().__imul__(times)
+        self._restore_order()
+        self._rebuild_index()
+        self.mark_rewritten()
+        return self
+
+    def sort(self, *, key=None, reverse: bool = False) -> None:
+        """Keeps the ascending order: the dates are always sorted already."""
+        if key is not None or reverse:
+            raise ValueError("CompletionDates are always kept in ascending order.")
+
+    def reverse(self) -> None:
+        """Not supported: the dates are always kept in ascending order."""
+        raise ValueError("CompletionDates are always kept in ascending order.")
+
+def _uncount(counter: Counter, key) -> None:
+    """Decrements a counter key, dropping it at zero."""
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
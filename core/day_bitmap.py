@@ -0,0 +1,169 @@
+import calendar
+from datetime import date
+from typing import Iterable, List, Optional
+
+# int.bit_count() needs Python 3.10+
+_popcount = getattr(int, "bit_count", None) or (lambda bits: bin(bits).count("1"))
+
+
+class DayBitmap:
+    """
+    A daily completion history as one bit per day.
+
+    - bit i is set if the habit was completed on day origin + i (origin = the first completion's day ordinal)
+    - five years of daily history fit in about 230 bytes, independent of the number of completions
+    - counts (popcount), streak runs and calendar cells are computed with integer bit operations
+      instead of iterating date objects
+    - converts to and from lists of dates for compatibility
+
+    Attributes:
+        origin: An integer as the day ordinal of bit 0.
+        bits:   An integer whose set bits are the completed days.
+    """
+
+    __slots__ = ("origin", "bits")
+
+    def __init__(self, origin: int = 0, bits: int = 0) -> None:
+        """Initializes the DayBitmap."""
+        self.origin = origin
+        self.bits = bits
+
+    # ----------
+    # Conversion
+    # ----------
+    @classmethod
+    def from_dates(cls, dates: Iterable[date]) -> "DayBitmap":
+        """
+        Builds the bitmap of a list of dates (duplicates are merged).
+
+        Args:
+            dates: The completion dates, in any order.
+        Returns:
+            The DayBitmap.
+        """
+        ordinals = [completion_date.toordinal() for completion_date in dates]
+        if not ordinals:
+            return cls()
+
+        origin = min(ordinals)
+        buffer = bytearray((max(ordinals) - origin) // 8 + 1)
+        for ordinal in ordinals:
+            offset = ordinal - origin
+            buffer[offset >> 3] |= 1 << (offset & 7)
+        return cls(origin, int.from_bytes(buffer, "little"))
+
+    @classmethod
+    def from_bytes(cls, origin: int, data: bytes) -> "DayBitmap":
+        """Builds the bitmap from its origin and little-endian bytes (see to_bytes())."""
+        return cls(origin, int.from_bytes(data, "little"))
+
+    def to_bytes(self) -> bytes:
+        """The bits as little-endian bytes (1 byte per 8 days)."""
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+
+    def to_ordinals(self) -> List[int]:
+        """The completed day ordinals in ascending order."""
+        # Reversed binary string: index i is bit i
+        binary = bin(self.bits)[:1:-1]
+        ordinals = []
+        offset = binary.find("1")
+        while offset != -1:
+            ordinals.append(self.origin + offset)
+            offset = binary.find("1", offset + 1)
+        return ordinals
+
+    def to_dates(self) -> List[date]:
+        """The completed dates in ascending order."""
+        # Avoid circular imports
+        from .completion_dates import dates_from_ordinals
+        return dates_from_ordinals(self.to_ordinals())
+
+    # -------------
+    # Day functions
+    # -------------
+    def __contains__(self, completion_date) -> bool:
+        """True if the day is completed."""
+        offset = completion_date.toordinal() - self.origin
+        return offset >= 0 and bool(self.bits >> offset & 1)
+
+    def __len__(self) -> int:
+        """The number of completed days (popcount)."""
+        return _popcount(self.bits)
+
+    def add(self, completion_date: date) -> None:
+        """Marks a day as completed, moving the origin back for earlier days."""
+        ordinal = completion_date.toordinal()
+        if not self.bits:
+            self.origin = ordinal
+        elif ordinal < self.origin:
+            self.bits <<= self.origin - ordinal
+            self.origin = ordinal
+        self.bits |= 1 << (ordinal - self.origin)
+
+    def discard(self, completion_date: date) -> None:
+        """Marks a day as not completed."""
+        offset = completion_date.toordinal() - self.origin
+        if offset >= 0:
+            self.bits &= ~(1 << offset)
+
+    def _window(self, start: date, end: date) -> int:
+        """The bits from start to end (both included), shifted so bit 0 is start."""
+        first = start.toordinal() - self.origin
+        last = end.toordinal() - self.origin
+        if last < 0 or last < first:
+            return 0
+        if first < 0:
+            return (self.bits & ((1 << (last + 1)) - 1)) << -first
+        return (self.bits >> first) & ((1 << (last - first + 1)) - 1)
+
+    def count_between(self, start: date, end: date) -> int:
+        """
+        Counts the completed days from start to end (both included) with one popcount.
+
+        Args:
+            start: The first date.
+            end: The last date.
+        Returns:
+            The number of completed days.
+        """
+        return _popcount(self._window(start, end))
+
+    def count_in_month(self, year: int, month: int) -> int:
+        """The number of completed days in a month."""
+        return self.count_between(date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+
+    def days_in_month(self, year: int, month: int) -> List[int]:
+        """
+        The completed days of a month, for calendar cells.
+
+        Args:
+            year: The year.
+            month: The month (1-12).
+        Returns:
+            The day numbers (1-31) with a completion, ascending.
+        """
+        window = self._window(date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+        binary = bin(window)[:1:-1]
+        return [offset + 1 for offset, bit in enumerate(binary) if bit == "1"]
+
+    # -----------
+    # Streak runs
+    # -----------
+    def runs(self) -> List[int]:
+        """
+        The lengths of all runs of consecutive completed days, in chronological order.
+
+        - splits the binary form of the bits at the days without completion: one pass in C over 1 character
+          per day, instead of Python-level iteration over date objects
+
+        Returns:
+            The run lengths (the last one is the most recent run).
+        """
+        # Reversed binary string: index i is bit i, so the runs come out in chronological order
+        return list(map(len, filter(None, bin(self.bits)[:1:-1].split("0"))))
+
+    def last_day(self) -> Optional[date]:
+        """The latest completed date, or None if there are none."""
+        if not self.bits:
+            return None
+        return date.fromordinal(self.origin + self.bits.bit_length() - 1)
@@ -1,7 +1,8 @@
 import time
 from datetime import datetime, date
-from typing import List, Optional
+from typing import Callable, List, Optional
 
+from .completion_dates import CompletionDates
 from .streaks import Streaks
 from helpers.helper_functions import confirm_input, enter, invalid_input
 from helpers.text_formating import GRAY, RES, RED
@@ -19,25 +20,87 @@ class Habit:
               habits are directly linked to their user through foreign keys relationships in the db tables
     - stores:
             - the creation date of a new habit
-            - a list of dates when a habit was completed by the user
+            - a list of dates when a habit was completed by the user, indexed per day and week (O(1) period checks)
+    - supports lazy loading of its completion dates:
+            habits loaded from the db only fetch their completion dates on first access
     - initializes its own Streak instance for streak calculations
 
     Attributes:
         name:             A string assigned by the user.
         frequency:        A string determining how often the habit should be completed ("daily" or "weekly").
         creation_date:    A date stored when a new habit name is registered.
-        completion_dates: A list of dates when a habit was completed by the user.
+        completion_dates: A CompletionDates list of dates when a habit was completed (fetched on first access).
         streaks:          A Streaks instance which calculates streak information for a habit.
     """
 
+    # Slots instead of a per-instance __dict__: habits are held in memory by the hundred thousand
+    __slots__ = (
+        "name", "frequency", "creation_date",
+        "_completion_dates", "_completion_loader", "_stored_completions_count",
+        "streaks"
+    )
+
     def __init__(self):
         """Initializes the Habit instance."""
         self.name: Optional[str] = None
         self.frequency: Optional[str] = None
         self.creation_date: Optional[date] = None
-        self.completion_dates: List[date] = []
+        self._completion_dates: CompletionDates = CompletionDates()
+        self._completion_loader: Optional[Callable[[], List[date]]] = None # Set for lazily loaded habits
+        self._stored_completions_count: Optional[int] = None               # Count stored in the db
         self.streaks: Streaks = Streaks()
 
+    @property
+    def completion_dates(self) -> CompletionDates:
+        """
+        The list of dates when the habit was completed.
+
+        - if the habit was loaded lazily, fetches the dates through the completion loader on first access
+        """
+        if self._completion_loader is not None:
+            completion_dates = self._completion_loader()
+            # Loaders may return a ready CompletionDates (e.g. with a day bitmap decoded from the db)
+            if not isinstance(completion_dates, CompletionDates):
+                completion_dates = CompletionDates(completion_dates)
+            self._completion_dates = completion_dates
+            self._completion_loader = None
+        return self._completion_dates
+
+    @completion_dates.setter
+    def completion_dates(self, completion_dates: List[date]) -> None:
+        """Replaces the completion dates and discards any pending lazy load."""
+        self._completion_dates = CompletionDates(completion_dates)
+        self._completion_dates.mark_rewritten() # Changes unknown until compared with the stored dates
+        self._completion_loader = None
+
+    @property
+    def completions_loaded(self) -> bool:
+        """True if the completion dates are in memory, False if they are still waiting for a lazy load."""
+        return self._completion_loader is None
+
+    @property
+    def completions_count(self) -> int:
+        """
+        The number of completions of the habit.
+
+        - uses the count stored in the db while the completion dates aren't loaded yet
+        """
+        if self._completion_loader is not None and self._stored_completions_count is not None:
+            return self._stored_completions_count
+        return len(self.completion_dates)
+
+    def defer_completion_dates(self, loader: Callable[[], List[date]], completions_count: Optional[int]) -> None:
+        """
+        Postpones loading the completion dates until they are first needed.
+
+        Args:
+            loader:            A callable returning the list of completion dates.
+            completions_count: The completion count stored in the db (None if unknown).
+        """
+        self._completion_dates = CompletionDates()
+        self._completion_loader = loader
+        self._stored_completions_count = completions_count
+
     def habit_name(self, user=None) -> None:
         """
         Handles the creation of a new habit name.
@@ -0,0 +1,112 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .habit import Habit
+
+# Sort orders of habit lists: key functions returning unique, comparable tuples (habit names are unique per user)
+SORT_KEYS: Dict[str, Callable[[Habit], tuple]] = {
+    "name": lambda habit: (habit.name.lower(), habit.name),
+    "streak": lambda habit: (-habit.streaks.current_streak, habit.name.lower(), habit.name),
+    "completions": lambda habit: (-habit.completions_count, habit.name.lower(), habit.name),
+}
+
+
+class HabitIndex:
+    """
+    Sorted indexes of a user's habits for paged, filtered habit lists.
+
+    - keeps one sorted list of sort keys per sort order (name, current streak, completions count)
+    - an index is built on its first use, then maintained incrementally: before every page, only habits which
+      were added, removed or whose sort key changed (e.g. after a completion) are moved, with bisect
+    - pages are served with a keyset cursor (the sort key of the last habit shown), so only the visible page
+      is collected, whatever the number of habits
+    - filters by frequency and by a case-insensitive substring of the name while collecting the page
+
+    Attributes:
+        user: Reference to the User object whose habits are indexed (user.habits is read on every page,
+              so reloaded habit lists are picked up).
+    """
+
+    def __init__(self, user) -> None:
+        """Initializes the HabitIndex of a user (no index is built yet)."""
+        self.user = user
+        self._sorted: Dict[str, List[tuple]] = {}                        # Sort keys in order, per sort order
+        self._by_key: Dict[str, Dict[tuple, Habit]] = {}                 # Habit of each sort key
+        self._keys: Dict[str, Dict[int, Tuple[tuple, Habit]]] = {}       # Current sort key of each habit object
+
+    def _sync(self, sort: str) -> None:
+        """Builds the index of a sort order, or brings it up to date with the user's habits."""
+        key = SORT_KEYS[sort]
+        keys = self._keys.get(sort)
+
+        # First use: one full sort
+        if keys is None:
+            keys = self._keys[sort] = {id(habit): (key(habit), habit) for habit in self.user.habits}
+            self._by_key[sort] = {habit_key: habit for habit_key, habit in keys.values()}
+            self._sorted[sort] = sorted(self._by_key[sort])
+            return
+
+        ordered, by_key = self._sorted[sort], self._by_key[sort]
+        current = {id(habit): habit for habit in self.user.habits}
+
+        # Removed habits (the index holds references to them, so their ids are never reused meanwhile)
+        for habit_id in keys.keys() - current.keys():
+            old_key, _ = keys.pop(habit_id)
+            del ordered[bisect_left(ordered, old_key)]
+            del by_key[old_key]
+
+        # Added habits and changed sort keys
+        for habit_id, habit in current.items():
+            new_key = key(habit)
+            entry = keys.get(habit_id)
+            if entry is not None:
+                if entry[0] == new_key:
+                    continue
+                del ordered[bisect_left(ordered, entry[0])]
+                del by_key[entry[0]]
+            insort(ordered, new_key)
+            by_key[new_key] = habit
+            keys[habit_id] = (new_key, habit)
+
+    def page(
+            self,
+            sort: str = "name",
+            after: Optional[tuple] = None,
+            limit: int = 10,
+            frequency: Optional[str] = None,
+            contains: str = ""
+    ) -> Tuple[List[Habit], Optional[tuple]]:
+        """
+        One page of habits in a sort order.
+
+        Args:
+            sort: The sort order: "name", "streak" (longest current streak first) or "completions" (most first).
+            after: The cursor returned with the previous page, or None for the first page.
+            limit: The maximum number of habits on the page.
+            frequency: Only habits with this frequency, or None for all.
+            contains: Only habits whose name contains this text (case-insensitive), "" for all.
+        Returns:
+            The habits of the page, and the cursor of the next page (None if this is the last page).
+        Raises:
+            KeyError: If the sort order is unknown.
+        """
+        self._sync(sort)
+        ordered, by_key = self._sorted[sort], self._by_key[sort]
+        needle = contains.lower().strip()
+
+        habits, last_key = [], None
+        start = 0 if after is None else bisect_right(ordered, after)
+        for position in range(start, len(ordered)):
+            habit = by_key[ordered[position]]
+            if frequency and habit.frequency != frequency:
+                continue
+            if needle and needle not in habit.name.lower():
+                continue
+
+            # One more match: there is a next page, starting after the last habit shown
+            if len(habits) == limit:
+                return habits, last_key
+            habits.append(habit)
+            last_key = ordered[position]
+
+        return habits, None
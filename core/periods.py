@@ -0,0 +1,184 @@
+import re
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Dict, List
+
+
+class Period(ABC):
+    """
+    Maps dates to integer period ids for one habit frequency.
+
+    - consecutive periods have consecutive ids: streak and duplicate checks become integer comparisons
+    - every date maps to exactly one period, so one completion per id means one completion per period
+    - subclasses only implement period_id() and period_start()
+
+    Attributes:
+        name: A string as the frequency name (e.g. "daily", "weekly", "3-day").
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initializes the Period."""
+        self.name = name
+
+    @abstractmethod
+    def period_id(self, day: date) -> int:
+        """
+        The id of the period containing a date.
+
+        Args:
+            day: Any date.
+        Returns:
+            The integer period id.
+        """
+
+    @abstractmethod
+    def period_start(self, period_id: int) -> date:
+        """
+        The first date of a period.
+
+        Args:
+            period_id: The integer period id.
+        Returns:
+            The first date of the period.
+        """
+
+
+class DailyPeriod(Period):
+    """One period per day: the id is the date's ordinal."""
+
+    def period_id(self, day: date) -> int:
+        """The date's ordinal."""
+        return day.toordinal()
+
+    def period_start(self, period_id: int) -> date:
+        """The date of the ordinal."""
+        return date.fromordinal(period_id)
+
+
+class WeeklyPeriod(Period):
+    """One period per week, from Monday to Sunday (ordinal 1 - 0001-01-01 - is a Monday)."""
+
+    def period_id(self, day: date) -> int:
+        """The number of whole weeks since 0001-01-01."""
+        return (day.toordinal() - 1) // 7
+
+    def period_start(self, period_id: int) -> date:
+        """The Monday of the week."""
+        return date.fromordinal(period_id * 7 + 1)
+
+
+class MonthlyPeriod(Period):
+    """
+    One period per group of calendar months.
+
+    Attributes:
+        months: An integer as the number of months per period (1 for monthly, 3 for quarterly).
+    """
+
+    def __init__(self, name: str, months: int = 1) -> None:
+        """Initializes the MonthlyPeriod."""
+        super().__init__(name)
+        self.months = months
+
+    def period_id(self, day: date) -> int:
+        """The number of whole month groups since year 0."""
+        return (day.year * 12 + day.month - 1) // self.months
+
+    def period_start(self, period_id: int) -> date:
+        """The first day of the group's first month."""
+        month_index = period_id * self.months
+        return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class CyclePeriod(Period):
+    """
+    One period per custom cycle of N days.
+
+    Attributes:
+        days: An integer as the cycle length in days.
+    """
+
+    def __init__(self, name: str, days: int) -> None:
+        """Initializes the CyclePeriod."""
+        super().__init__(name)
+        self.days = days
+
+    def period_id(self, day: date) -> int:
+        """The number of whole cycles since 0001-01-01."""
+        return (day.toordinal() - 1) // self.days
+
+    def period_start(self, period_id: int) -> date:
+        """The first day of the cycle."""
+        return date.fromordinal(period_id * self.days + 1)
+
+# Built-in frequencies
+_PERIODS: Dict[str, Period] = {
+    "daily": DailyPeriod("daily"),
+    "weekly": WeeklyPeriod("weekly"),
+    "monthly": MonthlyPeriod("monthly", months=1),
+    "quarterly": MonthlyPeriod("quarterly", months=3),
+}
+
+# Names of the built-in frequencies
+FREQUENCIES: List[str] = list(_PERIODS)
+
+# Custom cycles are written as "<N>-day" (e.g. "3-day")
+_CYCLE_PATTERN = re.compile(r"([1-9]\d*)-day")
+
+# Longest custom cycle: also bounds the number of cached cycle periods
+MAX_CYCLE_DAYS = 365
+
+def get_period(frequency: str) -> Period:
+    """
+    The period engine of a frequency.
+
+    - built-in: "daily", "weekly", "monthly", "quarterly"
+    - custom cycles: "<N>-day" with N from 1 to MAX_CYCLE_DAYS (created and cached on first use)
+
+    Args:
+        frequency: The habit frequency.
+    Returns:
+        The Period of the frequency.
+    Raises:
+        ValueError: If the frequency is unknown.
+    """
+    period = _PERIODS.get(frequency)
+    if period is None:
+        match = _CYCLE_PATTERN.fullmatch(frequency or "")
+        if match is None or int(match.group(1)) > MAX_CYCLE_DAYS:
+            raise ValueError(f"Unknown frequency '{frequency}'.")
+        period = _PERIODS[frequency] = CyclePeriod(frequency, int(match.group(1)))
+    return period
+
+def is_frequency(frequency: str) -> bool:
+    """True if the period engine supports the frequency."""
+    try:
+        get_period(frequency)
+        return True
+    except ValueError:
+        return False
+
+def period_id(frequency: str, day: date) -> int:
+    """
+    Shortcut for get_period(frequency).period_id(day).
+
+    Args:
+        frequency: The habit frequency.
+        day: Any date.
+    Returns:
+        The integer period id.
+    """
+    return get_period(frequency).period_id(day)
+
+def period_ids(frequency: str, days: List[date]) -> List[int]:
+    """
+    Maps many dates to period ids once, for the hot loops of streak calculations.
+
+    Args:
+        frequency: The habit frequency.
+        days: The dates to map.
+    Returns:
+        The period ids in the same order as the dates.
+    """
+    to_id = get_period(frequency).period_id
+    return [to_id(day) for day in days]
@@ -1,5 +1,37 @@
-from datetime import datetime, timedelta, date
-from typing import List
+from array import array
+from datetime import datetime, date
+from typing import Iterable, List
+
+from .completion_dates import CompletionDates
+from .periods import get_period, period_ids
+
+
+class StreakLengths(array):
+    """
+    A compact history of broken streak lengths: 4 bytes per length instead of an 8-byte pointer to an int object.
+
+    - supports the list operations used on the history (append, extend, iteration, len, max, sum, ...)
+    - compares equal to a list with the same lengths and prints like one
+    """
+
+    def __new__(cls, lengths: Iterable[int] = ()) -> "StreakLengths":
+        """Creates the history from any iterable of non-negative integers."""
+        return super().__new__(cls, "I", lengths)
+
+    def __eq__(self, other) -> bool:
+        """Equal to arrays and lists with the same lengths."""
+        if isinstance(other, list):
+            return self.tolist() == other
+        return super().__eq__(other)
+
+    def __ne__(self, other) -> bool:
+        """Negation of __eq__()."""
+        return not self == other
+
+    def __repr__(self) -> str:
+        """Prints like a list, e.g. [3, 5]."""
+        return repr(self.tolist())
+
 
 class Streaks:
     """
@@ -18,14 +50,28 @@ class Streaks:
     Attributes:
         current_streak:        An integer as the count of consecutive completions for a habit.
         longest_streak:        An integer as the longest streak achieved for a habit.
-        broken_streak_lengths: A list of integers as the history of streak lengths when they were broken.
+        broken_streak_lengths: A StreakLengths array as the history of streak lengths when they were broken
+                               (assigned lists are converted).
     """
 
+    # Slots instead of a per-instance __dict__: habits are held in memory by the hundred thousand
+    __slots__ = ("current_streak", "longest_streak", "_broken_streak_lengths")
+
     def __init__(self):
         """Initializes the Streaks instance."""
         self.current_streak: int = 0
         self.longest_streak: int = 0
-        self.broken_streak_lengths: List[int] = []
+        self.broken_streak_lengths = StreakLengths()
+
+    @property
+    def broken_streak_lengths(self) -> StreakLengths:
+        """The history of streak lengths when they were broken."""
+        return self._broken_streak_lengths
+
+    @broken_streak_lengths.setter
+    def broken_streak_lengths(self, lengths: Iterable[int]) -> None:
+        """Replaces the history, storing it as a compact StreakLengths array."""
+        self._broken_streak_lengths = lengths if isinstance(lengths, StreakLengths) else StreakLengths(lengths)
 
     def _is_streak_broken(self, frequency: str, completion_dates: List[date]) -> bool:
         """
@@ -33,7 +79,7 @@ class Streaks:
 
         See get_current_streak() for full arguments' documentation.
 
-        - checks if the streak is broken
+        - checks if the streak is broken, in O(1) for a habit's CompletionDates
         - if yes, it adds the current streak length to the broken_streak_lengths history
         - then resets the current_streak to 1
 
@@ -46,32 +92,21 @@ class Streaks:
         """
         today = datetime.now().date()
 
-        sorted_completion_dates = sorted(completion_dates)
-        last_completion = sorted_completion_dates[-1]
-
-        if frequency == "daily":
-            # Streak is broken if more than 1 day has passed since last completion
-            if (today - last_completion).days > 1:
-                # Save broken streak length to the list
-                self.broken_streak_lengths.append(self.current_streak)
-                # Reset current streak to today's completion
-                self.current_streak = 1
-                return True # Streak is broken
-
-        elif frequency == "weekly":
-            # Calculate the Monday of the current week
-            current_week_monday = today - timedelta(days=today.weekday()) # weekday() -> 0 for Monday
-
-            # Calculate the Monday of the week of the last completion
-            last_completion_week_monday = last_completion - timedelta(days=last_completion.weekday())
-
-            # Streak is broken if current week's Monday is more than 7 days apart from the latest completion's Monday
-            if current_week_monday > last_completion_week_monday + timedelta(days=7):
-                # Save broken streak length to the list
-                self.broken_streak_lengths.append(self.current_streak)
-                # Reset current streak to today's completion
-                self.current_streak = 1
-                return True # Streak is broken
+        # CompletionDates keep their latest date last: O(1) instead of sorting the whole history
+        if isinstance(completion_dates, CompletionDates):
+            last_completion = completion_dates.last
+        else:
+            last_completion = max(completion_dates)
+
+        # Streak is broken if at least one whole period has passed since the last completion's period
+        # (daily: more than 1 day, weekly: more than 1 week between the Mondays, ...)
+        period = get_period(frequency)
+        if period.period_id(today) - period.period_id(last_completion) > 1:
+            # Save broken streak length to the list
+            self.broken_streak_lengths.append(self.current_streak)
+            # Reset current streak to today's completion
+            self.current_streak = 1
+            return True # Streak is broken
 
         return False # Streak isn't broken
 
@@ -119,53 +154,48 @@ class Streaks:
         Returns:
             An integer representing the current streak length in days.
         """
-        # Sort completion dates to process them chronologically
+        # Daily CompletionDates without duplicates: the streaks are the runs of set bits of the day bitmap,
+        # computed with integer operations instead of iterating date objects
+        if frequency == "daily" and completion_dates and isinstance(completion_dates, CompletionDates):
+            bitmap = completion_dates.bitmap()
+            if len(bitmap) == len(completion_dates):
+                return self._set_streaks(bitmap.runs())
+
+        # Sort completion dates to process them chronologically, then map them to period ids once
         sorted_completion_dates = sorted(completion_dates)
+        ids = period_ids(frequency, sorted_completion_dates)
 
         # Collect all streaks (including broken ones)
         streaks = []
         # Start counting the first completion as a streak of 1
         current_streak = 1
 
-        if frequency == "daily":
-            # Iterate through completion dates to identify streak sequences
-            for i in range(1, len(sorted_completion_dates)):
-
-                # Calculate gap between consecutive completion dates
-                days_diff = (sorted_completion_dates[i] - sorted_completion_dates[i - 1]).days
-
-                # If completion dates are on consecutive days
-                if days_diff == 1:
-                    current_streak += 1 # Extend the streak
-
-                # A gap => a broken streak
-                else:
-                    streaks.append(current_streak) # Record the length
-                    current_streak = 1 # Restart the streak
-
-            # Add the final streak to the list
-            streaks.append(current_streak)
+        # Iterate through period ids to identify streak sequences
+        for i in range(1, len(ids)):
 
-        elif frequency == "weekly":
-            # Iterate through completion dates to identify streak sequences
-            for i in range(1, len(sorted_completion_dates)):
+            # If completions are in consecutive periods (days, weeks, months, ...)
+            if ids[i] - ids[i - 1] == 1:
+                current_streak += 1 # Extend the streak
 
-                # Calculate the Monday of each completion's week
-                current_monday = sorted_completion_dates[i] - timedelta(days=sorted_completion_dates[i].weekday())
-                previous_monday = sorted_completion_dates[i - 1] - timedelta(days=sorted_completion_dates[i - 1].weekday())
+            # A gap (or a second completion in the same period) => a broken streak
+            else:
+                streaks.append(current_streak) # Record the length
+                current_streak = 1 # Restart the streak
 
-                # If completion dates are on consecutive weeks
-                if (current_monday - previous_monday).days == 7:
-                    current_streak += 1 # Extend the streak
+        # Add the final streak to the list
+        streaks.append(current_streak)
 
-                # A gap => broken streak
-                else:
-                    streaks.append(current_streak) # Record the length
-                    current_streak = 1 # Restart the streak
+        return self._set_streaks(streaks)
 
-            # Add the final streak to the list
-            streaks.append(current_streak)
+    def _set_streaks(self, streaks: List[int]) -> int:
+        """
+        Stores the streaks collected by CASE 2.
 
+        Args:
+            streaks: All streak lengths in chronological order (the last one is the current streak).
+        Returns:
+            An integer representing the current streak length in days.
+        """
         # Process the collected streak data:
         # - last item is the current active streak
         self.current_streak = streaks[-1]
@@ -1,5 +1,5 @@
 import time
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from .habit import Habit
 from helpers.text_formating import RED, RES
@@ -18,6 +18,8 @@ class User:
         habits:   A list of Habit objects belonging to the user.
     """
 
+    __slots__ = ("username", "user_id", "habits") # No per-instance __dict__
+
     def __init__(
             self,
             username: Optional[str] = None,
@@ -34,7 +36,7 @@ class User:
         self.user_id = user_id
         self.habits: List[Habit] = [] # Starts with an empty list of habits
 
-    def create_username(self) -> None:
+    def create_username(self, exists: Optional[Callable[[str], bool]] = None) -> None:
         """
         Handles the creation of a new username.
 
@@ -42,9 +44,13 @@ class User:
         - validates against existing usernames in the database
         - handles confirmation through helper function
         - sets the username attribute if successful, or None if canceled
+
+        Args:
+            exists: Checks if a username is taken. Defaults to manager_user_db.username_exists().
         """
         # Avoid circular imports
         from db_and_managers.manager_user_db import username_exists
+        is_taken = exists or username_exists
 
         while True:
             # Ask user for username
@@ -58,7 +64,7 @@ class User:
                 return
 
             # Check if the username already exists (using user db manager function)
-            elif username_exists(username):
+            elif is_taken(username):
                 print(f"\nUsername '{username}' {RED}already{RES} exists!")
                 time.sleep(1)
 
@@ -0,0 +1,338 @@
+"""
+Hot backup module.
+
+Copies the live db with SQLite's online backup API (sqlite3.Connection.backup) instead of copying the file:
+- the copy is a consistent snapshot: writes committed during the backup restart it, torn copies are impossible
+- pages are copied in small steps with a pause in between, so the app's writers only wait for one step
+- backups are written to a partial file, checked (PRAGMA integrity_check), then renamed: a listed backup is complete
+- optional gzip compression, retention of the newest backups, and a background scheduler
+- restore checks the backup first, then copies it into the live db with the same API (open connections stay valid)
+
+Run from the project root:
+    python -m db_and_managers.backup --db habit_tracker.db backup [--dir backups] [--compress] [--keep N] [--every S]
+    python -m db_and_managers.backup --db habit_tracker.db restore <backup file>
+    python -m db_and_managers.backup verify <backup file>
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
+
+import config
+from helpers.db_retry import connect_with_retry
+from .db_structure import DB_TABLES
+
+# Default backup directory, next to the db
+BACKUP_DIR = "backups"
+
+# Pages copied per step, and the pause between two steps (seconds) which lets other connections write
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE = 0.005
+
+# Progress callback: (pages remaining, total pages)
+BackupProgress = Callable[[int, int], None]
+
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection, pages: int, pause: float,
+          progress: Optional[BackupProgress]) -> None:
+    """Copies a db into another one in steps of pages, pausing between the steps."""
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(remaining, total)
+        if remaining and pause:
+            time.sleep(pause)
+
+    source.backup(target, pages=pages, progress=step)
+
+@contextmanager
+def _opened(backup_filepath: str) -> Iterator[str]:
+    """
+    The path of a backup as a plain db file (compressed backups are unpacked to a temporary file).
+
+    Raises:
+        ValueError: If a compressed backup can't be unpacked.
+    """
+    if not backup_filepath.endswith(".gz"):
+        yield backup_filepath
+        return
+
+    handle, unpacked = tempfile.mkstemp(suffix=".db")
+    try:
+        try:
+            with gzip.open(backup_filepath, "rb") as packed, os.fdopen(handle, "wb") as plain:
+                shutil.copyfileobj(packed, plain)
+        except (OSError, EOFError) as error:
+            # Missing or truncated gzip file
+            raise ValueError(f"'{backup_filepath}' can't be unpacked: {error}") from error
+        yield unpacked
+    finally:
+        os.remove(unpacked)
+
+def _check(db_filepath: str) -> bool:
+    """True if a plain db file passes PRAGMA integrity_check and has all tables of the app."""
+    connection = sqlite3.connect(f"file:{db_filepath}?mode=ro", uri=True)
+    try:
+        if connection.execute("PRAGMA integrity_check").fetchall() != [("ok",)]:
+            return False
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return set(DB_TABLES) <= tables
+    except sqlite3.DatabaseError:
+        # Not a db file at all
+        return False
+    finally:
+        connection.close()
+
+def verify_backup(backup_filepath: str) -> bool:
+    """
+    Checks a backup file (plain or gzip compressed).
+
+    Args:
+        backup_filepath: Path to the backup file.
+    Returns:
+        True if the backup is an intact db with all tables of the app.
+    """
+    try:
+        with _opened(backup_filepath) as db_filepath:
+            return _check(db_filepath)
+    except ValueError:
+        return False
+
+def list_backups(directory: str = BACKUP_DIR, db_filepath: Optional[str] = None) -> List[str]:
+    """
+    The backups of a db in a directory, oldest first.
+
+    Args:
+        directory: The backup directory.
+        db_filepath: The db the backups were taken of (defaults to config.DB_FILEPATH).
+    Returns:
+        A list of backup file paths.
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    prefix = os.path.splitext(os.path.basename(db_filepath or config.DB_FILEPATH))[0] + "-"
+    # Timestamped names sort chronologically
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith(prefix) and (name.endswith(".db") or name.endswith(".db.gz"))
+    )
+
+def prune_backups(keep: int, directory: str = BACKUP_DIR, db_filepath: Optional[str] = None) -> List[str]:
+    """
+    Deletes all but the newest backups of a db.
+
+    Args:
+        keep: The number of backups to keep.
+        directory: The backup directory.
+        db_filepath: The db the backups were taken of (defaults to config.DB_FILEPATH).
+    Returns:
+        The deleted backup file paths.
+    """
+    backups = list_backups(directory, db_filepath)
+    expired = backups[:max(len(backups) - keep, 0)]
+    for backup_filepath in expired:
+        os.remove(backup_filepath)
+    return expired
+
+def backup_db(
+        directory: str = BACKUP_DIR,
+        compress: bool = False,
+        keep: Optional[int] = None,
+        db_filepath: Optional[str] = None,
+        pages: int = BACKUP_PAGES_PER_STEP,
+        pause: float = BACKUP_STEP_PAUSE,
+        progress: Optional[BackupProgress] = None
+) -> str:
+    """
+    Takes a hot backup of the db while the app keeps running.
+
+    Args:
+        directory: The backup directory (created if missing).
+        compress: If True, the backup is gzip compressed (.db.gz).
+        keep: The number of backups to keep afterwards, None to keep all.
+        db_filepath: The db to back up (defaults to config.DB_FILEPATH).
+        pages: Pages copied per step.
+        pause: Seconds between two steps.
+        progress: Called after every step with (pages remaining, total pages).
+    Returns:
+        The path of the new backup file.
+    Raises:
+        sqlite3.DatabaseError: If the copy fails its integrity check (nothing is kept then).
+    """
+    db_filepath = db_filepath or config.DB_FILEPATH
+    os.makedirs(directory, exist_ok=True)
+
+    name = os.path.splitext(os.path.basename(db_filepath))[0]
+    backup_filepath = os.path.join(directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.db")
+    partial_filepath = backup_filepath + ".partial"
+
+    source = connect_with_retry(db_filepath)
+    target = sqlite3.connect(partial_filepath)
+    try:
+        _copy(source, target, pages, pause, progress)
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        if not _check(partial_filepath):
+            raise sqlite3.DatabaseError(f"The backup of '{db_filepath}' failed its integrity check.")
+
+        if compress:
+            backup_filepath += ".gz"
+            with open(partial_filepath, "rb") as plain, gzip.open(backup_filepath + ".partial", "wb") as packed:
+                shutil.copyfileobj(plain, packed)
+            os.replace(backup_filepath + ".partial", backup_filepath)
+        else:
+            os.replace(partial_filepath, backup_filepath)
+    finally:
+        if os.path.exists(partial_filepath):
+            os.remove(partial_filepath)
+
+    if keep is not None:
+        prune_backups(keep, directory, db_filepath)
+    return backup_filepath
+
+def restore_backup(
+        backup_filepath: str,
+        db_filepath: Optional[str] = None,
+        pages: int = BACKUP_PAGES_PER_STEP,
+        pause: float = BACKUP_STEP_PAUSE
+) -> None:
+    """
+    Replaces the contents of the db with a backup, after checking the backup.
+
+    - the backup is copied into the live db file with the backup API: it's swapped in one transaction,
+      other connections see either the old or the restored db
+
+    Args:
+        backup_filepath: Path to the backup file (plain or gzip compressed).
+        db_filepath: The db to restore (defaults to config.DB_FILEPATH).
+        pages: Pages copied per step.
+        pause: Seconds between two steps.
+    Raises:
+        ValueError: If the backup fails its check (the db is left untouched).
+        sqlite3.DatabaseError: If the restored db fails its integrity check.
+    """
+    db_filepath = db_filepath or config.DB_FILEPATH
+
+    with _opened(backup_filepath) as plain_filepath:
+        if not _check(plain_filepath):
+            raise ValueError(f"'{backup_filepath}' is not an intact backup, nothing was restored.")
+
+        source = sqlite3.connect(f"file:{plain_filepath}?mode=ro", uri=True)
+        target = connect_with_retry(db_filepath)
+        try:
+            _copy(source, target, pages, pause, None)
+        finally:
+            target.close()
+            source.close()
+
+    if not _check(db_filepath):
+        raise sqlite3.DatabaseError(f"'{db_filepath}' failed its integrity check after the restore.")
+
+
+class BackupScheduler:
+    """
+    Takes hot backups of a db in a background thread.
+
+    Attributes:
+        db_filepath: A string representing the path to the SQLite database file.
+        directory:   A string as the backup directory.
+        interval:    A float as the number of seconds between two backups.
+        keep:        An integer as the number of backups kept, or None to keep all.
+        compress:    A boolean indicating whether the backups are gzip compressed.
+        last_backup: The path of the latest backup, or None.
+        last_error:  The exception of the latest failed backup, or None (a failed backup is retried next interval).
+    """
+
+    def __init__(self, db_filepath: str, directory: str = BACKUP_DIR, interval: float = 3600.0,
+                 keep: Optional[int] = 24, compress: bool = True) -> None:
+        """Initializes the scheduler (see start())."""
+        self.db_filepath = db_filepath
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.compress = compress
+        self.last_backup: Optional[str] = None
+        self.last_error: Optional[Exception] = None
+
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Starts the background thread: the first backup is taken right away."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="backup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background thread, after the backup in progress (if any)."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Background loop: one backup every interval until stopped."""
+        while not self._stopped.is_set():
+            try:
+                self.last_backup = backup_db(self.directory, self.compress, self.keep, self.db_filepath)
+                self.last_error = None
+            except (OSError, sqlite3.Error) as error:
+                self.last_error = error
+            self._stopped.wait(self.interval)
+
+def main() -> None:
+    """Command-line entry point: python -m db_and_managers.backup"""
+    parser = argparse.ArgumentParser(description="Hot backups of a HabitTracker db")
+    parser.add_argument("--db", default="habit_tracker.db", help="SQLite database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup = commands.add_parser("backup", help="take a backup while the app keeps running")
+    backup.add_argument("--dir", default=BACKUP_DIR, help="backup directory")
+    backup.add_argument("--compress", action="store_true", help="gzip compress the backup")
+    backup.add_argument("--keep", type=int, help="number of newest backups to keep")
+    backup.add_argument("--every", type=float, help="keep running and take a backup every this many seconds")
+
+    restore = commands.add_parser("restore", help="check a backup and restore it into the db")
+    restore.add_argument("backup_file")
+
+    verify = commands.add_parser("verify", help="check a backup")
+    verify.add_argument("backup_file")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        intact = verify_backup(args.backup_file)
+        print(f"{args.backup_file}: {'ok' if intact else 'damaged'}")
+        raise SystemExit(0 if intact else 1)
+
+    if args.command == "restore":
+        restore_backup(args.backup_file, args.db)
+        print(f"Restored '{args.db}' from {args.backup_file}")
+        return
+
+    if args.every is None:
+        print(f"Backup written to {backup_db(args.dir, args.compress, args.keep, args.db)}")
+        return
+
+    scheduler = BackupScheduler(args.db, args.dir, args.every, args.keep, args.compress)
+    scheduler.start()
+    print(f"Backing up '{args.db}' to {args.dir}/ every {args.every:g} s (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(args.every)
+            print(scheduler.last_error or f"Latest backup: {scheduler.last_backup}")
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+if __name__ == "__main__":
+    main()
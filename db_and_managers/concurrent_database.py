@@ -0,0 +1,287 @@
+"""
+Concurrency-safe database facade module.
+
+Variant of the Database class for worker pools processing many users' operations in parallel:
+- every thread gets its own SQLite connection to the db file, following the db retry policy
+- no session state: no selected user, no global db filepath - every call gets its user explicitly
+- no user interaction: validation results are returned instead of prompted
+- reuses the manager modules by binding the thread's connection around each call
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.habit import Habit
+from core.periods import is_frequency
+from core.user import User
+from helpers.db_retry import connect_with_retry
+from helpers.helper_functions import bound_connection, transaction
+from .db_structure import db_tables
+from db_and_managers import manager_user_db as user_db
+from db_and_managers import manager_habit_db as habit_db
+from db_and_managers import manager_completion_db as completion_db
+
+
+class ConcurrentDatabase:
+    """
+    Thread-safe entry point for database operations with explicit user context.
+
+    - one instance can be shared by any number of threads
+    - User and Habit objects belong to the caller: threads must not share them while mutating
+
+    Attributes:
+        db_filepath: A string representing the path to the SQLite database file.
+        timeout:     A float as the number of seconds a connection waits for a locked db.
+    """
+
+    def __init__(self, db_filepath: str = "habit_tracker.db", timeout: float = 30.0) -> None:
+        """
+        Initializes the facade and the db tables.
+
+        Args:
+            db_filepath: Path to the SQLite database file.
+            timeout:     Seconds a connection waits for another writer's lock.
+        """
+        self.db_filepath = db_filepath
+        self.timeout = timeout
+
+        self._local = threading.local()                  # Per-thread connection
+        self._connections: List[sqlite3.Connection] = [] # All connections, for close()
+        self._lock = threading.Lock()
+
+        with self._connection_scope():
+            db_tables()
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Returns the calling thread's connection, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # check_same_thread=False only so close() can run from another thread
+            connection = connect_with_retry(self.db_filepath, timeout=self.timeout, check_same_thread=False)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def _connection_scope(self) -> Iterator[None]:
+        """Runs manager functions inside the with-block on the calling thread's connection."""
+        with bound_connection(self._thread_connection()):
+            yield
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Groups the calling thread's operations inside the with-block into one transaction.
+
+        - one commit at the end, rollback if an exception leaves the with-block
+        - nested transactions join the outer one
+        """
+        with self._connection_scope(), transaction():
+            yield
+
+    def close(self) -> None:
+        """Closes the connections of all threads (threads reconnect on their next call)."""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            self._local = threading.local()
+
+    # --------------------
+    # User related methods
+    # --------------------
+    def load_users(self) -> List[User]:
+        """
+        Loads all users from the db.
+
+        Returns:
+            A list of User objects.
+        """
+        with self._connection_scope():
+            return user_db.load_users()
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        """
+        Loads one user by ID (without their habits).
+
+        Args:
+            user_id: The db ID of the user.
+        Returns:
+            The User object, or None if no user has this ID.
+        """
+        with self._connection_scope():
+            return user_db.load_user(user_id)
+
+    def create_user(self, username: str) -> Optional[User]:
+        """
+        Saves a new user to the db.
+
+        Args:
+            username: The username (normalized to title case like in the cli).
+        Returns:
+            The new User object, or None if the username already exists.
+        """
+        username = username.title().strip()
+        with self._connection_scope():
+            if user_db.username_exists(username):
+                return None
+            user = User(username=username)
+            try:
+                user_db.save_user(user)
+            except sqlite3.IntegrityError:
+                # Another thread created the same username in between
+                self._thread_connection().rollback()
+                return None
+            return user
+
+    # ---------------------
+    # Habit related methods
+    # ---------------------
+    def load_habits(self, user: User) -> List[Habit]:
+        """
+        Loads all habits of a user from the db.
+
+        - completion dates are fetched lazily, on this facade's connection of the accessing thread
+
+        Args:
+            user: The User object whose habits to load (its habits attribute is replaced).
+        Returns:
+            A list of Habit objects.
+        """
+        with self._connection_scope():
+            user.habits = habit_db.load_habits(user, completion_loader=self._load_completion_dates)
+            return user.habits
+
+    def _load_completion_dates(self, habit_id: int) -> List[date]:
+        """Lazy completion loader running on the accessing thread's connection."""
+        with self._connection_scope():
+            return habit_db.load_completion_dates(habit_id)
+
+    def create_habit(self, user: User, name: str, frequency: str) -> Optional[Habit]:
+        """
+        Saves a new habit for a user.
+
+        Args:
+            user: The User object owning the habit.
+            name: The habit name (normalized to title case like in the cli).
+            frequency: A frequency supported by core/periods.py ("daily", "weekly", "monthly", "quarterly", "<N>-day").
+        Returns:
+            The new Habit object, or None if the user already has a habit with this name.
+        """
+        if not is_frequency(frequency):
+            raise ValueError(f"Unknown frequency '{frequency}'.")
+
+        habit = Habit()
+        habit.name = name.title().strip()
+        habit.frequency = frequency
+        habit.create_date()
+
+        with self._connection_scope():
+            if habit_db.habit_name_exists(user, habit.name):
+                return None
+            try:
+                habit_db.save_habits(user, new_habit=habit)
+            except sqlite3.IntegrityError:
+                # Another thread created the same habit name in between (unique index)
+                self._thread_connection().rollback()
+                return None
+
+        user.habits.append(habit)
+        return habit
+
+    # --------------------------
+    # Completion related methods
+    # --------------------------
+    def add_completion(self, user: User, habit: Habit, completion_date: date) -> bool:
+        """
+        Marks a user's habit as complete for a date and saves it.
+
+        - checks and saves under the db write lock, on the habit's current dates (see _reload_habits())
+
+        Args:
+            user: The User object owning the habit.
+            habit: The Habit object to complete.
+            completion_date: Today's or a past date.
+        Returns:
+            True if saved, False if the date is in the future or already completed.
+        """
+        today = datetime.now().date()
+        if completion_date > today:
+            return False
+
+        with self._connection_scope(), transaction(immediate=True):
+            self._reload_habits(user, [habit])
+            if completion_db.is_duplicate_completion(habit, completion_date):
+                return False
+
+            completion_db.apply_completion(habit, completion_date, past=completion_date != today)
+            habit_db.save_habit_states([habit_db.habit_state(user, habit)])
+            return True
+
+    def remove_completion(self, user: User, habit: Habit, completion_date: date) -> bool:
+        """
+        Deletes a completion of a user's habit and saves it.
+
+        - checks and saves under the db write lock, on the habit's current dates (see _reload_habits())
+
+        Args:
+            user: The User object owning the habit.
+            habit: The Habit object whose completion to delete.
+            completion_date: The date of the completion.
+        Returns:
+            True if deleted, False if the habit has no completion on this date.
+        """
+        with self._connection_scope(), transaction(immediate=True):
+            self._reload_habits(user, [habit])
+            if completion_date not in habit.completion_dates:
+                return False
+
+            completion_db.apply_deletion(habit, completion_date)
+            habit_db.save_habit_states([habit_db.habit_state(user, habit)])
+            return True
+
+    def _reload_habits(self, user: User, habits: Iterable[Habit]) -> None:
+        """
+        Replaces the completion dates and streaks of a user's habits with the ones stored in the db.
+
+        - called inside a write transaction: another thread's check-off since the habits were loaded
+          is kept instead of being overwritten by this thread's stale copy
+        """
+        stored_habits = {stored.name: stored for stored in habit_db.load_habits(user)}
+        for habit in habits:
+            stored = stored_habits.get(habit.name)
+            if stored is not None:
+                habit.completion_dates = stored.completion_dates
+                habit.completion_dates.mark_saved() # The stored dates: the operation's changes are recorded
+                habit.streaks = stored.streaks
+
+    def complete_habits(self, completions: Iterable[Tuple[User, Habit, date]]) -> List[Tuple[User, Habit, date]]:
+        """
+        Marks many habits as complete, for any number of users and dates, in one transaction.
+
+        - validates and saves under the db write lock, on the habits' current dates (see _reload_habits())
+
+        Args:
+            completions: (user, habit, completion date) triples.
+        Returns:
+            The rejected triples: future dates and periods which are already completed.
+        """
+        completions = list(completions)
+
+        # Every affected habit once, grouped by owner: one reload query per user
+        habits_by_user: Dict[int, Tuple[User, Dict[int, Habit]]] = {}
+        for user, habit, _ in completions:
+            habits_by_user.setdefault(user.user_id, (user, {}))[1][id(habit)] = habit
+
+        with self._connection_scope(), transaction(immediate=True):
+            for user, habits in habits_by_user.values():
+                self._reload_habits(user, habits.values())
+
+            affected, rejected = completion_db.apply_bulk_completions(completions)
+            if affected:
+                habit_db.save_habit_states([habit_db.habit_state(user, habit) for user, habit in affected])
+            return rejected
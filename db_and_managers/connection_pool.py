@@ -0,0 +1,79 @@
+"""
+Connection pool module.
+
+Keeps a fixed number of open SQLite connections for multithreaded callers (e.g. the API server):
+- connections are created once and handed out one request at a time
+- a connection handed out is bound to the calling thread, so manager functions use it transparently
+- callers block (up to a timeout) when every connection is in use
+- connections follow the db retry policy (helpers/db_retry.py)
+"""
+
+import queue
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from helpers.db_retry import connect_with_retry
+from helpers.helper_functions import bound_connection
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections to one db file.
+
+    Attributes:
+        db_filepath: A string representing the path to the SQLite database file.
+        size:        An integer as the number of connections in the pool.
+        timeout:     A float as the number of seconds to wait for a free connection.
+    """
+
+    def __init__(self, db_filepath: str, size: int = 8, timeout: float = 30.0) -> None:
+        """
+        Initializes the pool and opens its connections.
+
+        Args:
+            db_filepath: Path to the SQLite database file.
+            size:        Number of connections to keep open.
+            timeout:     Seconds to wait for a free connection before raising TimeoutError.
+        """
+        self.db_filepath = db_filepath
+        self.size = size
+        self.timeout = timeout
+
+        self._connections: List[sqlite3.Connection] = []
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(size):
+            # Connections move between threads, but only one thread uses a connection at a time
+            connection = connect_with_retry(db_filepath, check_same_thread=False)
+            self._connections.append(connection)
+            self._idle.put(connection)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Hands out a connection for one request and binds it to the calling thread.
+
+        - manager functions called inside the with-block run on this connection
+        - uncommitted changes are rolled back when the connection returns to the pool
+
+        Returns:
+            The pooled connection.
+        """
+        try:
+            connection = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("No free db connection in the pool.") from None
+
+        try:
+            with bound_connection(connection):
+                yield connection
+        finally:
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle.put(connection)
+
+    def close(self) -> None:
+        """Closes every connection of the pool."""
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
@@ -1,10 +1,15 @@
-from typing import List, Optional
+import atexit
+from contextlib import contextmanager
+from datetime import datetime, date
+from typing import Iterable, Iterator, List, Optional, Tuple
 
-from config import set_db_filepath
 from core.user import User
 from core.habit import Habit
-from helpers.helper_functions import cancel_operation
-from .db_structure import db_tables
+from helpers.helper_functions import cancel_operation, register_exit_hook, unregister_exit_hook
+from .sharding import ShardedBackend
+from .storage import SQLiteBackend, StorageBackend
+from .working_set import WorkingSet
+from .write_behind import WriteBehindQueue
 from db_and_managers import manager_user_db as user_db
 from db_and_managers import manager_habit_db as habit_db
 from db_and_managers import manager_completion_db as completion_db
@@ -16,26 +21,156 @@ class Database:
 
     - ONLY methods needed for app functionality (managers handle other necessary functions internally)
     - exclusively manages all data synchronization needed for app functionality
+    - stores through a StorageBackend (storage.py): the db file by default, or e.g. a MemoryBackend for tests
+    - optional sharding: users spread over several db files, routed by user ID (see sharding.py)
+
+    - optional write-behind mode: check-offs are acknowledged in memory and committed in background batches
+    - optional in-memory mode: the whole db is served from RAM and flushed back to the file (see save())
+    - transaction()/batch(): groups multi-step operations and bulk jobs into one commit
 
     Attributes:
         db_filepath: A string representing the path to the SQLite database file.
         user_id: An integer representing the ID of the currently selected user.
+        write_queue: The WriteBehindQueue of pending check-offs, or None if write-behind mode is off.
+        working_set: The in-memory WorkingSet serving all db operations, or None if in-memory mode is off.
+        storage: The StorageBackend all non-interactive operations run on.
     """
 
-    def __init__(self, db_filepath: str = "habit_tracker.db") -> None:
-        """Initializes the Database connection and tables."""
+    def __init__(
+            self,
+            db_filepath: str = "habit_tracker.db",
+            write_behind: bool = False,
+            in_memory: bool = False,
+            flush_interval: Optional[float] = 30.0,
+            backend: Optional[StorageBackend] = None,
+            shards: Optional[int] = None
+    ) -> None:
+        """
+        Initializes the Database connection and tables.
+
+        Args:
+            db_filepath:    Path to the SQLite database file.
+            write_behind:   If True, "complete today" writes are queued and committed in background batches.
+            in_memory:      If True, the db is loaded into memory and changes are flushed back to the file
+                            every flush_interval seconds, on save() and on exit.
+            flush_interval: Seconds between two background flushes of the in-memory mode (None: no timer).
+            backend:        The StorageBackend to use instead of the db file (write-behind and in-memory mode
+                            only apply to the db file).
+            shards:         Number of db files to spread the users over, named after db_filepath
+                            (a ShardedBackend, see sharding.py).
+        Raises:
+            ValueError: If a backend or sharding is combined with write-behind or in-memory mode,
+                        write-behind with in-memory mode, or sharding with another backend.
+        """
+        if write_behind and in_memory:
+            # The write-behind thread would commit on the shared :memory: connection, in the middle of
+            # the app thread's transactions: in-memory writes are already at RAM speed anyway
+            raise ValueError("Write-behind mode can't be combined with in-memory mode.")
+        if (backend is not None or shards is not None) and (write_behind or in_memory):
+            raise ValueError("Write-behind and in-memory mode only apply to the SQLite db file.")
+        if backend is not None and shards is not None:
+            raise ValueError("Sharding brings its own backend.")
+        if shards is not None:
+            backend = ShardedBackend(db_filepath, shards)
+
         self.db_filepath = db_filepath # Store the filepath as an instance attribute
         self.user_id = None            # Current user's ID (set when a user is selected)
-        set_db_filepath(db_filepath)   # Set the global configuration
 
-        # Initialize db tables
-        db_tables()
+        # The db file (sets the global configuration and initializes the db tables) unless another backend is given
+        self.storage: StorageBackend = backend if backend is not None else SQLiteBackend(db_filepath)
+
+        # Loaded after the tables are upgraded
+        self.working_set: Optional[WorkingSet] = None
+        if in_memory:
+            self.working_set = WorkingSet(db_filepath, flush_interval)
+
+        self.write_queue: Optional[WriteBehindQueue] = None
+        if write_behind:
+            # Replays pending writes left by a previous run
+            self.write_queue = WriteBehindQueue(db_filepath + ".pending")
+
+        if write_behind or in_memory:
+            # Flush on "quit" and on any other interpreter exit
+            register_exit_hook(self.close)
+            atexit.register(self.close)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Groups all database operations inside the with-block into one transaction.
+
+        - nested manager calls share one connection and commit once at the end
+        - everything is rolled back if an exception leaves the with-block
+        - nested transactions join the outer one
+
+        Usage:
+            with db.transaction():
+                db.save_habits(user, new_habit)
+                db.load_habits(user)
+        """
+        # Queued check-offs are older than anything written in the transaction
+        self.flush()
+        with self.storage.transaction():
+            yield
+
+    # Alias for bulk jobs: "with db.batch(): ..."
+    batch = transaction
+
+    def flush(self) -> None:
+        """Commits all queued check-offs (no-op if write-behind mode is off)."""
+        if self.write_queue is not None:
+            self.write_queue.flush()
+
+    def save(self, force: bool = False) -> bool:
+        """
+        Flushes queued check-offs, then writes the in-memory working set back to the db file.
+
+        Args:
+            force: If True, the working set overwrites changes another connection committed meanwhile.
+        Returns:
+            True if the db file was written by the in-memory mode.
+        Raises:
+            WorkingSetConflict: If another connection committed to the db file meanwhile (and force is False).
+        """
+        self.flush()
+        if self.working_set is None:
+            return False
+        return self.working_set.flush(force)
+
+    def close(self) -> None:
+        """
+        Flushes queued check-offs and stops the write-behind background thread.
+        In in-memory mode, then flushes the working set and goes back to the db file.
+        """
+        if self.write_queue is None and self.working_set is None:
+            return
+        unregister_exit_hook(self.close)
+        atexit.unregister(self.close)
+
+        if self.write_queue is not None:
+            self.write_queue.close()
+            self.write_queue = None
+        if self.working_set is not None:
+            working_set, self.working_set = self.working_set, None
+            working_set.close()
 
     # All methods delegate to their respective manager modules to handle the db operations
 
     # --------------------
     # User related methods
     # --------------------
+    def load_user(self, user_id: int) -> Optional[User]:
+        """
+        Loads one user by ID from the db (without their habits).
+
+        Args:
+            user_id: The db ID of the user.
+        Returns:
+            The User object, or None if no user has this ID.
+        """
+        self.flush()
+        return self.storage.load_user(user_id)
+
     def load_users(self) -> List[User]:
         """
         Loads all users from the db.
@@ -43,7 +178,8 @@ class Database:
         Returns:
             A list of User objects.
         """
-        users = user_db.load_users()
+        self.flush()
+        users = self.storage.load_users()
         return users
 
     def save_user(self, selected_user) -> None:
@@ -53,13 +189,12 @@ class Database:
         Args:
             selected_user: The User object to save.
         """
-        user_db.save_user(selected_user)
+        self.storage.save_user(selected_user)
 
     def select_user(self) -> Optional[User]:
         """
         Performs multiple steps logic:
-        - loads the users from the database
-        - delegates user selection/creation to the manager function
+        - delegates user selection/creation to the manager function (a picker loading one page of users at a time)
         - sets the user id for further db operations
         - loads the selected user's habits
         - handles operation canceling
@@ -68,8 +203,11 @@ class Database:
              The selected User object if the process isn't canceled.
         """
         while True:
-            users = self.load_users()
-            selected_user = user_db.select_user(users)
+            # Queued check-offs must reach the db before it is read again
+            self.flush()
+            # The picker loads one page of users at a time, from the storage backend
+            selected_user = user_db.select_user(load_page=self.storage.load_user_page,
+                                                exists=self.storage.username_exists)
             if selected_user is not None:
                 if selected_user:
                     if selected_user.user_id is None:
@@ -93,7 +231,8 @@ class Database:
         Args:
             selected_user: The User object to be deleted.
         """
-        user_db.delete_user(selected_user)
+        self.flush()
+        user_db.delete_user(selected_user, remove=self.storage.delete_user)
         # Refresh users list
         self.load_users()
         # Back to user selection
@@ -111,7 +250,9 @@ class Database:
         Returns:
             A list of Habit objects for the selected user.
         """
-        selected_user.habits = habit_db.load_habits(selected_user)
+        # Queued check-offs must reach the db before it is read again
+        self.flush()
+        selected_user.habits = self.storage.load_habits(selected_user)
         return selected_user.habits
 
     def save_habits(self, selected_user, new_habit=None) -> None:
@@ -123,7 +264,9 @@ class Database:
             new_habit:     If provided, saves only this new habit.
                            Otherwise, updates all habits data for the user.
         """
-        habit_db.save_habits(selected_user, new_habit)
+        # Queued check-offs are older than this write
+        self.flush()
+        self.storage.save_habits(selected_user, new_habit)
 
     def new_habit(self, selected_user: User, set_frequency: str = None) -> Optional[Habit]:
         """
@@ -136,10 +279,10 @@ class Database:
         new_habit = habit_db.new_habit(selected_user, set_frequency)
         # Check if the new habit was created successfully, and process wasn't canceled
         if new_habit is not None:
-            # Save
-            self.save_habits(selected_user, new_habit=new_habit)
-            # Refresh habits list
-            self.load_habits(selected_user)
+            # Save and refresh the habits list in one transaction
+            with self.transaction():
+                self.save_habits(selected_user, new_habit=new_habit)
+                self.load_habits(selected_user)
             return new_habit
         else:
             cancel_operation("Habit creation process")
@@ -153,9 +296,14 @@ class Database:
             selected_user: The User object whose habit is to be deleted.
             habit: The Habit object to be deleted.
         """
-        habit_db.delete_habit(selected_user, habit)
-        # Refresh habits list
-        self.load_habits(selected_user)
+        def remove(user: User, habit_name: str) -> None:
+            # Runs after the confirmation prompt: no transaction stays open while waiting for input
+            with self.transaction():
+                self.storage.delete_habit(user, habit_name)
+                # Refresh habits list
+                self.load_habits(user)
+
+        habit_db.delete_habit(selected_user, habit, remove=remove)
 
     # --------------------------
     # Completion related methods
@@ -170,9 +318,7 @@ class Database:
         """
         completion = completion_db.complete_habit_today(habit)
         if completion:
-            habit.completion_dates.append(completion)
-            habit.streaks.get_current_streak(habit.frequency, habit.completion_dates)
-            self.save_habits(selected_user)
+            self._record_completion(selected_user, habit, completion)
 
     def complete_habit_past(self, selected_user: User, habit: Habit) -> None:
         """
@@ -184,9 +330,7 @@ class Database:
         """
         completion = completion_db.complete_habit_past(habit)
         if completion:
-            habit.completion_dates.append(completion)
-            habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, completion)
-            self.save_habits(selected_user)
+            self._record_completion(selected_user, habit, completion, past=True)
 
 
     def delete_completion(self, selected_user: User, habit: Habit) -> None:
@@ -199,6 +343,200 @@ class Database:
         """
         deletion = completion_db.delete_completion(habit)
         if deletion:
-            habit.completion_dates.remove(deletion)
-            habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, deletion)
-            self.save_habits(selected_user)
\ No newline at end of file
+            self._remove_completion(selected_user, habit, deletion)
+
+    def complete_habit_range(self, selected_user: User, habit: Habit) -> None:
+        """
+        Marks the selected habit as complete for a range of past dates.
+
+        Args:
+            selected_user: The User object whose habit is to be completed.
+            habit: The Habit object to be completed.
+        """
+        dates = completion_db.complete_habit_range(habit)
+        if dates:
+            added = self._record_completions(selected_user, habit, dates)
+            completion_db.range_completion_feedback(habit, added)
+
+    def delete_completion_range(self, selected_user: User, habit: Habit) -> None:
+        """
+        Deletes the completions of the selected habit in a range of dates.
+
+        Args:
+            selected_user: The User object which owns the habit.
+            habit: The Habit object whose completions are to be deleted.
+        """
+        deletions = completion_db.delete_completion_range(habit)
+        if deletions:
+            self._remove_completions(selected_user, habit, deletions)
+
+    def add_completion_range(self, selected_user: User, habit: Habit, start_date: date, end_date: date,
+                             weekdays: Optional[Iterable[int]] = None) -> List[date]:
+        """
+        Marks a habit as complete for every date of a range without user interaction.
+
+        - validates all dates in one pass, recalculates the streaks once and saves once
+
+        Args:
+            selected_user: The User object whose habit is to be completed.
+            habit: The Habit object to be completed.
+            start_date: The first date of the range.
+            end_date: The last date of the range.
+            weekdays: Only complete these weekdays (0 for Monday ... 6 for Sunday), None for every day.
+        Returns:
+            The added dates (future dates and already completed periods are skipped).
+        """
+        return self._record_completions(selected_user, habit, completion_db.date_range(start_date, end_date, weekdays))
+
+    def remove_completion_range(self, selected_user: User, habit: Habit, start_date: date, end_date: date,
+                                weekdays: Optional[Iterable[int]] = None) -> List[date]:
+        """
+        Deletes a habit's completions for every date of a range without user interaction.
+
+        - removes all dates as one change, recalculates the streaks once and saves once
+
+        Args:
+            selected_user: The User object which owns the habit.
+            habit: The Habit object whose completions are to be deleted.
+            start_date: The first date of the range.
+            end_date: The last date of the range.
+            weekdays: Only delete on these weekdays (0 for Monday ... 6 for Sunday), None for every day.
+        Returns:
+            The deleted dates.
+        """
+        return self._remove_completions(selected_user, habit, completion_db.date_range(start_date, end_date, weekdays))
+
+    def add_completion(self, selected_user: User, habit: Habit, completion_date: date) -> bool:
+        """
+        Marks a habit as complete for a given date without user interaction (e.g. for the API server).
+
+        Args:
+            selected_user: The User object whose habit is to be completed.
+            habit: The Habit object to be completed.
+            completion_date: Today's or a past date.
+        Returns:
+            True if the completion was saved, False if the date is in the future or already completed.
+        """
+        today = datetime.now().date()
+        if completion_date > today or completion_db.is_duplicate_completion(habit, completion_date):
+            return False
+
+        self._record_completion(selected_user, habit, completion_date, past=completion_date != today)
+        return True
+
+    def remove_completion(self, selected_user: User, habit: Habit, completion_date: date) -> bool:
+        """
+        Deletes a completion of a habit without user interaction (e.g. for the API server).
+
+        Args:
+            selected_user: The User object which owns the habit.
+            habit: The Habit object whose completion is to be deleted.
+            completion_date: The date of the completion.
+        Returns:
+            True if the completion was deleted, False if the habit has no completion on this date.
+        """
+        if completion_date not in habit.completion_dates:
+            return False
+
+        self._remove_completion(selected_user, habit, completion_date)
+        return True
+
+    def complete_habits(self, completions: Iterable[Tuple[User, Habit, date]]) -> List[Tuple[User, Habit, date]]:
+        """
+        Marks many habits as complete, for any number of users and dates, without user interaction.
+
+        - validates all completions in one pass (future dates, already completed periods)
+        - recalculates the streaks once per affected habit
+        - saves all affected habits in one transaction
+
+        Args:
+            completions: (user, habit, completion date) triples, e.g. from a wearable or calendar sync job.
+        Returns:
+            The rejected triples (empty if all completions were saved).
+        """
+        affected, rejected = completion_db.apply_bulk_completions(completions)
+
+        if affected:
+            with self.transaction():
+                self.storage.save_habit_states([habit_db.habit_state(user, habit) for user, habit in affected])
+        return rejected
+
+    def complete_all_due_today(self, selected_user: User) -> List[Habit]:
+        """
+        Marks every habit of the user which isn't completed for the current period yet as complete today.
+
+        Args:
+            selected_user: The User object whose habits to complete.
+        Returns:
+            The completed Habit objects.
+        """
+        today = datetime.now().date()
+        due_habits = [
+            habit for habit in selected_user.habits
+            if not completion_db.is_duplicate_completion(habit, today)
+        ]
+
+        self.complete_habits((selected_user, habit, today) for habit in due_habits)
+        return due_habits
+
+    def _record_completion(self, selected_user: User, habit: Habit, completion: date, past: bool = False) -> None:
+        """
+        Adds a validated completion, updates the streaks and saves the habit.
+
+        Args:
+            selected_user: The User object which owns the habit.
+            habit: The completed Habit object.
+            completion: The completion date.
+            past: True for past completions (full streak recalculation - CASE 2).
+        """
+        completion_db.apply_completion(habit, completion, past)
+
+        if past or self.write_queue is None:
+            self.save_habits(selected_user)
+        else:
+            # Acknowledged in memory, committed with the next batch
+            self.write_queue.enqueue(habit_db.habit_state(selected_user, habit))
+
+    def _record_completions(self, selected_user: User, habit: Habit, dates: List[date]) -> List[date]:
+        """
+        Adds many completions as one change, updates the streaks once and saves the habit once.
+
+        Args:
+            selected_user: The User object which owns the habit.
+            habit: The completed Habit object.
+            dates: The completion dates (future dates and already completed periods are skipped).
+        Returns:
+            The added dates.
+        """
+        added = completion_db.apply_range_completion(selected_user, habit, dates)
+        if added:
+            self.save_habits(selected_user)
+        return added
+
+    def _remove_completions(self, selected_user: User, habit: Habit, dates: List[date]) -> List[date]:
+        """
+        Removes many completions as one change, recalculates the streaks once and saves the habit once.
+
+        Args:
+            selected_user: The User object which owns the habit.
+            habit: The Habit object whose completions are removed.
+            dates: The completion dates to remove (dates without a completion are skipped).
+        Returns:
+            The removed dates.
+        """
+        removed = completion_db.apply_range_deletion(habit, dates)
+        if removed:
+            self.save_habits(selected_user)
+        return removed
+
+    def _remove_completion(self, selected_user: User, habit: Habit, deletion: date) -> None:
+        """
+        Removes an existing completion, recalculates the streaks and saves the habit.
+
+        Args:
+            selected_user: The User object which owns the habit.
+            habit: The Habit object whose completion is removed.
+            deletion: The completion date to remove.
+        """
+        completion_db.apply_deletion(habit, deletion)
+        self.save_habits(selected_user)
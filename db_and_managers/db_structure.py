@@ -4,11 +4,124 @@ Database structure module for the habit tracker app.
 Defines and creates the SQLite database schema used by the app.
 Propagating the core model separation between classes,it handles tables creation with appropriate relationships
 between users, habits, and streaks tables, using foreign key constraints for data integrity.
+It also creates the secondary indexes the managers' lookups rely on (checked by the query plan tests).
+
+Deleting a row deletes everything depending on it (ON DELETE CASCADE, enforced on every connection):
+- tables of older dbs whose foreign keys don't cascade yet are rebuilt once at startup
+- new tables only need to declare their foreign keys with ON DELETE CASCADE in DB_TABLES
+- large deletes run in chunks (see delete_in_chunks()), so other writers aren't blocked for seconds
 """
 
+import sqlite3
+from typing import Callable, List, Optional
+
 from config import DB_FILEPATH
 from helpers.helper_functions import db_connection
 
+# Tables and their column definitions, in creation order (referenced tables first)
+DB_TABLES = {
+    # Users table
+    "users": """
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Auto-incrementing ID for each user
+            username TEXT NOT NULL UNIQUE          -- Username must be unique and not null
+    """,
+    # Habits table
+    "habits": """
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Auto-incrementing ID for each habit
+            user_id INTEGER,                       -- Foreign key to link habit to a user
+            habit_name TEXT NOT NULL,              -- Name of the habit (required)
+            frequency TEXT NOT NULL,               -- Frequency (daily/weekly/monthly/quarterly/N-day)
+            creation_date TEXT NOT NULL,           -- When the habit was created (YYYY-MM-DD)
+            completions_count INTEGER,             -- Count of completions
+            completion_dates TEXT,                 -- Comma separated list of completion dates (or a packed BLOB)
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    """,
+    # Streak table
+    "streaks": """
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Auto-incrementing ID for each streak record
+            habit_id INTEGER,                      -- Foreign key to link streak to a habit
+            current_streak INTEGER,                -- Current active streak
+            longest_streak INTEGER,                -- Longest streak achieved
+            streak_length_history TEXT,            -- Comma separated list of past streak lengths (or a packed BLOB)
+            FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+    """,
+}
+
+# Secondary indexes, by name (users.username is already indexed by its UNIQUE constraint):
+# - habits by user and name: habit lookups, updates and duplicate name checks (user_id alone uses its prefix)
+# - streaks by habit: one streak record per habit, joined and updated by habit id
+# - usernames and habit names without case: the normalized name checks (see name_cache.normalize_name())
+#   are one index probe with "= ? COLLATE NOCASE"
+DB_INDEXES = {
+    "idx_habits_user_name": ("habits", "user_id, habit_name"),
+    "idx_streaks_habit_id": ("streaks", "habit_id"),
+    "idx_users_username_nocase": ("users", "username COLLATE NOCASE"),
+    "idx_habits_user_name_nocase": ("habits", "user_id, habit_name COLLATE NOCASE"),
+}
+
+# Rows deleted per transaction by delete_in_chunks()
+DELETE_CHUNK_SIZE = 500
+
+def db_indexes(cursor) -> None:
+    """
+    Creates the secondary indexes (see DB_INDEXES) if they don't exist yet.
+
+    - the indexes are unique: the managers never store two rows for the same key
+    - dbs which already hold duplicate keys get a non-unique index instead, so lookups are still indexed
+
+    Args:
+        cursor: The cursor of the open db connection.
+    """
+    for index_name, (table, columns) in DB_INDEXES.items():
+        try:
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+        except sqlite3.IntegrityError:
+            # Legacy rows with duplicate keys
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+
+def _needs_cascade(cursor, table: str) -> bool:
+    """True if a table has a foreign key without ON DELETE CASCADE (tables created by older versions)."""
+    # Rows: (id, seq, table, from, to, on_update, on_delete, match)
+    foreign_keys = cursor.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+    return any(foreign_key[6].upper() != "CASCADE" for foreign_key in foreign_keys)
+
+def _rebuild_table(connection, table: str) -> None:
+    """
+    Recreates a table with its current definition from DB_TABLES, keeping all rows and IDs.
+
+    - SQLite can't alter foreign keys: the table is copied into a new one, which then takes its name
+    - runs in one transaction with foreign key enforcement paused (dropping a referenced table would cascade),
+      and fails without changes if the copied rows violate a foreign key
+
+    Args:
+        connection: The open db connection (no transaction may be pending).
+        table: The table name.
+    """
+    cursor = connection.cursor()
+    old_columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    try:
+        cursor.execute("BEGIN")
+        cursor.execute(f"CREATE TABLE {table}_rebuild ({DB_TABLES[table]})")
+        copied = ", ".join(
+            column for column in (row[1] for row in cursor.execute(f"PRAGMA table_info({table}_rebuild)"))
+            if column in old_columns
+        )
+        cursor.execute(f"INSERT INTO {table}_rebuild ({copied}) SELECT {copied} FROM {table}")
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+
+        violations = cursor.execute(f"PRAGMA foreign_key_check({table})").fetchall()
+        if violations:
+            raise sqlite3.IntegrityError(f"{len(violations)} rows of '{table}' violate a foreign key.")
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        cursor.execute("PRAGMA foreign_keys = ON")
+
 def db_tables() -> None:
     """
     The database's tables.
@@ -17,43 +130,71 @@ def db_tables() -> None:
     - users: basic user info
     - habits: habit definitions linked to their user
     - streaks: streak info linked to each habit
+
+    Then rebuilds tables whose foreign keys don't cascade yet, and creates the secondary indexes (see db_indexes()).
+    Each of these is a versioned step in db_and_managers/migrations.py: a db at the current schema version
+    is only checked with one PRAGMA, older dbs are upgraded step by step.
     """
+    # Imported here: the migration steps use the definitions of this module
+    from .migrations import SCHEMA_VERSION, migrate, schema_version
+
     connection = db_connection(DB_FILEPATH)
-    cursor = connection.cursor()
+    current = schema_version(connection) >= SCHEMA_VERSION
+    connection.close()
 
-    # Users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (     
-            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Auto-incrementing ID for each user
-            username TEXT NOT NULL UNIQUE          -- Username must be unique and not null
-        )                                         
-    """)
+    # Startup without DDL
+    if current:
+        return
+    migrate()
 
-    # Habits table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS habits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Auto-incrementing ID for each habit
-            user_id INTEGER,                       -- Foreign key to link habit to a user
-            habit_name TEXT NOT NULL,              -- Name of the habit (required)
-            frequency TEXT NOT NULL,               -- Frequency (daily/weekly)
-            creation_date TEXT NOT NULL,           -- When the habit was created (YYYY-MM-DD)
-            completions_count INTEGER,             -- Count of completions
-            completion_dates TEXT,                 -- Comma separated list of completion dates
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    """)
+def delete_in_chunks(
+        table: str,
+        where: str,
+        parameters: tuple,
+        chunk_size: Optional[int] = None,
+        before_delete: Optional[Callable[[sqlite3.Cursor, List[int]], None]] = None
+) -> int:
+    """
+    Deletes the rows of a table matching a condition, one chunk per transaction.
 
-    # Streak table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS streaks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,      -- Auto-incrementing ID for each streak record
-        habit_id INTEGER,                          -- Foreign key to link streak to a habit
-        current_streak INTEGER,                    -- Current active streak
-        longest_streak INTEGER,                    -- Longest streak achieved
-        streak_length_history TEXT,                -- Comma separated list of past streak lengths
-        FOREIGN KEY (habit_id) REFERENCES habits(id)
-        )
-    """)
+    - dependent rows are deleted by ON DELETE CASCADE in the same chunk
+    - every chunk commits: the write lock is released between chunks, so other writers get their turn
+    - a chunk is selected under the write lock, so before_delete sees exactly the rows deleted with it
+    - inside a transaction() the commits are deferred: the whole delete is then atomic (and holds the lock)
+
+    Args:
+        table: The table name.
+        where: The SQL condition selecting the rows (e.g. "user_id = ?").
+        parameters: The parameters of the condition.
+        chunk_size: Rows deleted per transaction (defaults to DELETE_CHUNK_SIZE).
+        before_delete: Called with the cursor and the IDs of every chunk before it is deleted, in the chunk's
+                       transaction (e.g. to log the deletions, see event_log.log_habits_deleted()).
+    Returns:
+        The number of deleted rows.
+    """
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+
+    connection = db_connection(DB_FILEPATH)
+    try:
+        cursor = connection.cursor()
+
+        deleted = 0
+        while True:
+            if not connection.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"SELECT id FROM {table} WHERE {where} LIMIT ?", (*parameters, chunk_size))
+            ids = [row[0] for row in cursor.fetchall()]
+
+            if ids:
+                if before_delete is not None:
+                    before_delete(cursor, ids)
+                cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            connection.commit()
 
-    connection.commit()
-    connection.close()
\ No newline at end of file
+            deleted += len(ids)
+            if len(ids) < chunk_size:
+                break
+    finally:
+        # Also after a failed chunk: closing an own connection rolls it back (committed chunks stay deleted)
+        connection.close()
+    return deleted
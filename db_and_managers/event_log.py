@@ -0,0 +1,507 @@
+"""
+Completion event log module.
+
+Optional append-only history of every habit change, next to the habits and streaks tables (config.DB_EVENT_LOG):
+- events: habit created, habit deleted, completion added, completion removed - appended by the manager modules in
+  the same transaction as the habits/streaks update, so log and tables never disagree
+- the habits and streaks tables stay the read model the app loads from; the log is the audit trail and the
+  source they can be rebuilt from
+- snapshots: the compact state of a habit (encoded like the habits table) and the id of the last event it covers.
+  A replay reads the snapshot and only the events after it, so its cost is bounded by the snapshot age
+- snapshots are taken in bulk (take_snapshots(), e.g. from a nightly job) and lazily by a replay which had to read
+  more than SNAPSHOT_EVERY events; events covered by a snapshot can be pruned
+- habits which existed before the log was switched on get a baseline snapshot from the tables (see
+  baseline_snapshots(), run at startup while the log is on)
+- restore_aggregates() rewrites the habits and streaks rows from the log, e.g. after a corrupted row
+
+The log follows the db file (SQLite storage backend): the in-memory and write-behind modes log as well.
+
+Run from the project root:
+    python -m db_and_managers.event_log --db habit_tracker.db snapshot [--prune] | verify | restore [--user ID]
+"""
+
+import argparse
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+from config import DB_FILEPATH, set_db_filepath
+from core.habit import Habit
+from core.streaks import Streaks
+from helpers.helper_functions import db_connection
+from .blob_codec import ColumnValue, decode_dates, decode_lengths, encode_dates, encode_lengths
+from .db_structure import db_tables
+
+# Event types
+CREATED = "created"
+DELETED = "deleted"
+COMPLETED = "completed"
+UNCOMPLETED = "uncompleted"
+
+# A replay reading more events than this after the snapshot writes a new snapshot
+SNAPSHOT_EVERY = 200
+
+# Tables of the log (created by schema migration 5, see migrations.py)
+# No foreign keys: the log outlives deleted habits and users
+EVENT_LOG_TABLES = {
+    # Event table: append-only
+    "habit_events": """
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Event order (never reused)
+            user_id INTEGER NOT NULL,              -- Owner of the habit
+            habit_name TEXT NOT NULL,              -- Name of the habit
+            event TEXT NOT NULL,                   -- created/deleted/completed/uncompleted
+            event_date TEXT,                       -- Completion date, or creation date of 'created' (YYYY-MM-DD)
+            frequency TEXT,                        -- Frequency of 'created'
+            recorded_at TEXT NOT NULL              -- When the event was appended (ISO timestamp)
+    """,
+    # Snapshot table: one row per habit
+    "habit_snapshots": """
+            user_id INTEGER NOT NULL,              -- Owner of the habit
+            habit_name TEXT NOT NULL,              -- Name of the habit
+            last_event_id INTEGER NOT NULL,        -- Last event included in the snapshot
+            frequency TEXT NOT NULL,               -- Frequency of the habit
+            creation_date TEXT NOT NULL,           -- When the habit was created (YYYY-MM-DD)
+            completion_dates TEXT,                 -- Completion dates (text or BLOB, as in the habits table)
+            current_streak INTEGER,                -- Streaks at the time of the snapshot
+            longest_streak INTEGER,
+            streak_length_history TEXT,
+            PRIMARY KEY (user_id, habit_name)
+    """,
+}
+
+# Replays read the events of one habit after its snapshot
+EVENT_LOG_INDEXES = {
+    "idx_habit_events_habit": ("habit_events", "user_id, habit_name, id"),
+}
+
+# A habit of the log: (user id, habit name)
+HabitKey = Tuple[int, str]
+
+
+def create_event_log_tables(connection) -> None:
+    """Creates the event and snapshot tables with their index, if they don't exist yet."""
+    for table, columns in EVENT_LOG_TABLES.items():
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    for index_name, (table, columns) in EVENT_LOG_INDEXES.items():
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+
+def enabled() -> bool:
+    """True if habit changes are appended to the log (see config.DB_EVENT_LOG)."""
+    return config.DB_EVENT_LOG
+
+# -------
+# Writing
+# -------
+def _append(cursor, events: Iterable[Tuple]) -> None:
+    """Appends events given as (user_id, habit_name, event, event_date, frequency)."""
+    recorded_at = datetime.now().isoformat(timespec="seconds")
+    cursor.executemany("""
+        INSERT INTO habit_events (user_id, habit_name, event, event_date, frequency, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(*event, recorded_at) for event in events])
+
+def log_habit_created(cursor, user_id: int, habit: Habit) -> None:
+    """
+    Appends the creation of a habit, in the transaction inserting it (no-op while the log is off).
+
+    Args:
+        cursor: The cursor of the open db connection.
+        user_id: The ID of the owner.
+        habit: The new Habit object.
+    """
+    if enabled():
+        _append(cursor, [(user_id, habit.name, CREATED, habit.creation_date.strftime("%Y-%m-%d"), habit.frequency)])
+
+def log_habit_deleted(cursor, user_id: int, habit_name: str) -> None:
+    """Appends the deletion of a habit, before it is deleted (no-op while the log is off)."""
+    if enabled():
+        _append(cursor, [(user_id, habit_name, DELETED, None, None)])
+
+def log_habits_deleted(cursor, habit_ids: List[int]) -> None:
+    """
+    Appends the deletion of the habits with the given IDs, before they are deleted (no-op while the log is off).
+
+    - used per chunk of a chunked delete (see db_structure.delete_in_chunks()), in the chunk's transaction
+    """
+    if enabled() and habit_ids:
+        rows = cursor.execute(
+            f"SELECT user_id, habit_name FROM habits WHERE id IN ({', '.join('?' * len(habit_ids))}) ORDER BY id",
+            habit_ids
+        ).fetchall()
+        _append(cursor, [(user_id, name, DELETED, None, None) for user_id, name in rows])
+
+def log_user_deleted(cursor, user_id: int) -> None:
+    """Appends the deletion of every habit of a user, before they are deleted (no-op while the log is off)."""
+    if enabled():
+        names = cursor.execute("SELECT habit_name FROM habits WHERE user_id = ?", (user_id,)).fetchall()
+        _append(cursor, [(user_id, name, DELETED, None, None) for name, in names])
+
+def log_completion_changes(cursor, user_id: int, habit_name: str, completion_dates: ColumnValue) -> None:
+    """
+    Appends the completions added and removed by an update, before the habits row is overwritten.
+
+    - compares the stored completion dates with the new ones (no-op while the log is off)
+    - only for habit states without recorded changes (see log_completion_events())
+
+    Args:
+        cursor: The cursor of the open db connection.
+        user_id: The ID of the owner.
+        habit_name: The name of the habit.
+        completion_dates: The encoded completion dates about to be stored (see habit_db.habit_state()).
+    """
+    if not enabled():
+        return
+    row = cursor.execute(
+        "SELECT completion_dates FROM habits WHERE user_id = ? AND habit_name = ?", (user_id, habit_name)
+    ).fetchone()
+    if row is None:
+        return
+
+    old, new = Counter(decode_dates(row[0])), Counter(decode_dates(completion_dates))
+    log_completion_events(cursor, user_id, habit_name, (
+        [day.strftime("%Y-%m-%d") for day in sorted((new - old).elements())],
+        [day.strftime("%Y-%m-%d") for day in sorted((old - new).elements())],
+    ))
+
+def log_completion_events(cursor, user_id: int, habit_name: str, changes: Tuple[List[str], List[str]]) -> None:
+    """
+    Appends the completions added and removed by an update, as recorded in memory (no-op while the log is off).
+
+    - no db read: the habit state carries its changes since the last save (see habit_db.habit_state())
+
+    Args:
+        cursor: The cursor of the open db connection.
+        user_id: The ID of the owner.
+        habit_name: The name of the habit.
+        changes: The added and the removed dates ("YYYY-MM-DD").
+    """
+    if not enabled():
+        return
+    added, removed = changes
+    _append(cursor, [(user_id, habit_name, COMPLETED, day, None) for day in added] +
+                    [(user_id, habit_name, UNCOMPLETED, day, None) for day in removed])
+
+# ---------
+# Snapshots
+# ---------
+def baseline_snapshots() -> int:
+    """
+    Snapshots the habits the log doesn't know yet (no snapshot, no events) from the habits and streaks tables.
+
+    - run at startup while the log is on: habits created before it was switched on become replayable
+
+    Returns:
+        The number of snapshots written.
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    cursor.execute("""
+        INSERT INTO habit_snapshots (user_id, habit_name, last_event_id, frequency, creation_date,
+            completion_dates, current_streak, longest_streak, streak_length_history)
+        SELECT habits.user_id, habits.habit_name, (SELECT COALESCE(MAX(id), 0) FROM habit_events),
+            habits.frequency, habits.creation_date, habits.completion_dates,
+            COALESCE(streaks.current_streak, 0), COALESCE(streaks.longest_streak, 0), streaks.streak_length_history
+        FROM habits
+        LEFT JOIN streaks ON streaks.habit_id = habits.id
+        WHERE NOT EXISTS (SELECT 1 FROM habit_snapshots
+                          WHERE habit_snapshots.user_id = habits.user_id
+                              AND habit_snapshots.habit_name = habits.habit_name)
+            AND NOT EXISTS (SELECT 1 FROM habit_events
+                            WHERE habit_events.user_id = habits.user_id
+                                AND habit_events.habit_name = habits.habit_name)
+    """)
+    written = cursor.rowcount
+
+    connection.commit()
+    connection.close()
+    return written
+
+def _write_snapshot(cursor, user_id: int, habit_name: str, habit: Optional[Habit], last_event_id: int) -> None:
+    """Stores the replayed state of a habit as its snapshot (a deleted habit loses its snapshot)."""
+    if habit is None:
+        cursor.execute("DELETE FROM habit_snapshots WHERE user_id = ? AND habit_name = ?", (user_id, habit_name))
+        return
+
+    cursor.execute("""
+        INSERT OR REPLACE INTO habit_snapshots (user_id, habit_name, last_event_id, frequency, creation_date,
+            completion_dates, current_streak, longest_streak, streak_length_history)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        user_id,
+        habit_name,
+        last_event_id,
+        habit.frequency,
+        habit.creation_date.strftime("%Y-%m-%d"),
+        encode_dates(habit.completion_dates),
+        habit.streaks.current_streak,
+        habit.streaks.longest_streak,
+        encode_lengths(habit.streaks.broken_streak_lengths)
+    ))
+
+def take_snapshots(prune: bool = False) -> int:
+    """
+    Snapshots every habit of the log at its latest event, in one transaction.
+
+    Args:
+        prune: If True, also deletes the events the new snapshots cover (gives up their audit trail).
+               Events of deleted habits are kept.
+    Returns:
+        The number of habits replayed.
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    keys = _habit_keys(cursor)
+    for user_id, habit_name in keys:
+        habit, last_event_id, _ = _replay(cursor, user_id, habit_name)
+        _write_snapshot(cursor, user_id, habit_name, habit, last_event_id)
+        if prune and habit is not None:
+            cursor.execute("""
+                DELETE FROM habit_events
+                WHERE user_id = ? AND habit_name = ? AND id <= ?
+            """, (user_id, habit_name, last_event_id))
+
+    connection.commit()
+    connection.close()
+    return len(keys)
+
+# ------
+# Replay
+# ------
+def _habit_keys(cursor, user_id: Optional[int] = None) -> List[HabitKey]:
+    """The habits the log knows (snapshot or events), optionally of one user, in order of appearance."""
+    user_filter, params = ("WHERE user_id = ?", (user_id, user_id)) if user_id is not None else ("", ())
+    rows = cursor.execute(f"""
+        SELECT user_id, habit_name, MIN(position) FROM (
+            SELECT user_id, habit_name, last_event_id AS position FROM habit_snapshots {user_filter}
+            UNION ALL
+            SELECT user_id, habit_name, id AS position FROM habit_events {user_filter}
+        )
+        GROUP BY user_id, habit_name
+        ORDER BY MIN(position), user_id, habit_name
+    """, params).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+def _replay(cursor, user_id: int, habit_name: str) -> Tuple[Optional[Habit], int, int]:
+    """
+    Rebuilds one habit from its snapshot and the events after it.
+
+    Returns:
+        A tuple of (the Habit object or None if it doesn't exist, the id of its last event, the events replayed).
+    """
+    snapshot = cursor.execute("""
+        SELECT last_event_id, frequency, creation_date, completion_dates,
+            current_streak, longest_streak, streak_length_history
+        FROM habit_snapshots
+        WHERE user_id = ? AND habit_name = ?
+    """, (user_id, habit_name)).fetchone()
+
+    habit, last_event_id = None, 0
+    completion_dates: List[date] = []
+    if snapshot is not None:
+        last_event_id = snapshot[0]
+        habit = Habit()
+        habit.name = habit_name
+        habit.frequency = snapshot[1]
+        habit.creation_date = datetime.strptime(snapshot[2], "%Y-%m-%d").date()
+        completion_dates = list(decode_dates(snapshot[3]))
+        habit.streaks = Streaks()
+        habit.streaks.current_streak = snapshot[4] or 0
+        habit.streaks.longest_streak = snapshot[5] or 0
+        habit.streaks.broken_streak_lengths = decode_lengths(snapshot[6])
+
+    events = cursor.execute("""
+        SELECT id, event, event_date, frequency FROM habit_events
+        WHERE user_id = ? AND habit_name = ? AND id > ?
+        ORDER BY id
+    """, (user_id, habit_name, last_event_id)).fetchall()
+
+    for event_id, event, event_date, frequency in events:
+        last_event_id = event_id
+        if event == CREATED:
+            habit = Habit()
+            habit.name = habit_name
+            habit.frequency = frequency
+            habit.creation_date = datetime.strptime(event_date, "%Y-%m-%d").date()
+            completion_dates = []
+        elif event == DELETED:
+            habit = None
+        elif habit is not None and event == COMPLETED:
+            completion_dates.append(datetime.strptime(event_date, "%Y-%m-%d").date())
+        elif habit is not None and event == UNCOMPLETED:
+            day = datetime.strptime(event_date, "%Y-%m-%d").date()
+            if day in completion_dates:
+                completion_dates.remove(day)
+
+    if habit is not None:
+        habit.completion_dates = sorted(completion_dates)
+        if events:
+            # Streaks follow from the completions: recalculated entirely (as for sample data)
+            habit.streaks = Streaks()
+            habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, sample_data=True)
+    return habit, last_event_id, len(events)
+
+def replay_habit(user_id: int, habit_name: str) -> Optional[Habit]:
+    """
+    Rebuilds a habit with its completions and streaks from the log.
+
+    - reads the habit's snapshot and the events after it
+    - writes a new snapshot if more than SNAPSHOT_EVERY events had to be read
+
+    Args:
+        user_id: The ID of the owner.
+        habit_name: The name of the habit.
+    Returns:
+        The Habit object, or None if the log doesn't know the habit or it was deleted.
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    habit, last_event_id, replayed = _replay(cursor, user_id, habit_name)
+    if replayed > SNAPSHOT_EVERY:
+        _write_snapshot(cursor, user_id, habit_name, habit, last_event_id)
+        connection.commit()
+
+    connection.close()
+    return habit
+
+def replay_user(user_id: int) -> List[Habit]:
+    """
+    Rebuilds all existing habits of a user from the log.
+
+    Args:
+        user_id: The ID of the user.
+    Returns:
+        List of Habit objects, in creation order.
+    """
+    connection = db_connection(DB_FILEPATH)
+    keys = _habit_keys(connection.cursor(), user_id)
+    connection.close()
+
+    habits = [replay_habit(key_user_id, habit_name) for key_user_id, habit_name in keys]
+    return [habit for habit in habits if habit is not None]
+
+# --------
+# Recovery
+# --------
+def _stored_dates(cursor, user_id: Optional[int] = None) -> Dict[HabitKey, List[date]]:
+    """The completion dates in the habits table, by habit."""
+    user_filter, params = ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    rows = cursor.execute(
+        f"SELECT user_id, habit_name, completion_dates FROM habits {user_filter}", params
+    ).fetchall()
+    return {(row[0], row[1]): sorted(decode_dates(row[2])) for row in rows}
+
+def diverged_habits(user_id: Optional[int] = None) -> List[HabitKey]:
+    """
+    Compares the habits table with the log.
+
+    Args:
+        user_id: Only compare the habits of this user (None: all users).
+    Returns:
+        The habits whose existence or completion dates differ between table and log.
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    stored = _stored_dates(cursor, user_id)
+    diverged = []
+    for key in _habit_keys(cursor, user_id):
+        habit, _, _ = _replay(cursor, *key)
+        replayed = list(habit.completion_dates) if habit is not None else None
+        if replayed != stored.get(key):
+            diverged.append(key)
+
+    connection.close()
+    return diverged
+
+def restore_aggregates(user_id: Optional[int] = None) -> int:
+    """
+    Rewrites the habits and streaks rows from the log, in one transaction.
+
+    - habits unknown to the log are left alone, habits deleted in the log are deleted
+    - written directly (not through the managers), so the restore itself appends no events
+
+    Args:
+        user_id: Only restore the habits of this user (None: all users).
+    Returns:
+        The number of habits restored or deleted.
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    restored = 0
+    for key_user_id, habit_name in _habit_keys(cursor, user_id):
+        habit, _, _ = _replay(cursor, key_user_id, habit_name)
+        row = cursor.execute(
+            "SELECT id FROM habits WHERE user_id = ? AND habit_name = ?", (key_user_id, habit_name)
+        ).fetchone()
+
+        if habit is None:
+            if row is not None:
+                cursor.execute("DELETE FROM habits WHERE id = ?", (row[0],))
+                restored += 1
+            continue
+
+        values = (habit.frequency, habit.creation_date.strftime("%Y-%m-%d"),
+                  len(habit.completion_dates), encode_dates(habit.completion_dates))
+        if row is not None:
+            habit_id = row[0]
+            cursor.execute("""
+                UPDATE habits SET frequency = ?, creation_date = ?, completions_count = ?, completion_dates = ?
+                WHERE id = ?
+            """, (*values, habit_id))
+            cursor.execute("DELETE FROM streaks WHERE habit_id = ?", (habit_id,))
+        else:
+            if cursor.execute("SELECT 1 FROM users WHERE id = ?", (key_user_id,)).fetchone() is None:
+                continue # The owner is gone
+            cursor.execute("""
+                INSERT INTO habits (user_id, habit_name, frequency, creation_date, completions_count, completion_dates)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key_user_id, habit_name, *values))
+            habit_id = cursor.lastrowid
+
+        cursor.execute("""
+            INSERT INTO streaks (habit_id, current_streak, longest_streak, streak_length_history)
+            VALUES (?, ?, ?, ?)
+        """, (habit_id, habit.streaks.current_streak, habit.streaks.longest_streak,
+              encode_lengths(habit.streaks.broken_streak_lengths)))
+        restored += 1
+
+    connection.commit()
+    connection.close()
+    return restored
+
+def main() -> None:
+    """Command-line entry point: python -m db_and_managers.event_log"""
+    parser = argparse.ArgumentParser(description="Snapshot, verify or restore the habit tables from the event log")
+    parser.add_argument("--db", default=DB_FILEPATH, help="path of the db file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = commands.add_parser("snapshot", help="snapshot every habit at its latest event")
+    snapshot.add_argument("--prune", action="store_true", help="delete the events covered by the snapshots")
+
+    commands.add_parser("verify", help="list the habits whose table rows differ from the log")
+
+    restore = commands.add_parser("restore", help="rewrite the habit tables from the log")
+    restore.add_argument("--user", type=int, default=None, help="only restore this user ID")
+
+    args = parser.parse_args()
+    set_db_filepath(args.db)
+    db_tables() # Upgrades older dbs to the schema with the log tables
+
+    if args.command == "snapshot":
+        baseline_snapshots() # Also habits written while the log was off
+        print(f"Snapshotted {take_snapshots(args.prune)} habits.")
+    elif args.command == "verify":
+        diverged = diverged_habits()
+        for user_id, habit_name in diverged:
+            print(f"User {user_id}: '{habit_name}' differs from the log")
+        print(f"{len(diverged)} habits differ from the log.")
+    else:
+        print(f"Restored {restore_aggregates(args.user)} habits.")
+
+if __name__ == "__main__":
+    main()
@@ -5,44 +5,345 @@ Provides behind the scenes database operations for completions related functiona
 - checking if a habit has already been completed
 - marking habits as complete for today or past dates inputted by the user
 - completion deletion
+- applying validated completions and deletions to habits and their streaks
+- validating and applying bulk completions for many habits and users in one pass
+- completing or deleting a whole date range (with an optional weekday mask) in one operation
 - managing validation and user interaction
 """
 
 from datetime import datetime, date, timedelta
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from helpers.text_formating import RES, GREEN, RED, GRAY
+from core.periods import is_frequency, period_id
 from core.habit import Habit
-from helpers.helper_functions import confirm_input, check_exit_cmd, good_job, enter, invalid_input
+from core.user import User
+from helpers.helper_functions import cancel_operation, confirm_input, check_exit_cmd, good_job, enter, invalid_input
 
 def _is_habit_completed(habit) -> bool:
     """
     Check if the habit is already completed for it's given periodicity.
 
     - for daily habits, checks if completed today
-    - for weekly habits, checks if completed this week
+    - for weekly habits, checks if completed this week (monthly, quarterly, N-day: this month, quarter, cycle)
+    - O(1): looks up the period index of the habit's completion dates
 
     Args:
         habit: The Habit object to check completion for.
     Returns:
         True if already completed, False otherwise.
     """
+    if not is_frequency(habit.frequency):
+        return False
+    return habit.completion_dates.has_period(habit.frequency, datetime.now().date())
+
+def is_duplicate_completion(habit: Habit, completion_date: date) -> bool:
+    """
+    Checks if a completion would duplicate an existing one, without user interaction.
+
+    - one completion per period (day, week, month, quarter or N-day cycle), for today's and past dates alike
+    - the same rule as range and bulk completions (see apply_bulk_completions())
+
+    Args:
+        habit: The Habit object to check.
+        completion_date: The date of the completion to add.
+    Returns:
+        True if the completion's period is already completed, False otherwise.
+    """
+    if not is_frequency(habit.frequency):
+        return completion_date in habit.completion_dates
+    return habit.completion_dates.has_period(habit.frequency, completion_date)
+
+def apply_completion(habit: Habit, completion_date: date, past: bool = False) -> None:
+    """
+    Adds a validated completion to a habit and updates its streaks (no db access).
+
+    Args:
+        habit: The Habit object to complete.
+        completion_date: The completion date.
+        past: True for past completions (full streak recalculation - CASE 2).
+    """
+    habit.completion_dates.append(completion_date)
+
+    if past:
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, completion_date)
+    else:
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates)
+
+def apply_deletion(habit: Habit, deletion_date: date) -> None:
+    """
+    Removes an existing completion from a habit and recalculates its streaks (no db access).
+
+    Args:
+        habit: The Habit object whose completion to remove.
+        deletion_date: The completion date to remove.
+    """
+    habit.completion_dates.remove(deletion_date)
+    habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, deletion_date)
+
+def apply_bulk_completions(
+        completions: Iterable[Tuple[User, Habit, date]]
+) -> Tuple[List[Tuple[User, Habit]], List[Tuple[User, Habit, date]]]:
+    """
+    Validates and applies many completions to their habits (no db access).
+
+    - rejects future dates
+    - rejects completions for a period already completed, in the habit or earlier in the batch
+    - recalculates the streaks once per affected habit (full recalculation - CASE 2)
+
+    Args:
+        completions: (user, habit, completion date) triples, for any number of users and habits.
+    Returns:
+        A tuple of (affected (user, habit) pairs, rejected completion triples).
+    """
     today = datetime.now().date()
 
-    if habit.frequency == "daily":
-        # Check if habit was already completed today
-        return today in habit.completion_dates
+    # Per habit: its owner, the periods completed within the batch and the accepted dates
+    owners: Dict[int, User] = {}
+    habits: Dict[int, Habit] = {}
+    batch_periods: Dict[int, set] = {}
+    accepted: Dict[int, List[date]] = {}
+    rejected = []
+
+    for user, habit, completion_date in completions:
+        key = id(habit)
+        if key not in habits:
+            owners[key] = user
+            habits[key] = habit
+            batch_periods[key] = set()
+            accepted[key] = []
+
+        # O(1) checks: the habit's period index and the batch's own periods
+        period = period_id(habit.frequency, completion_date)
+        if (completion_date > today
+                or period in batch_periods[key]
+                or habit.completion_dates.has_period(habit.frequency, completion_date)):
+            rejected.append((user, habit, completion_date))
+            continue
+
+        batch_periods[key].add(period)
+        accepted[key].append(completion_date)
+
+    affected = []
+    for key, new_dates in accepted.items():
+        if not new_dates:
+            continue
+
+        habit = habits[key]
+        habit.completion_dates.extend(new_dates) # Kept sorted by CompletionDates
+        # One full recalculation covers every added date
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, min(new_dates))
+        affected.append((owners[key], habit))
+
+    return affected, rejected
+
+def date_range(start_date: date, end_date: date, weekdays: Optional[Iterable[int]] = None) -> List[date]:
+    """
+    All dates from start_date to end_date (both included), optionally only on some weekdays.
+
+    Args:
+        start_date: The first date of the range.
+        end_date: The last date of the range.
+        weekdays: The weekdays to keep (0 for Monday ... 6 for Sunday), or None for every day.
+    Returns:
+        A sorted list of dates (empty if end_date is before start_date).
+    """
+    weekdays = set(range(7)) if weekdays is None else set(weekdays)
+    return [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+        if (start_date + timedelta(days=offset)).weekday() in weekdays
+    ]
+
+def apply_range_completion(user: User, habit: Habit, dates: List[date]) -> List[date]:
+    """
+    Adds many completions to a habit and updates its streaks once (no db access).
+
+    - skips future dates and periods which are already completed (see apply_bulk_completions())
+
+    Args:
+        user: The User object which owns the habit.
+        habit: The Habit object to complete.
+        dates: The completion dates.
+    Returns:
+        The added dates.
+    """
+    _, rejected = apply_bulk_completions((user, habit, completion_date) for completion_date in dates)
+    rejected_dates = {completion_date for _, _, completion_date in rejected}
+    return [completion_date for completion_date in dates if completion_date not in rejected_dates]
+
+def apply_range_deletion(habit: Habit, dates: List[date]) -> List[date]:
+    """
+    Removes many completions from a habit as one set-based change and recalculates its streaks once (no db access).
+
+    Args:
+        habit: The Habit object whose completions to remove.
+        dates: The completion dates to remove (dates without a completion are skipped).
+    Returns:
+        The removed dates.
+    """
+    removed = {deletion_date for deletion_date in dates if deletion_date in habit.completion_dates}
+    if not removed:
+        return []
+
+    habit.completion_dates[:] = [
+        completion_date for completion_date in habit.completion_dates if completion_date not in removed
+    ]
+    habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, min(removed))
+    return sorted(removed)
+
+def _prompt_date(prompt: str) -> Optional[date]:
+    """
+    Prompts for a date until a valid one is entered.
+
+    Args:
+        prompt: The text in front of the date format.
+    Returns:
+        The entered date, or None if the user pressed ENTER to exit.
+    """
+    while True:
+        date_str = input(f"\n{prompt} {GREEN}(YYYY-MM-DD){RES} or {enter()} to exit: ").strip()
+
+        # Check for exit command
+        check_exit_cmd(date_str)
+
+        if not date_str:
+            return None
+
+        try:
+            return datetime.strptime(date_str, "%Y-%m-%d").date()
+        except ValueError:
+            # Handle invalid date format
+            invalid_input()
+
+def _prompt_weekdays() -> Optional[List[int]]:
+    """
+    Prompts for an optional weekday mask.
+
+    Returns:
+        The selected weekdays (0 for Monday ... 6 for Sunday), or None for every day.
+    """
+    while True:
+        weekdays_str = input(
+            f"\nEnter weekdays as {GREEN}1-7{RES} (Monday = 1), e.g. {GREEN}1,3,5{RES}, or {enter()} for every day: "
+        ).strip()
+
+        # Check for exit command
+        check_exit_cmd(weekdays_str)
+
+        if not weekdays_str:
+            return None
+
+        try:
+            weekdays = sorted({int(day) - 1 for day in weekdays_str.split(",")})
+            if weekdays and all(0 <= day <= 6 for day in weekdays):
+                return weekdays
+        except ValueError:
+            pass
+        # Handle invalid input
+        invalid_input()
+
+def _prompt_date_range() -> Optional[List[date]]:
+    """
+    Prompts for a date range and an optional weekday mask.
+
+    Returns:
+        The dates of the range, or None if canceled or the range is empty.
+    """
+    start_date = _prompt_date("Enter the FIRST date as")
+    if start_date is None:
+        return None
+    end_date = _prompt_date("Enter the LAST date as")
+    if end_date is None:
+        return None
+
+    if end_date < start_date:
+        input(f"\nThe last date is {RED}before{RES} the first date! {enter()} to return...")
+        return None
+
+    dates = date_range(start_date, end_date, _prompt_weekdays())
+    if not dates:
+        input(f"\n{RED}No{RES} dates match your selection! {enter()} to return...")
+        return None
+    return dates
+
+def complete_habit_range(habit: Habit) -> Optional[List[date]]:
+    """
+    Prompts for a range of past dates to mark as completed.
+
+    - prompts for the first and last date and an optional weekday mask
+    - rejects ranges reaching into the future
+
+    Args:
+        habit: The Habit object to complete.
+    Returns:
+        List: The dates of the range for the Database method it serves (validated there in one pass).
+        None: If completion canceled.
+    """
+    dates = _prompt_date_range()
+    if dates is None:
+        return None
+
+    if dates[-1] > datetime.now().date():
+        input(f"\nYou can't sneak in future dates! {RED}(v_v)*{RES} {enter()} to return...")
+        return None
+
+    return dates
+
+def range_completion_feedback(habit: Habit, added: List[date]) -> None:
+    """
+    Tells the user how many completions of a range were added.
+
+    Args:
+        habit: The completed Habit object.
+        added: The added dates.
+    """
+    if added:
+        good_job("back") # Helper
+        input(f"\nAdded {GREEN}{len(added)}{RES} completion(s)! {enter()} to return...")
+    else:
+        input(f"\n'{habit.name}' is {RED}already{RES} completed for this range! {enter()} to return...")
+
+def delete_completion_range(habit: Habit) -> Optional[List[date]]:
+    """
+    Prompts for a range of dates whose completions to delete.
 
-    elif habit.frequency == "weekly":
-        # Calculate start of the current week (Monday)
-        week_start = today - timedelta(days=today.weekday())
-        # Check if habit was already completed this week
-        return any(
-            week_start <= completion_date <= week_start + timedelta(days=6)
-            for completion_date in habit.completion_dates
-        )
+    - checks if there are any completions to delete
+    - prompts for the first and last date and an optional weekday mask
+    - confirms the deletions
 
-    return False
+    Args:
+        habit: The Habit object whose completions to delete.
+    Returns:
+        List: The completed dates in the range for the Database method it serves.
+        None: If deletion canceled.
+    """
+    # Check if there are no completions to delete
+    if not habit.completion_dates:
+        input(f"\n{RED}No{RES} completions found for '{habit.name}'! {enter()} to return...")
+        return None
+
+    dates = _prompt_date_range()
+    if dates is None:
+        return None
+
+    deletions = [deletion_date for deletion_date in dates if deletion_date in habit.completion_dates]
+    if not deletions:
+        input(f"\n'{habit.name}' has no completions in this range! {enter()} to return...")
+        return None
+
+    # Ask for confirmation
+    confirmation = input(
+        f"\nType '{RED}delete{RES}' to remove {len(deletions)} completion(s) or {enter()} to cancel: "
+    ).lower().strip()
+
+    if confirmation != "delete":
+        cancel_operation() # Helper
+        return None
+
+    print(f"\n{GRAY}Derailed{RES} {len(deletions)} {GRAY}completion(s) from your track! {RED}(x_x)/{RES}")
+    input(f"\n{enter()} to return...")
+    return deletions
 
 def complete_habit_today(habit: Habit) -> Optional[date]:
     """
@@ -74,7 +375,7 @@ def complete_habit_past(habit: Habit) -> Optional[date]:
 
     - prompts for a past date
     - validates date input (not future, proper format)
-    - checks if the date already has a completion
+    - checks if the date's period already has a completion (see is_duplicate_completion())
 
     Args:
         habit: The Habit object to complete.
@@ -105,10 +406,11 @@ def complete_habit_past(habit: Habit) -> Optional[date]:
             if completion_date > current_date:
                 input(f"\nYou can't sneak in future dates! {RED}(v_v)*{RES} {enter()} to return...")
 
-            # Check if this date already has a completion
+            # Check if this date's period already has a completion
             # Let the user exit this "menu" if he wants
-            elif completion_date in habit.completion_dates:
-                input(f"\n'{habit.name}' is {RED}already{RES} completed for {date_str}! {enter()} to return...")
+            elif is_duplicate_completion(habit, completion_date):
+                period = date_str if habit.frequency == "daily" else f"the {habit.frequency} period of {date_str}"
+                input(f"\n'{habit.name}' is {RED}already{RES} completed for {period}! {enter()} to return...")
                 return None
 
             # Valid date that doesn't have a completion
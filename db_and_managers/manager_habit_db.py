@@ -4,12 +4,16 @@ Habit management database module.
 Provides behind the scenes database operations for habit related functionality, including:
 - loading of habits from the db
 - saving of habits and their implicit properties (completions, streaks,etc.)
+- column encoding of completions and streak histories as text or BLOBs (see blob_codec.py)
 - habit creation
 - habit deletion
+- appending every change to the completion event log, if it's on (see event_log.py)
 """
 import time
-from typing import List, Optional
-from datetime import datetime
+from collections import Counter
+from functools import partial
+from typing import Callable, List, Optional, Tuple
+from datetime import datetime, date
 
 from config import DB_FILEPATH
 from core.habit import Habit
@@ -17,17 +21,25 @@ from core.streaks import Streaks
 from core.user import User
 from helpers.text_formating import RED, RES, GRAY
 from helpers.helper_functions import db_connection, save_entry_msg, cancel_operation, enter
-
-def load_habits(selected_user: User) -> List[Habit]:
+from .blob_codec import decode_dates, decode_lengths, encode_dates, encode_lengths
+from .event_log import log_completion_changes, log_completion_events, log_habit_created, log_habit_deleted
+from .name_cache import name_cache, normalize_name
+
+def load_habits(
+        selected_user: User,
+        completion_loader: Optional[Callable[[int], List[date]]] = None
+) -> List[Habit]:
     """
     Loads all habits for the selected user from the db.
 
-    - retrieves habit records
+    - retrieves habit records together with their streak information in one query
     - converts them to Habit objects
-    - loads completion dates and streak information
+    - defers loading completion dates: each habit fetches them on first access
 
     Args:
         selected_user: The User object whose habits to load.
+        completion_loader: Fetches the completion dates of a habit ID on first access.
+                           Defaults to load_completion_dates() on the current db connection.
     Returns:
         List of Habit objects for the selected user.
     """
@@ -35,14 +47,19 @@ def load_habits(selected_user: User) -> List[Habit]:
     cursor = connection.cursor()
 
     cursor.execute("""
-        SELECT id, user_id, habit_name, frequency, creation_date,
-            completions_count, completion_dates
-        FROM habits 
-        WHERE user_id = ?
+        SELECT habits.id, habits.habit_name, habits.frequency, habits.creation_date, habits.completions_count,
+            streaks.current_streak, streaks.longest_streak, streaks.streak_length_history
+        FROM habits
+        LEFT JOIN streaks ON streaks.habit_id = habits.id
+        WHERE habits.user_id = ?
+        ORDER BY habits.id -- Creation order (the user/name index would return them by name)
     """, (selected_user.user_id,))
 
     habit_data = cursor.fetchall()
 
+    if completion_loader is None:
+        completion_loader = load_completion_dates
+
     # List to hold Habit objects
     habits = []
 
@@ -52,45 +69,24 @@ def load_habits(selected_user: User) -> List[Habit]:
 
         # Habit object information
         habit = Habit()
-        habit.name = habit_row[2]
-        habit.frequency = habit_row[3]
+        habit.name = habit_row[1]
+        habit.frequency = habit_row[2]
 
         # Convert creation date to datetime.date object
-        habit.creation_date = datetime.strptime(habit_row[4], "%Y-%m-%d").date()
-
-        # Load completion dates
-        completion_dates = habit_row[6]
-        habit.completion_dates = []
-        if completion_dates:
-            # Convert comma separated string of dates to list of date objects
-            habit.completion_dates = [
-                datetime.strptime(date_str.strip(), "%Y-%m-%d").date()
-                for date_str in completion_dates.split(",")
-            ]
+        habit.creation_date = datetime.strptime(habit_row[3], "%Y-%m-%d").date()
+
+        # Completion dates are only fetched when the habit's calendar, details or completions need them
+        habit.defer_completion_dates(partial(completion_loader, habit_id), habit_row[4])
 
         # Initialize streaks
         habit.streaks = Streaks()
 
-        # Load streak data
-        cursor.execute("""
-            SELECT current_streak, longest_streak, streak_length_history
-            FROM streaks
-            WHERE habit_id = ?
-        """, (habit_id,))
+        # Streak information (None if the habit has no streak record)
+        habit.streaks.current_streak = habit_row[5] or 0 # Default to 0 if None
+        habit.streaks.longest_streak = habit_row[6] or 0
 
-        streak_data = cursor.fetchone()
-
-        if streak_data:
-            # Streak information
-            habit.streaks = Streaks()
-            habit.streaks.current_streak = streak_data[0] or 0 # Default to 0 if None
-            habit.streaks.longest_streak = streak_data[1] or 0
-
-            # Load broken streak history
-            streak_history = streak_data[2]
-            if streak_history and streak_history.strip():
-                # Convert comma separated string to list on integers
-                habit.streaks.broken_streak_lengths = [int(streak) for streak in streak_history.split(",")]
+        # Load broken streak history (BLOB or legacy comma separated text)
+        habit.streaks.broken_streak_lengths = decode_lengths(habit_row[7])
 
         # Add to the list
         habits.append(habit)
@@ -98,6 +94,28 @@ def load_habits(selected_user: User) -> List[Habit]:
     connection.close()
     return habits
 
+def load_completion_dates(habit_id: int) -> List[date]:
+    """
+    Loads the completion dates of one habit from the db.
+
+    - used as the lazy loader of habits returned by load_habits()
+
+    Args:
+        habit_id: The db ID of the habit.
+    Returns:
+        List of completion dates of the habit.
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    cursor.execute("SELECT completion_dates FROM habits WHERE id = ?", (habit_id,))
+    habit_row = cursor.fetchone()
+
+    connection.close()
+
+    # Convert the BLOB or legacy comma separated string of dates to a list of date objects
+    return decode_dates(habit_row[0] if habit_row else None)
+
 def habit_name_exists(selected_user: User, habit_name: str) -> bool:
     """
     Checks if a habit name already exists for the selected user.
@@ -108,22 +126,26 @@ def habit_name_exists(selected_user: User, habit_name: str) -> bool:
     Returns:
          True if the habit name exists for the user, False otherwise.
     """
+    # Outside of bound connections the session name cache answers (no query if the db is unchanged)
+    cache = name_cache()
+    if cache is not None:
+        return cache.habit_name_exists(selected_user.user_id, habit_name)
+
     connection = db_connection(DB_FILEPATH)
     cursor = connection.cursor()
 
-    # Count how many rows exist in the 'habits' table
-    # where both user_id and habit_name match the given values
+    # Normalized like the cache: one probe of the case-insensitive user/name index
     cursor.execute("""
-        SELECT COUNT(*) FROM habits
-        WHERE user_id = ? AND habit_name = ?
-    """, (selected_user.user_id, habit_name))
+        SELECT 1 FROM habits
+        WHERE user_id = ? AND habit_name = ? COLLATE NOCASE
+        LIMIT 1
+    """, (selected_user.user_id, normalize_name(habit_name)))
 
-    # Returns a tuple with 1 element = the count
-    count = cursor.fetchone()[0]
+    exists = cursor.fetchone() is not None
 
     connection.close()
 
-    return count > 0 # If it exists, returns True, else False
+    return exists
 
 def new_habit(selected_user: User, set_frequency: str = None) -> Optional[Habit]:
     """
@@ -171,70 +193,197 @@ def save_habits(selected_user: User, new_habit: Habit = None) -> None:
                    UPDATE If None -> used in completion manager, where
                                      habit: Habit is passed as parameter in the completions functions
     """
+    # The session name cache records the write in place (see name_cache.NameCache.revalidate())
+    cache = name_cache()
+
     connection = db_connection(DB_FILEPATH)
-    cursor = connection.cursor()
+    try:
+        cursor = connection.cursor()
 
-    if new_habit:
-        # Insert the new habit
-        cursor.execute("""
-            INSERT INTO habits (user_id, habit_name, frequency, creation_date,
-            completions_count, completion_dates)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            selected_user.user_id,
-            new_habit.name,
-            new_habit.frequency,
-            new_habit.creation_date.strftime("%Y-%m-%d"),
-            0,  # Initialize completion counts as 0
-            ""  # Initialize completion_dates as an empty string
-        ))
-
-        # Get the auto-generated habit ID
-        habit_id = cursor.lastrowid
-
-        # Initialize streak record
-        cursor.execute("""
-            INSERT INTO streaks (habit_id, current_streak, longest_streak, streak_length_history)
-            VALUES (?, ?, ?, ?)
-        """, (
-            habit_id,
-            0,  # Initialize current_streak as 0
-            0,  # Initialize longest_streak as 0
-            ""  # Initialize streak history as an empty string
-        ))
-
-    else:
-        # Update existing habits
-        for habit in selected_user.habits:
+        if new_habit:
+            # Insert the new habit
             cursor.execute("""
-                UPDATE habits
-                SET completions_count = ?, completion_dates = ?
-                WHERE user_id = ? AND habit_name = ?
+                INSERT INTO habits (user_id, habit_name, frequency, creation_date,
+                completions_count, completion_dates)
+                VALUES (?, ?, ?, ?, ?, ?)
             """, (
-                len(habit.completion_dates), # Update number of completions
-                ",".join(completion_date.strftime("%Y-%m-%d") for completion_date in habit.completion_dates)
-                    if habit.completion_dates else "", # Update completion dates
                 selected_user.user_id,
-                habit.name
+                new_habit.name,
+                new_habit.frequency,
+                new_habit.creation_date.strftime("%Y-%m-%d"),
+                0,  # Initialize completion counts as 0
+                encode_dates([])  # Initialize completion_dates as empty
             ))
 
+            # Get the auto-generated habit ID
+            habit_id = cursor.lastrowid
+
+            # Initialize streak record
             cursor.execute("""
-                UPDATE streaks
-                SET current_streak = ?, longest_streak = ?, streak_length_history = ?
-                WHERE habit_id = (SELECT id FROM habits WHERE user_id = ? AND habit_name = ?)
+                INSERT INTO streaks (habit_id, current_streak, longest_streak, streak_length_history)
+                VALUES (?, ?, ?, ?)
             """, (
-                habit.streaks.current_streak,
-                habit.streaks.longest_streak,
-                # Convert broken_streak_lengths list to a comma separated string
-                ",".join(map(str, habit.streaks.broken_streak_lengths)) if habit.streaks.broken_streak_lengths else "",
-                selected_user.user_id,
-                habit.name
+                habit_id,
+                0,  # Initialize current_streak as 0
+                0,  # Initialize longest_streak as 0
+                encode_lengths([])  # Initialize streak history as empty
             ))
 
+            log_habit_created(cursor, selected_user.user_id, new_habit)
+
+        else:
+            # Update existing habits
+            for habit in selected_user.habits:
+                # Habits whose completions were never loaded haven't changed since load_habits()
+                if not habit.completions_loaded:
+                    continue
+
+                _update_habit_state(cursor, habit_state(selected_user, habit))
+
+        if cache is not None:
+            cache.revalidate()
+        connection.commit()
+    finally:
+        # Also after a failed insert (e.g. a duplicate name): closing an own connection rolls back,
+        # so its write lock is released right away
+        connection.close()
+
+    if cache is not None:
+        if new_habit:
+            cache.habit_saved(selected_user.user_id, new_habit.name)
+        else:
+            cache.write_recorded()
+
+def habit_state(selected_user: User, habit: Habit) -> Tuple:
+    """
+    Serializes the saved state of a habit into db column values.
+
+    Args:
+        selected_user: The User object which owns the habit.
+        habit: The Habit object to serialize.
+    Returns:
+        A tuple of (user_id, habit_name, completions_count, completion_dates,
+                    current_streak, longest_streak, streak_length_history, completion_changes).
+        The two lists are encoded as BLOBs (bytes) or text, depending on config.DB_BLOB_ENCODING.
+        completion_changes are the dates ("YYYY-MM-DD") added and removed since the habit's last state,
+        or None if its dates were replaced as a whole (see CompletionDates.take_changes()).
+    """
+    changes = habit.completion_dates.take_changes()
+    return (
+        selected_user.user_id,
+        habit.name,
+        len(habit.completion_dates), # Number of completions
+        # Convert completion dates to a BLOB or a comma separated string
+        encode_dates(habit.completion_dates),
+        habit.streaks.current_streak,
+        habit.streaks.longest_streak,
+        # Convert broken_streak_lengths to a BLOB or a comma separated string
+        encode_lengths(habit.streaks.broken_streak_lengths),
+        # The event log appends these instead of comparing with the stored dates
+        None if changes is None else tuple([day.strftime("%Y-%m-%d") for day in days] for days in changes)
+    )
+
+def merge_habit_states(older: Tuple, newer: Tuple) -> Tuple:
+    """
+    Coalesces two unsaved states of the same habit into one (e.g. queued check-offs).
+
+    Args:
+        older: The earlier habit state (see habit_state()).
+        newer: The later habit state.
+    Returns:
+        The newer state, carrying the completion changes of both.
+    """
+    if older[7] is None or newer[7] is None:
+        return newer[:7] + (None,)
+
+    net = Counter()
+    for added, removed in (older[7], newer[7]):
+        net.update(added)
+        net.subtract(removed)
+    return newer[:7] + ((sorted((+net).elements()), sorted((-net).elements())),)
+
+def save_habit_states(states: List[Tuple]) -> None:
+    """
+    Updates many habits' completions and streaks in one transaction.
+
+    - used by the write-behind queue to commit a batch of queued check-offs at once
+
+    Args:
+        states: Habit states as returned by habit_state().
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    for state in states:
+        _update_habit_state(cursor, state)
+
+    connection.commit()
+    connection.close()
+
+def _update_habit_state(cursor, state: Tuple) -> None:
+    """
+    Writes one habit state (see habit_state()) to the habits and streaks tables.
+
+    Args:
+        cursor: The cursor of the open db connection.
+        state:  The habit state to write.
+    """
+    user_id, habit_name, completions_count, completion_dates, current_streak, longest_streak, history, changes = state
+
+    # Without recorded changes the log compares with the stored completions, so it runs before they are overwritten
+    if changes is None:
+        log_completion_changes(cursor, user_id, habit_name, completion_dates)
+
+    cursor.execute("""
+        UPDATE habits
+        SET completions_count = ?, completion_dates = ?
+        WHERE user_id = ? AND habit_name = ?
+    """, (completions_count, completion_dates, user_id, habit_name))
+
+    # Recorded changes are only logged for a habit which is still stored
+    if changes is not None and cursor.rowcount:
+        log_completion_events(cursor, user_id, habit_name, changes)
+
+    cursor.execute("""
+        UPDATE streaks
+        SET current_streak = ?, longest_streak = ?, streak_length_history = ?
+        WHERE habit_id = (SELECT id FROM habits WHERE user_id = ? AND habit_name = ?)
+    """, (current_streak, longest_streak, history, user_id, habit_name))
+
+def remove_habit(selected_user: User, habit_name: str) -> None:
+    """
+    Deletes a habit and all associated data from the db, without confirmation.
+
+    Args:
+        selected_user: The User object whose habit to delete.
+        habit_name: The name of the habit to delete.
+    """
+    cache = name_cache()
+
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    log_habit_deleted(cursor, selected_user.user_id, habit_name)
+
+    # Delete habit (its streak record cascades)
+    cursor.execute("""
+        DELETE FROM habits
+        WHERE user_id = ? AND habit_name = ?
+    """, (selected_user.user_id, habit_name))
+
+    if cache is not None:
+        cache.revalidate()
     connection.commit()
     connection.close()
 
-def delete_habit(selected_user: User, habit: Habit) -> None:
+    if cache is not None:
+        cache.habit_removed(selected_user.user_id, habit_name)
+
+def delete_habit(
+        selected_user: User,
+        habit: Habit,
+        remove: Optional[Callable[[User, str], None]] = None
+) -> None:
     """
     Deletes a habit and all associated data from the db.
 
@@ -243,6 +392,8 @@ def delete_habit(selected_user: User, habit: Habit) -> None:
     Args:
         selected_user: The User object whose habit to delete.
         habit: The Habit object to delete.
+        remove: Deletes the confirmed habit by user and name. Defaults to remove_habit() (e.g. a storage backend's
+                delete_habit() instead, see storage.py).
     """
     # Ask for confirmation
     print(f"""
@@ -264,25 +415,7 @@ def delete_habit(selected_user: User, habit: Habit) -> None:
         return  # To the Habit Detail Menu
 
     # If confirmed, continue with deletion
-    connection = db_connection(DB_FILEPATH)
-    cursor = connection.cursor()
-
-    # Find the habit ID
-    cursor.execute("""
-        SELECT id FROM habits
-        WHERE user_id = ? AND habit_name = ?
-    """, (selected_user.user_id, habit.name))
-
-    habit_id = cursor.fetchone()[0]
-
-    # Delete streaks
-    cursor.execute("DELETE FROM streaks WHERE habit_id = ?", (habit_id,))
-
-    # Delete habit
-    cursor.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
-
-    connection.commit()
-    connection.close()
+    (remove or remove_habit)(selected_user, habit.name)
 
     print(f"\n{GRAY}Threw{RES} {habit.name} {GRAY}off your track!{RES} {RED}(x_x)/{RES}")
     time.sleep(1)
@@ -2,28 +2,37 @@
 User management database module.
 
 Provides behind the scenes database operations for user related functionality, including:
-- loading of users from the db
-- user selection
+- loading of users from the db (all users, one by ID, or one page of a username search)
+- user selection, page by page
 - user creation
 - user deletion
 """
 import time
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from config import DB_FILEPATH
 from core.user import User
 from helpers.helper_functions import (db_connection, reload_cli, exit_msg, check_exit_cmd,
                                       setup_header, save_entry_msg, cancel_operation, enter, invalid_input)
 from helpers.text_formating import RED, RES, BLUE, GREEN, GRAY
+from .db_structure import delete_in_chunks
+from .event_log import log_habits_deleted, log_user_deleted
+from .name_cache import name_cache, normalize_name
 
 
 def load_users() -> List[User]:
     """
     Loads all users from the db.
 
+    - outside of bound connections the rows come from the session name cache (no query if the db is unchanged)
+
     Returns:
          A list of User objects.
     """
+    cache = name_cache()
+    if cache is not None:
+        return [User(user_id=user_id, username=username) for user_id, username in cache.users()]
+
     connection = db_connection(DB_FILEPATH)
     cursor = connection.cursor()
 
@@ -38,17 +47,105 @@ def load_users() -> List[User]:
     connection.close()
     return users
 
-def select_user(users: List[User]=None) -> Optional[User]:
+def load_user(user_id: int) -> Optional[User]:
+    """
+    Loads one user from the db.
+
+    Args:
+        user_id: The db ID of the user.
+    Returns:
+        The User object, or None if no user has this ID.
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    cursor.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
+    user_row = cursor.fetchone()
+
+    connection.close()
+    return User(user_id=user_row[0], username=user_row[1]) if user_row else None
+
+# Users shown per page of the user picker
+USER_PAGE_SIZE = 10
+
+def load_user_page(after: Optional[str] = None, prefix: str = "", limit: int = USER_PAGE_SIZE) -> List[User]:
+    """
+    Loads one page of users in username order (keyset pagination).
+
+    - reads a range of the username index: the cost depends on the page size, not on the number of users
+    - the prefix is a range as well (prefix <= username < next prefix), so type-ahead search stays indexed
+
+    Args:
+        after: The last username of the previous page, or None for the first page.
+        prefix: Only usernames starting with it (normalized to title case like usernames), "" for all.
+        limit: The maximum number of users to load.
+    Returns:
+        A list of User objects, at most limit long.
+    """
+    prefix = prefix.title().strip()
+    conditions, parameters = [], []
+
+    # Lower bound: after the previous page, but not before the prefix
+    if after is not None and after >= prefix:
+        conditions.append("username > ?")
+        parameters.append(after)
+    elif prefix:
+        conditions.append("username >= ?")
+        parameters.append(prefix)
+
+    # Upper bound: the first string after all strings starting with the prefix
+    if prefix:
+        conditions.append("username < ?")
+        parameters.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    cursor.execute(f"SELECT id, username FROM users {where} ORDER BY username LIMIT ?", (*parameters, limit))
+    user_data = cursor.fetchall()
+
+    connection.close()
+    return [User(user_id=user_row[0], username=user_row[1]) for user_row in user_data]
+
+def _create_new_user(exists: Optional[Callable[[str], bool]] = None) -> Optional[User]:
+    """Prompts for a new username: returns the new (unsaved) User object, or None if canceled."""
+    reload_cli()
+    setup_header("User")
+
+    selected_user = User()
+    selected_user.create_username(exists)
+
+    if not selected_user.username:
+        return None # If user cancels inside create_username()
+
+    save_entry_msg(selected_user.username) # Helper
+    return selected_user
+
+def select_user(
+        page_size: int = USER_PAGE_SIZE,
+        load_page: Optional[Callable[..., List[User]]] = None,
+        exists: Optional[Callable[[str], bool]] = None
+) -> Optional[User]:
     """
     Prompts the user to select an existing user or create a new one if none exists.
 
+    - shows the users one page at a time: only the visible page is loaded from the db
+    - pages forwards and backwards, and filters by the first letters of the username
+
     Args:
-        users: User objects to be loaded and displayed for choice.
+        page_size: Users shown per page.
+        load_page: Loads one page of users like load_user_page() (the default), e.g. a storage backend's
+                   load_user_page() instead (see storage.py).
+        exists: Checks if a new username is taken. Defaults to username_exists().
     Returns:
         The selected or newly created User object.
     """
+    load_page = load_page or load_user_page
+
     # If there are no users, directly prompt to create a new user
-    if not users:
+    if not load_page(limit=1):
         while True:
             reload_cli()
             exit_msg()
@@ -67,17 +164,7 @@ def select_user(users: List[User]=None) -> Optional[User]:
             check_exit_cmd(choice)
 
             if choice == "1":
-                reload_cli()
-                setup_header("User")
-
-                selected_user = User()
-                selected_user.create_username()
-
-                if not selected_user.username:
-                    return None # If user cancels inside create_username()
-
-                save_entry_msg(selected_user.username)
-                return selected_user
+                return _create_new_user(exists)
 
             elif choice == "2":
                 check_exit_cmd("quit")
@@ -85,76 +172,93 @@ def select_user(users: List[User]=None) -> Optional[User]:
             else:
                 invalid_input()
 
-    # Display the users to choose from
+    # Display the users to choose from, page by page
     else:
+        prefix = ""
+        page_starts = [None] # "after" cursor of every page up to the current one
+
         while True:
+            # One extra row tells if there is a next page
+            users = load_page(page_starts[-1], prefix, page_size + 1)
+            has_next = len(users) > page_size
+            users = users[:page_size]
+
             reload_cli()
             exit_msg()
 
             print(f"Welcome to {BLUE}- - - HabitTracker - - - {GREEN}(^_^)/{RES}")
-            print("\n        Login as: ")
+            search = f" {GRAY}(starting with '{RES}{prefix}{GRAY}'){RES}" if prefix else ""
+            print(f"\n        Login as{search}: {GRAY}page {len(page_starts)}{RES}")
             print("")
 
             # Display users with numeration
             for idx, user in enumerate(users, 1):
                 print(f"        {idx} - {GREEN}{user.username}{RES}")
+            if not users:
+                print(f"        {GRAY}No usernames found.{RES}")
 
-            # Last option: Create new user
+            # Last options: Create new user, quit, paging and search
             print("        or")
             print(f"        {len(users) + 1} - Create a {GREEN}new{RES} user")
             print(f"        {len(users) + 2} - Quit the application")
+            if has_next:
+                print("        N - Next page")
+            if len(page_starts) > 1:
+                print("        P - Previous page")
+            print(f"        S - Search by first letters{' (ENTER to show all)' if prefix else ''}")
 
             # Ask user for a choice
-            choice = input(f"\n        Enter your choice (1-{len(users) + 1}): ").strip()
+            choice = input(f"\n        Enter your choice (1-{len(users) + 2}, N/P/S): ").strip()
 
             check_exit_cmd(choice)
 
-            try:
-                if choice.isdigit() and 1 <= int(choice) <= len(users):
-                    selected_user = users[int(choice) - 1]  # Adjust index since user listing starts from 1
-                    return selected_user
+            if choice.upper() == "N" and has_next:
+                page_starts.append(users[-1].username)
 
-                elif int(choice) == len(users) + 1:
-                    # Create new user
-                    reload_cli()
-                    setup_header("User")
+            elif choice.upper() == "P" and len(page_starts) > 1:
+                page_starts.pop()
 
-                    selected_user = User()
-                    selected_user.create_username()
+            elif choice.upper() == "S":
+                prefix = input(f"\n        First letters of the username or {enter()} to show all: ").strip()
+                check_exit_cmd(prefix)
+                page_starts = [None]
 
-                    if not selected_user.username:
-                        return None # If user cancels inside create_username()
+            elif choice.isdigit() and 1 <= int(choice) <= len(users):
+                return users[int(choice) - 1] # Adjust index since user listing starts from 1
 
-                    save_entry_msg(selected_user.username) # Helper
-                    return selected_user
+            elif choice.isdigit() and int(choice) == len(users) + 1:
+                return _create_new_user(exists)
 
-                elif int(choice) == len(users) + 2:
-                    check_exit_cmd("quit")
-
-                else:
-                    invalid_input()
+            elif choice.isdigit() and int(choice) == len(users) + 2:
+                check_exit_cmd("quit")
 
-            except ValueError:
+            else:
                 invalid_input()
 
 def username_exists(username: str) -> bool:
     """
     Checks if a username already exists in the db.
 
+    - outside of bound connections the session name cache answers (no query if the db is unchanged)
+
     Args:
         username: The username to check for.
     Returns:
         True if the username exists, False otherwise.
     """
+    cache = name_cache()
+    if cache is not None:
+        return cache.username_exists(username)
+
     connection = db_connection(DB_FILEPATH)
     cursor = connection.cursor()
 
-    # Count how many rows exist in the 'habits' table
-    # where username matches the given value
+    # Count how many rows exist in the 'users' table where username matches the given value,
+    # normalized like the cache: one probe of the case-insensitive username index
     cursor.execute("""
-        SELECT COUNT(*) FROM users 
-        WHERE username = ?
-    """, (username,))
+        SELECT COUNT(*) FROM users
+        WHERE username = ? COLLATE NOCASE
+    """, (normalize_name(username),))
 
     # Returns a tuple with 1 element = the count
     count = cursor.fetchone()[0]
@@ -173,18 +277,60 @@ def save_user(user: User) -> None:
     Args:
         user: The User object to save to the db.
     """
+    # The session name cache records the new user in place (see name_cache.NameCache.revalidate())
+    cache = name_cache()
+
+    connection = db_connection(DB_FILEPATH)
+    try:
+        cursor = connection.cursor()
+
+        # Insert new user
+        cursor.execute("INSERT INTO users (username) VALUES (?)", (user.username,))
+        # Get and set the new user id
+        user.user_id = cursor.lastrowid
+
+        if cache is not None:
+            cache.revalidate()
+        connection.commit()
+    finally:
+        # Also after a failed insert (e.g. a duplicate name): closing an own connection rolls back,
+        # so its write lock is released right away
+        connection.close()
+
+    if cache is not None:
+        cache.user_saved(user.user_id, user.username)
+
+def remove_user(selected_user: User) -> None:
+    """
+    Deletes a user and all associated data from the db, without confirmation.
+
+    Args:
+        selected_user: The User object to delete.
+    """
+    cache = name_cache()
+
+    # Delete habits in chunks (their streaks cascade), so other writers aren't blocked by a heavy user.
+    # Every chunk logs its habit deletions in its own transaction
+    delete_in_chunks("habits", "user_id = ?", (selected_user.user_id,), before_delete=log_habits_deleted)
+
     connection = db_connection(DB_FILEPATH)
     cursor = connection.cursor()
 
-    # Insert new user
-    cursor.execute("INSERT INTO users (username) VALUES (?)", (user.username,))
-    # Get and set the new user id
-    user.user_id = cursor.lastrowid
+    # Delete user (any habit added meanwhile cascades: logged under the write lock, in the same transaction)
+    if not connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    log_user_deleted(cursor, selected_user.user_id)
+    cursor.execute("DELETE FROM users WHERE id = ?", (selected_user.user_id,))
 
+    if cache is not None:
+        cache.revalidate()
     connection.commit()
     connection.close()
 
-def delete_user(selected_user) -> None:
+    if cache is not None:
+        cache.user_removed(selected_user.user_id, selected_user.username)
+
+def delete_user(selected_user, remove: Optional[Callable[[User], None]] = None) -> None:
     """
     Deletes a user and all associated data from the db.
 
@@ -192,6 +338,8 @@ def delete_user(selected_user) -> None:
 
     Args:
         selected_user: The User object to delete.
+        remove: Deletes the confirmed user. Defaults to remove_user() (e.g. a storage backend's
+                delete_user() instead, see storage.py).
     """
     # Ask for confirmation
     print(f"""
@@ -213,28 +361,7 @@ def delete_user(selected_user) -> None:
         return # Return to Main Menu
 
     # If confirmed, continue with deletion
-    connection = db_connection(DB_FILEPATH)
-    cursor = connection.cursor()
-
-    # Enable foreign keys
-    cursor.execute("PRAGMA foreign_keys = ON")
-
-    # Delete streaks
-    cursor.execute("""
-        DELETE FROM streaks
-        WHERE habit_id IN (
-        SELECT id FROM habits WHERE user_id = ?
-        )
-    """, (selected_user.user_id,))
-
-    # Delete habits
-    cursor.execute("DELETE FROM habits WHERE user_id = ?", (selected_user.user_id,))
-
-    # Delete user
-    cursor.execute("DELETE FROM users WHERE id = ?", (selected_user.user_id,))
-
-    connection.commit()
-    connection.close()
+    (remove or remove_user)(selected_user)
 
     print(f"\nFarewell, {GREEN}{selected_user.username}{RES}!")
     time.sleep(1)
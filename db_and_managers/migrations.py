@@ -0,0 +1,275 @@
+"""
+Schema migrations module.
+
+Brings any existing db up to the current schema, keyed on PRAGMA user_version:
+- ordered migration steps, each one raising the schema version by one
+- a step has a schema part (DDL, one transaction) and/or a chunked data conversion
+- data conversions run in chunks of rows by id, one transaction per chunk, and record their position in the
+  migration_progress table in the same transaction: an interrupted upgrade resumes where it stopped
+- the app keeps working between chunks (online conversion): readers accept old and new rows during the upgrade
+- progress is reported through a callback (see migrate()) - the command line prints it
+- startup reads one PRAGMA and skips all DDL when the db is at the current version (see db_structure.db_tables())
+
+Every step is idempotent, so dbs created by versions before user_version was kept (version 0) upgrade as well.
+
+Run from the project root (e.g. to upgrade a large db before starting the app, or to convert the columns):
+    python -m db_and_managers.migrations --db habit_tracker.db [--encode blob|text] [--chunk-size N]
+"""
+
+import argparse
+from typing import Callable, List, Optional
+
+from config import DB_FILEPATH, set_db_filepath
+from helpers.helper_functions import db_connection
+from .blob_codec import decode_dates, decode_lengths, encode_dates, encode_lengths
+from .db_structure import DB_TABLES, _needs_cascade, _rebuild_table, db_indexes
+from .event_log import create_event_log_tables
+
+# Rows converted per transaction
+MIGRATION_CHUNK_SIZE = 1000
+
+# A chunk of a data conversion: (cursor, last converted id, chunk size) -> last id of this chunk, None when done
+ChunkConverter = Callable[..., Optional[int]]
+
+# Progress callback: (step description, last converted id, highest id to convert)
+ProgressCallback = Callable[[str, int, int], None]
+
+
+class Migration:
+    """
+    One step of the schema history.
+
+    Attributes:
+        version:     An integer as the schema version after this step.
+        description: A string describing the step (for progress output).
+        schema:      A function applying the DDL on an open connection, or None.
+        convert:     A ChunkConverter converting the rows of the table, or None.
+        table:       A string as the table whose rows the conversion walks through by id.
+    """
+
+    def __init__(
+            self,
+            version: int,
+            description: str,
+            schema: Optional[Callable] = None,
+            convert: Optional[ChunkConverter] = None,
+            table: str = "habits"
+    ) -> None:
+        """Initializes the Migration."""
+        self.version = version
+        self.description = description
+        self.schema = schema
+        self.convert = convert
+        self.table = table
+
+# ---------------
+# Migration steps
+# ---------------
+def _create_tables(connection) -> None:
+    """Version 1: the users, habits and streaks tables."""
+    for table, columns in DB_TABLES.items():
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+
+def _cascade_foreign_keys(connection) -> None:
+    """Version 2: rebuilds tables whose foreign keys don't have ON DELETE CASCADE yet."""
+    connection.commit() # The rebuild needs to pause foreign keys, which is only possible outside a transaction
+    for table in DB_TABLES:
+        if _needs_cascade(connection.cursor(), table):
+            _rebuild_table(connection, table)
+
+def _create_indexes(connection) -> None:
+    """Version 3: the secondary indexes."""
+    db_indexes(connection.cursor())
+
+def _backfill_streaks(cursor, after_id: int, chunk_size: int) -> Optional[int]:
+    """Version 4: adds the missing streak record of every habit (older versions could leave habits without one)."""
+    rows = cursor.execute(
+        "SELECT id FROM habits WHERE id > ? ORDER BY id LIMIT ?", (after_id, chunk_size)
+    ).fetchall()
+    if not rows:
+        return None
+
+    cursor.execute("""
+        INSERT INTO streaks (habit_id, current_streak, longest_streak, streak_length_history)
+        SELECT habits.id, 0, 0, ? FROM habits
+        WHERE habits.id > ? AND habits.id <= ?
+            AND NOT EXISTS (SELECT 1 FROM streaks WHERE streaks.habit_id = habits.id)
+    """, (encode_lengths([]), after_id, rows[-1][0]))
+    return rows[-1][0]
+
+def _create_event_log(connection) -> None:
+    """Version 5: the completion event log and its snapshots (see event_log.py)."""
+    create_event_log_tables(connection)
+
+def _create_nocase_indexes(connection) -> None:
+    """Version 6: the case-insensitive name indexes of the normalized name checks."""
+    db_indexes(connection.cursor())
+
+# Schema history, in order
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create tables", schema=_create_tables),
+    Migration(2, "Cascade foreign keys", schema=_cascade_foreign_keys),
+    Migration(3, "Create secondary indexes", schema=_create_indexes),
+    Migration(4, "Backfill missing streak records", convert=_backfill_streaks),
+    Migration(5, "Create event log tables", schema=_create_event_log),
+    Migration(6, "Create case-insensitive name indexes", schema=_create_nocase_indexes),
+]
+
+# Version of a db with all migrations applied
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+# -------
+# Runner
+# -------
+def schema_version(connection) -> int:
+    """The schema version of the db (PRAGMA user_version, 0 for dbs created before versioning)."""
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+def run_chunked(
+        name: str,
+        table: str,
+        convert: ChunkConverter,
+        chunk_size: int = MIGRATION_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None
+) -> None:
+    """
+    Runs a data conversion in resumable chunks.
+
+    - one transaction per chunk: the converted rows and the new position commit together
+    - the position is kept in the migration_progress table under the conversion's name,
+      so a run which was interrupted continues after the last committed chunk
+
+    Args:
+        name: The name of the conversion (its key in migration_progress).
+        table: The table whose rows are walked through by id.
+        convert: The ChunkConverter.
+        chunk_size: Rows per chunk.
+        progress: Called after every chunk with (name, last converted id, highest id).
+    """
+    connection = db_connection(DB_FILEPATH)
+    cursor = connection.cursor()
+
+    cursor.execute("CREATE TABLE IF NOT EXISTS migration_progress (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+    row = cursor.execute("SELECT last_id FROM migration_progress WHERE name = ?", (name,)).fetchone()
+    last_id = row[0] if row else 0
+    # Rows added while converting are written in the new format by the app itself
+    max_id = cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+    while last_id < max_id:
+        chunk_last_id = convert(cursor, last_id, chunk_size)
+        if chunk_last_id is None:
+            break
+        last_id = chunk_last_id
+        cursor.execute("""
+            INSERT INTO migration_progress (name, last_id) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+        """, (name, last_id))
+        connection.commit()
+
+        if progress is not None:
+            progress(name, last_id, max_id)
+
+    # Done: the position isn't needed anymore
+    cursor.execute("DELETE FROM migration_progress WHERE name = ?", (name,))
+    connection.commit()
+    connection.close()
+
+def migrate(chunk_size: int = MIGRATION_CHUNK_SIZE, progress: Optional[ProgressCallback] = None) -> int:
+    """
+    Applies all pending migrations to the db (config.DB_FILEPATH), in order.
+
+    - the schema version is raised after every step, in the transaction finishing the step
+    - an interrupted upgrade continues with the unfinished step (and inside it, with the next chunk)
+
+    Args:
+        chunk_size: Rows per chunk of data conversions.
+        progress: Called after every chunk with (step description, last converted id, highest id).
+    Returns:
+        The schema version of the db.
+    """
+    connection = db_connection(DB_FILEPATH)
+    version = schema_version(connection)
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+
+        if migration.schema is not None:
+            migration.schema(connection)
+            connection.commit()
+        if migration.convert is not None:
+            run_chunked(f"v{migration.version}", migration.table, migration.convert, chunk_size, progress)
+
+        # PRAGMA user_version can't take parameters
+        connection.execute(f"PRAGMA user_version = {int(migration.version)}")
+        connection.commit()
+        version = migration.version
+
+    connection.close()
+    return version
+
+# -----------------
+# Column conversion
+# -----------------
+def _encode_columns(binary: bool) -> ChunkConverter:
+    """A ChunkConverter rewriting completion dates and streak histories in the text or BLOB encoding."""
+    def convert(cursor, after_id: int, chunk_size: int) -> Optional[int]:
+        rows = cursor.execute("""
+            SELECT habits.id, habits.completion_dates, streaks.streak_length_history
+            FROM habits
+            LEFT JOIN streaks ON streaks.habit_id = habits.id
+            WHERE habits.id > ?
+            ORDER BY habits.id
+            LIMIT ?
+        """, (after_id, chunk_size)).fetchall()
+        if not rows:
+            return None
+
+        cursor.executemany("UPDATE habits SET completion_dates = ? WHERE id = ?", [
+            (encode_dates(decode_dates(dates), binary), habit_id) for habit_id, dates, _ in rows
+        ])
+        cursor.executemany("UPDATE streaks SET streak_length_history = ? WHERE habit_id = ?", [
+            (encode_lengths(decode_lengths(history), binary), habit_id) for habit_id, _, history in rows
+        ])
+        return rows[-1][0]
+    return convert
+
+def encode_columns(binary: bool, chunk_size: int = MIGRATION_CHUNK_SIZE,
+                   progress: Optional[ProgressCallback] = None) -> None:
+    """
+    Rewrites all completion dates and streak histories of the db in one encoding, online and resumable.
+
+    - rolls an existing db over to BLOBs (or back to text) without loading it into memory
+    - rows written by the app meanwhile use its configured encoding; reading accepts both anyway
+
+    Args:
+        binary: True for BLOBs (day bitmaps follow config.DB_DAY_BITMAP_ENCODING), False for text.
+        chunk_size: Habits per chunk.
+        progress: Called after every chunk with (conversion name, last converted id, highest id).
+    """
+    run_chunked(f"encode_{'blob' if binary else 'text'}", "habits", _encode_columns(binary), chunk_size, progress)
+
+def main() -> None:
+    """Command-line entry point: python -m db_and_managers.migrations"""
+    parser = argparse.ArgumentParser(description="Upgrade a HabitTracker db to the current schema")
+    parser.add_argument("--db", default="habit_tracker.db", help="SQLite database file")
+    parser.add_argument("--encode", choices=["blob", "text"], help="also rewrite the columns in this encoding")
+    parser.add_argument("--chunk-size", type=int, default=MIGRATION_CHUNK_SIZE, help="rows per transaction")
+    args = parser.parse_args()
+
+    set_db_filepath(args.db)
+
+    def report(name: str, last_id: int, max_id: int) -> None:
+        print(f"{name}: {last_id:,} / {max_id:,} ({last_id / max_id:.0%})")
+
+    connection = db_connection(DB_FILEPATH)
+    print(f"Schema version: {schema_version(connection)}")
+    connection.close()
+
+    print(f"Migrated to schema version {migrate(args.chunk_size, report)}")
+    if args.encode:
+        encode_columns(args.encode == "blob", args.chunk_size, report)
+        print(f"Columns encoded as {args.encode}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Session name cache module.
+
+Keeps the users and habit names of the db in memory, so interactive validation does no I/O in the common case:
+- username checks are answered by one index probe per name, then from memory
+- habit names are loaded per user, on the first check for that user (one indexed query by user id)
+- the user list is only loaded when all users are asked for
+- own creations and deletions by the managers are applied in place: no reload after an own write
+- revalidated through PRAGMA data_version on one long-lived connection: the version only changes when another
+  connection commits, so an unchanged version means the cache is current - otherwise it's dropped and refilled
+  lazily, lookup by lookup
+- only used by manager calls without a bound connection (the interactive cli): pooled, concurrent and
+  transactional calls query the db directly, so they always see their own uncommitted writes
+
+The unique constraints of the db (the users' and habits' name indexes) stay the final guard
+for names created by another process between a lookup and the insert.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from helpers.db_retry import RetryingConnection, connect_with_retry
+from helpers.helper_functions import has_bound_connection
+
+
+def normalize_name(name: str) -> str:
+    """The cache key of a username or habit name: title case like the cli input, surrounding spaces removed."""
+    return name.title().strip()
+
+
+class NameCache:
+    """
+    The users and habit names of one db file, revalidated through PRAGMA data_version.
+
+    Attributes:
+        db_filepath: A string representing the path to the SQLite database file.
+    """
+
+    def __init__(self, db_filepath: str) -> None:
+        """Initializes the empty cache (it is filled on first use)."""
+        self.db_filepath = db_filepath
+
+        self._connection: Optional[RetryingConnection] = None # Long-lived connection for data_version checks
+        self._data_version: Optional[int] = None              # Version the cached names belong to
+        self._users: Optional[List[Tuple[int, str]]] = None   # (id, username) rows in id order, once asked for
+        self._usernames: Dict[str, bool] = {}                 # Checked normalized usernames: exists or not
+        self._habit_names: Dict[int, Set[str]] = {}           # Normalized habit names of the checked users
+        self._lock = threading.Lock()
+
+    def _current_version(self) -> int:
+        """The data version of the cache connection, opening it on first use."""
+        if self._connection is None:
+            self._connection = connect_with_retry(self.db_filepath, check_same_thread=False)
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _revalidate(self) -> None:
+        """Drops the cached names if another connection committed since the last check."""
+        version = self._current_version()
+        if version == self._data_version:
+            return
+
+        self._users = None
+        self._usernames.clear()
+        self._habit_names.clear()
+        self._data_version = version
+
+    def _user_habit_names(self, user_id: int) -> Set[str]:
+        """The normalized habit names of a user, loaded on first use (range of the user/name index)."""
+        habit_names = self._habit_names.get(user_id)
+        if habit_names is None:
+            rows = self._connection.execute("SELECT habit_name FROM habits WHERE user_id = ?", (user_id,))
+            habit_names = self._habit_names[user_id] = {normalize_name(row[0]) for row in rows}
+        return habit_names
+
+    # -------
+    # Lookups
+    # -------
+    def users(self) -> List[Tuple[int, str]]:
+        """The (id, username) rows of all users, in id order."""
+        with self._lock:
+            self._revalidate()
+            if self._users is None:
+                self._users = self._connection.execute("SELECT id, username FROM users ORDER BY id").fetchall()
+            return list(self._users)
+
+    def username_exists(self, username: str) -> bool:
+        """True if a user has this (normalized) username."""
+        normalized_name = normalize_name(username)
+        with self._lock:
+            self._revalidate()
+            exists = self._usernames.get(normalized_name)
+            if exists is None:
+                row = self._connection.execute(
+                    "SELECT 1 FROM users WHERE username = ? COLLATE NOCASE LIMIT 1", (normalized_name,)
+                ).fetchone()
+                exists = self._usernames[normalized_name] = row is not None
+            return exists
+
+    def habit_name_exists(self, user_id: int, habit_name: str) -> bool:
+        """True if the user has a habit with this (normalized) name."""
+        with self._lock:
+            self._revalidate()
+            return normalize_name(habit_name) in self._user_habit_names(user_id)
+
+    # ----------------------------
+    # Own writes, applied in place
+    # ----------------------------
+    def revalidate(self) -> None:
+        """
+        Brings the cache up to date inside an own write transaction, right before its commit.
+
+        - the own connection holds the write lock: no other connection can commit until the own commit,
+          so the write's record (user_saved(), ...) takes the data version after it as current
+        - only a commit of another connection landing between the own commit and its record could be missed
+          (the unique name indexes still reject its names on insert)
+        """
+        with self._lock:
+            self._revalidate()
+
+    def _adopt_own_write(self) -> None:
+        """Takes the data version after an own commit as current (see revalidate())."""
+        if self._data_version is not None:
+            self._data_version = self._current_version()
+
+    def write_recorded(self) -> None:
+        """Records an own write which doesn't change any names (e.g. saved completions)."""
+        with self._lock:
+            self._adopt_own_write()
+
+    def user_saved(self, user_id: int, username: str) -> None:
+        """Records a user created by the managers."""
+        with self._lock:
+            self._adopt_own_write()
+            self._usernames[normalize_name(username)] = True
+            self._habit_names[user_id] = set()
+            if self._users is not None:
+                self._users.append((user_id, username))
+
+    def user_removed(self, user_id: int, username: str) -> None:
+        """Records a user (and their habits) deleted by the managers."""
+        with self._lock:
+            self._adopt_own_write()
+            self._usernames[normalize_name(username)] = False
+            self._habit_names.pop(user_id, None)
+            if self._users is not None:
+                self._users = [row for row in self._users if row[0] != user_id]
+
+    def habit_saved(self, user_id: int, habit_name: str) -> None:
+        """Records a habit created by the managers."""
+        with self._lock:
+            self._adopt_own_write()
+            if user_id in self._habit_names:
+                self._habit_names[user_id].add(normalize_name(habit_name))
+
+    def habit_removed(self, user_id: int, habit_name: str) -> None:
+        """Records a habit deleted by the managers."""
+        with self._lock:
+            self._adopt_own_write()
+            if user_id in self._habit_names:
+                self._habit_names[user_id].discard(normalize_name(habit_name))
+
+    def close(self) -> None:
+        """Closes the cache connection and empties the cache."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
+            self._data_version = None
+            self._users = None
+            self._usernames.clear()
+            self._habit_names.clear()
+
+# One cache per db file
+_caches: Dict[str, NameCache] = {}
+_caches_lock = threading.Lock()
+
+def name_cache() -> Optional[NameCache]:
+    """
+    The name cache of the current db file (config.DB_FILEPATH).
+
+    Returns:
+        The NameCache, or None if a connection is bound (pools, transactions, ConcurrentDatabase):
+        those calls query their own connection instead.
+    """
+    if has_bound_connection():
+        return None
+
+    db_filepath = os.path.abspath(config.DB_FILEPATH)
+    with _caches_lock:
+        cache = _caches.get(db_filepath)
+        if cache is None:
+            cache = _caches[db_filepath] = NameCache(db_filepath)
+        return cache
+
+def close_name_caches() -> None:
+    """Closes the connections of all name caches (e.g. before deleting a db file)."""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
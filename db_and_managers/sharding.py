@@ -0,0 +1,703 @@
+"""
+Sharding module.
+
+Spreads users over several SQLite files, so writers of different users don't wait for one db lock:
+- ShardedBackend: a StorageBackend (see storage.py) routing every operation of a user to the user's shard file,
+  through the manager modules - the Database facade uses it with Database(shards=N)
+- a small directory file maps user IDs to shards and keeps usernames unique across shards. It's only written when
+  users are created, deleted or moved; new users are placed by a hash of their username
+- shards are ordinary db files with the usual schema, every thread has its own connection to each of them
+- cross-shard reads (user lists, user pages, statistics) run on all shards at once (scatter-gather) and are merged
+- users move between shards online (move_user(), rebalance()): the move holds the source shard's write lock while
+  the user is copied and re-routed. Every routed operation checks in its own transaction that the user is still on
+  the shard, and follows the directory if not - no write is lost, routing caches heal themselves
+- transactions spanning several shards commit shard by shard (no two-phase commit): a failing commit rolls back
+  the shards not committed yet, but not the ones before. A user's own operations always stay on one shard.
+
+Run from the project root (e.g. after adding shards, or to split an existing db file):
+    python -m db_and_managers.sharding --db habit_tracker.db --shards 4 status | import | rebalance [--dry-run]
+    python -m db_and_managers.sharding --db habit_tracker.db --shards 4 move <user ID> <shard>
+"""
+
+import argparse
+import heapq
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from config import DB_FILEPATH
+from core.habit import Habit
+from core.user import User
+from helpers.db_retry import connect_with_retry
+from helpers.helper_functions import bound_connection, db_connection
+from .blob_codec import decode_dates
+from .db_structure import db_tables
+from .name_cache import normalize_name
+from db_and_managers import manager_habit_db as habit_db
+from db_and_managers import manager_user_db as user_db
+
+T = TypeVar("T")
+
+# Directory of the shards: the shard of every user ID, unique usernames
+DIRECTORY_TABLES = {
+    "shard_users": """
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,  -- The user's ID on every shard
+            username TEXT NOT NULL UNIQUE,              -- Usernames are unique across shards
+            shard INTEGER NOT NULL                      -- Number of the shard file holding the user's data
+    """,
+}
+
+# Tables copied when a user moves (or is imported), besides users/habits/streaks
+EVENT_LOG_TABLES = ["habit_events", "habit_snapshots"]
+
+
+def shard_filepaths(db_filepath: str, shards: int) -> Tuple[str, List[str]]:
+    """
+    The files of a sharded db, next to the given db filepath.
+
+    Args:
+        db_filepath: Path of the unsharded db (e.g. "habit_tracker.db").
+        shards: Number of shards.
+    Returns:
+        A tuple of (directory filepath, shard filepaths), e.g. "habit_tracker.directory.db" and
+        ["habit_tracker.shard0.db", "habit_tracker.shard1.db", ...].
+    """
+    root, extension = os.path.splitext(db_filepath)
+    extension = extension or ".db"
+    return f"{root}.directory{extension}", [f"{root}.shard{shard}{extension}" for shard in range(shards)]
+
+def _has_table(connection, table: str) -> bool:
+    """True if the db of a connection has a table (e.g. the event log of older dbs)."""
+    return connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+def _copy_user(source, target, user_id: int) -> bool:
+    """
+    Copies a user with their habits, streaks and event log from one db connection to another.
+
+    - habits get new IDs on the target; events are appended in their order, snapshots point to the copied events
+    - leftovers of an interrupted copy on the target are replaced
+    - doesn't commit either connection
+
+    Returns:
+        True if the user was copied, False if the source has no such user.
+    """
+    user_row = source.execute("SELECT username FROM users WHERE id = ?", (user_id,)).fetchone()
+    if user_row is None:
+        return False
+
+    target.execute("DELETE FROM users WHERE id = ?", (user_id,)) # Cascades to habits and streaks
+    for table in EVENT_LOG_TABLES:
+        target.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+    target.execute("INSERT INTO users (id, username) VALUES (?, ?)", (user_id, user_row[0]))
+
+    habit_rows = source.execute("""
+        SELECT habits.habit_name, habits.frequency, habits.creation_date, habits.completions_count,
+            habits.completion_dates, streaks.current_streak, streaks.longest_streak, streaks.streak_length_history
+        FROM habits
+        LEFT JOIN streaks ON streaks.habit_id = habits.id
+        WHERE habits.user_id = ?
+        ORDER BY habits.id
+    """, (user_id,)).fetchall()
+    for habit_row in habit_rows:
+        cursor = target.execute("""
+            INSERT INTO habits (user_id, habit_name, frequency, creation_date, completions_count, completion_dates)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, *habit_row[:5]))
+        target.execute("""
+            INSERT INTO streaks (habit_id, current_streak, longest_streak, streak_length_history)
+            VALUES (?, ?, ?, ?)
+        """, (cursor.lastrowid, *habit_row[5:]))
+
+    if not all(_has_table(source, table) for table in EVENT_LOG_TABLES):
+        return True
+
+    # Events get new IDs after the target's own ones, in the same order
+    last_event_id = target.execute("SELECT COALESCE(MAX(id), 0) FROM habit_events").fetchone()[0]
+    new_ids: List[Tuple[int, int]] = [] # (source id, target id), ascending
+    for event_id, *event in source.execute("""
+        SELECT id, habit_name, event, event_date, frequency, recorded_at FROM habit_events
+        WHERE user_id = ? ORDER BY id
+    """, (user_id,)).fetchall():
+        cursor = target.execute("""
+            INSERT INTO habit_events (user_id, habit_name, event, event_date, frequency, recorded_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, *event))
+        new_ids.append((event_id, cursor.lastrowid))
+
+    for snapshot in source.execute("""
+        SELECT habit_name, last_event_id, frequency, creation_date, completion_dates,
+            current_streak, longest_streak, streak_length_history
+        FROM habit_snapshots WHERE user_id = ?
+    """, (user_id,)).fetchall():
+        # The last copied event the snapshot covers (pruned events: everything copied before the tail)
+        covered = [new_id for old_id, new_id in new_ids if old_id <= snapshot[1]]
+        target.execute("""
+            INSERT INTO habit_snapshots (user_id, habit_name, last_event_id, frequency, creation_date,
+                completion_dates, current_streak, longest_streak, streak_length_history)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, snapshot[0], covered[-1] if covered else last_event_id, *snapshot[2:]))
+    return True
+
+
+class ShardedBackend:
+    """
+    Users spread over several db files, routed through a directory file.
+
+    Attributes:
+        directory_filepath: A string as the path of the directory file.
+        shard_filepaths:    A list of strings as the paths of the shard files, by shard number.
+    """
+
+    def __init__(self, db_filepath: str = "habit_tracker.db", shards: int = 4) -> None:
+        """
+        Opens (or creates) the directory and the shard files, and creates or upgrades their tables.
+
+        Args:
+            db_filepath: Path of the unsharded db: the sharded files are named after it (see shard_filepaths()).
+            shards: Number of shards. Can grow between runs (rebalance() then spreads the users).
+        Raises:
+            ValueError: If shards is below 1, or the directory places users on shards beyond it.
+        """
+        if shards < 1:
+            raise ValueError("A sharded db needs at least one shard.")
+        self.directory_filepath, self.shard_filepaths = shard_filepaths(db_filepath, shards)
+
+        self._local = threading.local()                   # Per-thread connections and open transaction
+        self._connections: List[sqlite3.Connection] = []  # All connections, for close()
+        self._lock = threading.Lock()
+        self._routes: Dict[int, int] = {}                  # Cached shard by user ID (checked on every use)
+        self._executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="shard")
+
+        directory = self._connection(self.directory_filepath)
+        for table, columns in DIRECTORY_TABLES.items():
+            directory.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+        directory.execute("CREATE INDEX IF NOT EXISTS idx_shard_users_shard ON shard_users (shard)")
+        directory.commit()
+
+        used = directory.execute("SELECT MAX(shard) FROM shard_users").fetchone()[0]
+        if used is not None and used >= shards:
+            raise ValueError(f"The directory places users on shard {used}, but there are only {shards} shards.")
+
+        for filepath in self.shard_filepaths:
+            with bound_connection(self._connection(filepath)):
+                db_tables()
+
+    # -----------
+    # Connections
+    # -----------
+    def _connection(self, filepath: str) -> sqlite3.Connection:
+        """Returns the calling thread's connection to a file, opening it on first use."""
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get(filepath)
+        if connection is None:
+            # check_same_thread=False only so close() can run from another thread
+            connection = connect_with_retry(filepath, check_same_thread=False)
+            connections[filepath] = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _begin(self, filepath: str, write: bool) -> Tuple[sqlite3.Connection, bool]:
+        """
+        Starts a transaction on the calling thread's connection to a file, or joins the open one.
+
+        - writes take the file's write lock right away (BEGIN IMMEDIATE), so checks and writes are atomic
+        - inside transaction() every file joins with the write lock, and stays in until the end of the transaction
+
+        Returns:
+            A tuple of (the connection, True if this call started its transaction or joined it to transaction()).
+        """
+        connection = self._connection(filepath)
+        joined = getattr(self._local, "joined", None)
+        if joined is not None:
+            if filepath in joined:
+                return connection, False
+            connection.execute("BEGIN IMMEDIATE")
+            joined[filepath] = connection
+            return connection, True
+
+        connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        return connection, True
+
+    def _end(self, filepath: str, connection: sqlite3.Connection, failed: bool = False) -> None:
+        """Commits (or rolls back) what _begin() started, unless the file belongs to transaction()."""
+        joined = getattr(self._local, "joined", None)
+        if joined is not None and filepath in joined:
+            return
+        if failed:
+            connection.rollback()
+        else:
+            connection.commit()
+
+    def _leave(self, filepath: str, connection: sqlite3.Connection, started: bool) -> None:
+        """Undoes a _begin() which only read (releasing its lock), also if it joined transaction()."""
+        joined = getattr(self._local, "joined", None)
+        if started and joined is not None:
+            del joined[filepath]
+        if started:
+            connection.rollback()
+
+    @contextmanager
+    def _on_file(self, filepath: str, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """Runs manager functions inside the with-block in one transaction on a file."""
+        connection, _ = self._begin(filepath, write)
+        try:
+            with bound_connection(connection, defer_commit=True):
+                yield connection
+        except BaseException:
+            self._end(filepath, connection, failed=True)
+            raise
+        self._end(filepath, connection)
+
+    @contextmanager
+    def _on_user(self, user_id: Optional[int], write: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Runs manager functions inside the with-block in one transaction on the user's shard.
+
+        - checks inside the transaction that the user is still on the cached shard: a moved user is followed to
+          their new shard (the move held the old shard's write lock until the user was gone from it)
+        - unknown users (e.g. deleted ones) go to shard 0, where they aren't found either
+        """
+        shard = self.shard_of(user_id) if user_id is not None else None
+        filepath = self.shard_filepaths[shard if shard is not None else 0]
+        connection, started = self._begin(filepath, write)
+
+        # Follow the user until the shard holding the lock is theirs (they can move again meanwhile)
+        while shard is not None and not self._holds(connection, user_id):
+            moved = self.shard_of(user_id, refresh=True)
+            self._leave(filepath, connection, started)
+            if moved is None or moved == shard:
+                # Deleted meanwhile: nothing to follow
+                connection, started = self._begin(filepath, write)
+                break
+            shard, filepath = moved, self.shard_filepaths[moved]
+            connection, started = self._begin(filepath, write)
+
+        try:
+            with bound_connection(connection, defer_commit=True):
+                yield connection
+        except BaseException:
+            self._end(filepath, connection, failed=True)
+            raise
+        self._end(filepath, connection)
+
+    @staticmethod
+    def _holds(connection: sqlite3.Connection, user_id: int) -> bool:
+        """True if the shard of a connection holds the user."""
+        return connection.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone() is not None
+
+    # -------
+    # Routing
+    # -------
+    def placement(self, username: str) -> int:
+        """The shard of a new user: a stable hash of the username."""
+        return zlib.crc32(username.encode("utf-8")) % len(self.shard_filepaths)
+
+    def shard_of(self, user_id: int, refresh: bool = False) -> Optional[int]:
+        """
+        The shard holding a user.
+
+        Args:
+            user_id: The ID of the user.
+            refresh: If True, reads the directory instead of the routing cache.
+        Returns:
+            The shard number, or None if the directory doesn't know the user.
+        """
+        if not refresh and user_id in self._routes:
+            return self._routes[user_id]
+
+        row = self._connection(self.directory_filepath).execute(
+            "SELECT shard FROM shard_users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            self._routes.pop(user_id, None)
+            return None
+        self._routes[user_id] = row[0]
+        return row[0]
+
+    # --------------
+    # Scatter-gather
+    # --------------
+    def scatter(self, function: Callable[[], T]) -> List[T]:
+        """
+        Runs a function on every shard at once, each in a read transaction on its shard.
+
+        - the function reads through db_connection() (manager functions or own queries)
+
+        Args:
+            function: Called once per shard, without arguments.
+        Returns:
+            The results, by shard number.
+        """
+        def run(filepath: str) -> T:
+            with self._on_file(filepath):
+                return function()
+        return list(self._executor.map(run, self.shard_filepaths))
+
+    def statistics(self) -> dict:
+        """
+        Habit statistics across all shards (scatter-gather).
+
+        Returns:
+            A dict with the number of users, habits and completions, the habits and completions by frequency,
+            and the longest streak as (username, habit name, length), or None without streaks.
+        """
+        def shard_statistics() -> tuple:
+            connection = db_connection(DB_FILEPATH) # The shard's connection
+            users = connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            by_frequency = connection.execute("""
+                SELECT frequency, COUNT(*), COALESCE(SUM(completions_count), 0) FROM habits GROUP BY frequency
+            """).fetchall()
+            longest = connection.execute("""
+                SELECT users.username, habits.habit_name, streaks.longest_streak
+                FROM streaks
+                JOIN habits ON habits.id = streaks.habit_id
+                JOIN users ON users.id = habits.user_id
+                ORDER BY streaks.longest_streak DESC
+                LIMIT 1
+            """).fetchone()
+            return users, by_frequency, longest
+
+        statistics = {"users": 0, "habits": 0, "completions": 0, "by_frequency": {}, "longest_streak": None}
+        for users, by_frequency, longest in self.scatter(shard_statistics):
+            statistics["users"] += users
+            for frequency, habits, completions in by_frequency:
+                totals = statistics["by_frequency"].setdefault(frequency, {"habits": 0, "completions": 0})
+                totals["habits"] += habits
+                totals["completions"] += completions
+                statistics["habits"] += habits
+                statistics["completions"] += completions
+            if longest is not None and (statistics["longest_streak"] is None
+                                        or longest[2] > statistics["longest_streak"][2]):
+                statistics["longest_streak"] = tuple(longest)
+        return statistics
+
+    # -----
+    # Users
+    # -----
+    def load_users(self) -> List[User]:
+        """All users of all shards, by user ID (a user in the middle of a move is listed once)."""
+        users = {user.user_id: user for shard_users in self.scatter(user_db.load_users) for user in shard_users}
+        return [users[user_id] for user_id in sorted(users)]
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        """Through manager_user_db.load_user() on the user's shard."""
+        if self.shard_of(user_id) is None:
+            return None
+        with self._on_user(user_id):
+            return user_db.load_user(user_id)
+
+    def load_user_page(self, after: Optional[str] = None, prefix: str = "",
+                       limit: int = user_db.USER_PAGE_SIZE) -> List[User]:
+        """The same page on every shard (manager_user_db.load_user_page()), merged in username order."""
+        pages = self.scatter(partial(user_db.load_user_page, after, prefix, limit))
+        users, seen = [], set()
+        for user in heapq.merge(*pages, key=lambda user: user.username):
+            if user.user_id not in seen:
+                seen.add(user.user_id)
+                users.append(user)
+        return users[:limit]
+
+    def username_exists(self, username: str) -> bool:
+        """Looked up in the directory, normalized like manager_user_db.username_exists()."""
+        return self._connection(self.directory_filepath).execute(
+            "SELECT 1 FROM shard_users WHERE username IN (?, ?)", (normalize_name(username), username.strip())
+        ).fetchone() is not None
+
+    def save_user(self, user: User) -> None:
+        """Registers the user in the directory (unique username, new ID), then stores them on their shard."""
+        with self.transaction():
+            with self._on_file(self.directory_filepath, write=True) as directory:
+                shard = self.placement(user.username)
+                user_id = directory.execute(
+                    "INSERT INTO shard_users (username, shard) VALUES (?, ?)", (user.username, shard)
+                ).lastrowid
+            with self._on_file(self.shard_filepaths[shard], write=True) as connection:
+                connection.execute("INSERT INTO users (id, username) VALUES (?, ?)", (user_id, user.username))
+        self._routes[user_id] = shard
+        user.user_id = user_id
+
+    def delete_user(self, user: User) -> None:
+        """Through manager_user_db.remove_user() on the user's shard, then removes the user from the directory."""
+        with self.transaction():
+            with self._on_user(user.user_id, write=True):
+                user_db.remove_user(user)
+            with self._on_file(self.directory_filepath, write=True) as directory:
+                directory.execute("DELETE FROM shard_users WHERE user_id = ?", (user.user_id,))
+        self._routes.pop(user.user_id, None)
+
+    # ------
+    # Habits
+    # ------
+    def load_habits(self, user: User) -> List[Habit]:
+        """Through manager_habit_db.load_habits() on the user's shard; completions are loaded lazily by name."""
+        with self._on_user(user.user_id):
+            habits = habit_db.load_habits(user)
+
+        for habit in habits:
+            # Habit IDs change when the user moves: the lazy loader finds the habit by user and name
+            habit.defer_completion_dates(partial(self._load_completion_dates, user.user_id, habit.name),
+                                         habit.completions_count)
+        return habits
+
+    def _load_completion_dates(self, user_id: int, habit_name: str) -> list:
+        """Lazy completion loader: the habit's completion dates on the user's current shard."""
+        with self._on_user(user_id) as connection:
+            row = connection.execute(
+                "SELECT completion_dates FROM habits WHERE user_id = ? AND habit_name = ?", (user_id, habit_name)
+            ).fetchone()
+        return decode_dates(row[0] if row else None)
+
+    def habit_name_exists(self, user: User, habit_name: str) -> bool:
+        """Through manager_habit_db.habit_name_exists() on the user's shard."""
+        with self._on_user(user.user_id):
+            return habit_db.habit_name_exists(user, habit_name)
+
+    def save_habits(self, user: User, new_habit: Optional[Habit] = None) -> None:
+        """Through manager_habit_db.save_habits() on the user's shard."""
+        with self._on_user(user.user_id, write=True):
+            habit_db.save_habits(user, new_habit)
+
+    def delete_habit(self, user: User, habit_name: str) -> None:
+        """Through manager_habit_db.remove_habit() on the user's shard."""
+        with self._on_user(user.user_id, write=True):
+            habit_db.remove_habit(user, habit_name)
+
+    # -----------------------------
+    # Completions, streaks, batches
+    # -----------------------------
+    def save_habit_states(self, states: List[Tuple]) -> None:
+        """Through manager_habit_db.save_habit_states(), per user on their shard, in one transaction."""
+        by_user: Dict[int, List[Tuple]] = {}
+        for state in states:
+            by_user.setdefault(state[0], []).append(state)
+
+        with self.transaction():
+            for user_id, user_states in by_user.items():
+                with self._on_user(user_id, write=True):
+                    habit_db.save_habit_states(user_states)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Joins every file the with-block touches into one transaction, committed file by file at the end.
+
+        - rolled back on every file if an exception leaves the with-block
+        - nested transactions join the outer one
+        """
+        if getattr(self._local, "joined", None) is not None:
+            yield
+            return
+
+        joined: Dict[str, sqlite3.Connection] = {}
+        self._local.joined = joined
+        try:
+            yield
+            for connection in joined.values():
+                connection.commit()
+        except BaseException:
+            for connection in joined.values():
+                connection.rollback() # No-op on the files committed already
+            raise
+        finally:
+            self._local.joined = None
+
+    # -----------
+    # Rebalancing
+    # -----------
+    def shard_sizes(self) -> List[int]:
+        """The number of users on every shard, by shard number."""
+        sizes = [0] * len(self.shard_filepaths)
+        for shard, users in self._connection(self.directory_filepath).execute(
+                "SELECT shard, COUNT(*) FROM shard_users GROUP BY shard"):
+            sizes[shard] = users
+        return sizes
+
+    def move_user(self, user_id: int, target: int) -> bool:
+        """
+        Moves a user with all their data to another shard, while the app keeps running.
+
+        - holds the source shard's write lock from the copy until the user is deleted from it: writes of the user
+          wait and then follow the directory to the target shard
+        - the target copy is committed before the directory points to it, the source copy is deleted after:
+          an interrupted move never loses data, and can simply be run again
+
+        Args:
+            user_id: The ID of the user.
+            target: The number of the target shard.
+        Returns:
+            True if the user was moved, False if they are unknown or already on the target shard.
+        Raises:
+            ValueError: If the target shard doesn't exist.
+        """
+        if not 0 <= target < len(self.shard_filepaths):
+            raise ValueError(f"There is no shard {target}.")
+        source = self.shard_of(user_id, refresh=True)
+        if source is None or source == target:
+            return False
+
+        source_connection = self._connection(self.shard_filepaths[source])
+        target_connection = self._connection(self.shard_filepaths[target])
+        directory = self._connection(self.directory_filepath)
+
+        source_connection.execute("BEGIN IMMEDIATE")
+        try:
+            if not _copy_user(source_connection, target_connection, user_id):
+                source_connection.rollback()
+                return False
+            target_connection.commit()
+
+            directory.execute("UPDATE shard_users SET shard = ? WHERE user_id = ?", (target, user_id))
+            directory.commit()
+            self._routes[user_id] = target
+
+            source_connection.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            for table in EVENT_LOG_TABLES:
+                if _has_table(source_connection, table):
+                    source_connection.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            source_connection.commit()
+        except BaseException:
+            target_connection.rollback()
+            directory.rollback()
+            source_connection.rollback()
+            raise
+        return True
+
+    def plan_rebalance(self) -> List[Tuple[int, int, int]]:
+        """
+        The moves evening out the number of users per shard (differences of at most one user).
+
+        Returns:
+            A list of (user ID, source shard, target shard) moves, newest users first.
+        """
+        sizes = self.shard_sizes()
+        directory = self._connection(self.directory_filepath)
+        moves = []
+        while max(sizes) - min(sizes) > 1:
+            source, target = sizes.index(max(sizes)), sizes.index(min(sizes))
+            moved = {user_id for user_id, _, _ in moves}
+            for user_id, in directory.execute(
+                    "SELECT user_id FROM shard_users WHERE shard = ? ORDER BY user_id DESC", (source,)):
+                if user_id not in moved:
+                    moves.append((user_id, source, target))
+                    break
+            sizes[source] -= 1
+            sizes[target] += 1
+        return moves
+
+    def rebalance(self, progress: Optional[Callable[[int, int, int], None]] = None) -> int:
+        """
+        Evens out the number of users per shard, one online move at a time (see plan_rebalance()).
+
+        Args:
+            progress: Called after every move with (user ID, source shard, target shard).
+        Returns:
+            The number of users moved.
+        """
+        moved = 0
+        for user_id, source, target in self.plan_rebalance():
+            if self.move_user(user_id, target):
+                moved += 1
+                if progress is not None:
+                    progress(user_id, source, target)
+        return moved
+
+    def import_db(self, db_filepath: str) -> int:
+        """
+        Copies the users of an unsharded db file to their shards, keeping their IDs.
+
+        - users whose username is already in the directory are skipped, so an interrupted import can be run again
+
+        Args:
+            db_filepath: Path of the unsharded db.
+        Returns:
+            The number of users imported.
+        Raises:
+            ValueError: If a user ID of the db already belongs to another user of the directory.
+        """
+        source = connect_with_retry(db_filepath)
+        directory = self._connection(self.directory_filepath)
+        imported = 0
+        try:
+            for user_id, username in source.execute("SELECT id, username FROM users ORDER BY id").fetchall():
+                if self.username_exists(username):
+                    continue
+                if self.shard_of(user_id, refresh=True) is not None:
+                    raise ValueError(f"User ID {user_id} of '{db_filepath}' already belongs to another user.")
+
+                shard = self.placement(username)
+                target = self._connection(self.shard_filepaths[shard])
+                try:
+                    _copy_user(source, target, user_id)
+                    target.commit()
+                except BaseException:
+                    target.rollback()
+                    raise
+                directory.execute("INSERT INTO shard_users (user_id, username, shard) VALUES (?, ?, ?)",
+                                  (user_id, username, shard))
+                directory.commit()
+                self._routes[user_id] = shard
+                imported += 1
+        finally:
+            source.close()
+        return imported
+
+    def close(self) -> None:
+        """Stops the scatter-gather threads and closes the connections of all threads."""
+        self._executor.shutdown()
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            self._local = threading.local()
+
+def main() -> None:
+    """Command-line entry point: python -m db_and_managers.sharding"""
+    parser = argparse.ArgumentParser(description="Inspect, fill and rebalance the shards of a sharded db")
+    parser.add_argument("--db", default="habit_tracker.db", help="path of the unsharded db the shards are named after")
+    parser.add_argument("--shards", type=int, required=True, help="number of shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="users per shard and statistics across all shards")
+    commands.add_parser("import", help="copy the users of the unsharded db to their shards")
+    rebalance = commands.add_parser("rebalance", help="even out the users per shard, online")
+    rebalance.add_argument("--dry-run", action="store_true", help="only list the moves")
+    move = commands.add_parser("move", help="move one user to another shard, online")
+    move.add_argument("user_id", type=int)
+    move.add_argument("shard", type=int)
+
+    args = parser.parse_args()
+    backend = ShardedBackend(args.db, args.shards)
+    try:
+        if args.command == "status":
+            for shard, users in enumerate(backend.shard_sizes()):
+                print(f"Shard {shard}: {users} users ({backend.shard_filepaths[shard]})")
+            statistics = backend.statistics()
+            print(f"{statistics['users']} users, {statistics['habits']} habits, "
+                  f"{statistics['completions']} completions")
+        elif args.command == "import":
+            print(f"Imported {backend.import_db(args.db)} users.")
+        elif args.command == "rebalance" and args.dry_run:
+            for user_id, source, target in backend.plan_rebalance():
+                print(f"User {user_id}: shard {source} -> shard {target}")
+        elif args.command == "rebalance":
+            moved = backend.rebalance(lambda user_id, source, target:
+                                      print(f"Moved user {user_id}: shard {source} -> shard {target}"))
+            print(f"Moved {moved} users.")
+        else:
+            moved = backend.move_user(args.user_id, args.shard)
+            print(f"Moved user {args.user_id}." if moved else f"User {args.user_id} wasn't moved.")
+    finally:
+        backend.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Storage backend module.
+
+Defines what the Database facade needs from a store, so the store can be swapped:
+- StorageBackend: the protocol - users, habits with their completions and streaks, batch writes, transactions
+- SQLiteBackend: the db file, through the manager modules (the default of the Database class)
+- MemoryBackend: plain dicts and lists, nothing touches the disk - for fast tests, simulations and ephemeral runs
+- ShardedBackend (sharding.py): users spread over several db files, through the manager modules
+
+Every backend passes the same conformance tests (StorageConformance in unit_tests_database.py) and can be measured
+with the same benchmark (python -m benchmarks.bench_storage).
+
+The interactive prompts (user picker, name validation while typing) still read through the manager modules:
+they belong to the cli on the db file, the backends serve all non-interactive Database operations.
+"""
+
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Protocol, Tuple
+
+from config import set_db_filepath
+from core.habit import Habit
+from core.streaks import Streaks
+from core.user import User
+from helpers.helper_functions import transaction
+from .blob_codec import decode_dates, decode_lengths
+from .db_structure import db_tables
+from .name_cache import normalize_name
+from db_and_managers import event_log
+from db_and_managers import manager_habit_db as habit_db
+from db_and_managers import manager_user_db as user_db
+
+
+class StorageBackend(Protocol):
+    """
+    The operations the Database facade runs on its store.
+
+    - names are unique: a second user with the same username, or a second habit with the same name for one user,
+      raises sqlite3.IntegrityError (the SQLite backend's unique constraints)
+    - deleting a user deletes their habits, deleting a habit deletes its completions and streaks
+    - habits are loaded in creation order, user pages in username order
+    """
+
+    # -----
+    # Users
+    # -----
+    def load_users(self) -> List[User]:
+        """All users (without their habits)."""
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        """One user by ID (without their habits), or None."""
+
+    def load_user_page(self, after: Optional[str] = None, prefix: str = "",
+                       limit: int = user_db.USER_PAGE_SIZE) -> List[User]:
+        """One page of users in username order, after a username and/or starting with a prefix."""
+
+    def username_exists(self, username: str) -> bool:
+        """True if a user has this username (compared normalized, see name_cache.normalize_name())."""
+
+    def save_user(self, user: User) -> None:
+        """Stores a new user and sets its user_id."""
+
+    def delete_user(self, user: User) -> None:
+        """Deletes a user and everything they own."""
+
+    # ------
+    # Habits
+    # ------
+    def load_habits(self, user: User) -> List[Habit]:
+        """All habits of a user, with their streaks (completion dates may be loaded lazily)."""
+
+    def habit_name_exists(self, user: User, habit_name: str) -> bool:
+        """True if the user has a habit with this name (compared normalized, see name_cache.normalize_name())."""
+
+    def save_habits(self, user: User, new_habit: Optional[Habit] = None) -> None:
+        """Stores a new habit of the user, or (without new_habit) the completions and streaks of all their habits."""
+
+    def delete_habit(self, user: User, habit_name: str) -> None:
+        """Deletes a habit of the user and everything it owns."""
+
+    # -----------------------------
+    # Completions, streaks, batches
+    # -----------------------------
+    def save_habit_states(self, states: List[Tuple]) -> None:
+        """Stores the completions and streaks of many habits at once (see manager_habit_db.habit_state())."""
+
+    def transaction(self) -> ContextManager:
+        """Groups the operations of a with-block: all or nothing, nested blocks join the outer one."""
+
+    def close(self) -> None:
+        """Releases the backend's resources."""
+
+
+class SQLiteBackend:
+    """
+    The db file, through the manager modules.
+
+    Attributes:
+        db_filepath: A string representing the path to the SQLite database file.
+    """
+
+    def __init__(self, db_filepath: str = "habit_tracker.db") -> None:
+        """
+        Makes the db file the managers' db (config.DB_FILEPATH) and creates or upgrades its tables.
+        With the event log on, habits it doesn't know yet get their baseline snapshot.
+        """
+        self.db_filepath = db_filepath
+        set_db_filepath(db_filepath)
+        db_tables()
+        if event_log.enabled():
+            event_log.baseline_snapshots()
+
+    def load_users(self) -> List[User]:
+        """Through manager_user_db.load_users()."""
+        return user_db.load_users()
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        """Through manager_user_db.load_user()."""
+        return user_db.load_user(user_id)
+
+    def load_user_page(self, after: Optional[str] = None, prefix: str = "",
+                       limit: int = user_db.USER_PAGE_SIZE) -> List[User]:
+        """Through manager_user_db.load_user_page(): a range of the username index."""
+        return user_db.load_user_page(after, prefix, limit)
+
+    def username_exists(self, username: str) -> bool:
+        """Through manager_user_db.username_exists() (session name cache outside of bound connections)."""
+        return user_db.username_exists(username)
+
+    def save_user(self, user: User) -> None:
+        """Through manager_user_db.save_user()."""
+        user_db.save_user(user)
+
+    def delete_user(self, user: User) -> None:
+        """Through manager_user_db.remove_user(): habits deleted in chunks, streaks by ON DELETE CASCADE."""
+        user_db.remove_user(user)
+
+    def load_habits(self, user: User) -> List[Habit]:
+        """Through manager_habit_db.load_habits(): completion dates are loaded lazily."""
+        return habit_db.load_habits(user)
+
+    def habit_name_exists(self, user: User, habit_name: str) -> bool:
+        """Through manager_habit_db.habit_name_exists()."""
+        return habit_db.habit_name_exists(user, habit_name)
+
+    def save_habits(self, user: User, new_habit: Optional[Habit] = None) -> None:
+        """Through manager_habit_db.save_habits(): unloaded habits are skipped."""
+        habit_db.save_habits(user, new_habit)
+
+    def delete_habit(self, user: User, habit_name: str) -> None:
+        """Through manager_habit_db.remove_habit(): the streak record cascades."""
+        habit_db.remove_habit(user, habit_name)
+
+    def save_habit_states(self, states: List[Tuple]) -> None:
+        """Through manager_habit_db.save_habit_states(): one commit."""
+        habit_db.save_habit_states(states)
+
+    def transaction(self) -> ContextManager:
+        """Through helper_functions.transaction(): one shared connection, one commit."""
+        return transaction()
+
+    def close(self) -> None:
+        """Nothing to release: the managers open a connection per call."""
+
+
+class MemoryBackend:
+    """
+    A store in plain dicts and lists, for tests, simulations and ephemeral runs.
+
+    - habits are kept per user in dicts by name (insertion order = creation order), usernames in a sorted list
+    - habit rows are tuples, replaced on every write: stored completion dates are never changed in place
+    - loaded habits and users are copies: changes only reach the store through save_habits()/save_habit_states()
+    - transactions keep an undo log (and the habits of each user as before their first change), which is
+      replayed if the with-block fails: the cost depends on the changes, not on the size of the store
+    - thread-safe (one lock), nothing is persisted
+    """
+
+    def __init__(self) -> None:
+        """Initializes the empty store."""
+        self._users: Dict[int, str] = {}                        # Username by user ID
+        self._user_ids: Dict[str, int] = {}                     # User ID by username
+        self._normalized_usernames: Counter = Counter()         # Normalized usernames (username lookups)
+        self._usernames: List[str] = []                         # Sorted usernames (user pages)
+        self._habits: Dict[int, Dict[str, tuple]] = {}          # Habit rows by user ID, then by habit name
+        self._next_user_id = 1
+        self._lock = threading.RLock()
+
+        # Open transaction: undo functions of user changes, and user habits before their first change
+        self._undo: Optional[List[Callable[[], None]]] = None
+        self._saved_habits: Dict[int, Dict[str, tuple]] = {}
+
+    def _add_user(self, user_id: int, username: str, habits: Dict[str, tuple]) -> None:
+        """Adds a user with their habits to the store."""
+        self._users[user_id] = username
+        self._user_ids[username] = user_id
+        self._normalized_usernames[normalize_name(username)] += 1
+        insort(self._usernames, username)
+        self._habits[user_id] = habits
+
+    def _drop_user(self, user_id: int) -> None:
+        """Removes a user with their habits from the store."""
+        username = self._users.pop(user_id)
+        del self._user_ids[username]
+        normalized_username = normalize_name(username)
+        self._normalized_usernames[normalized_username] -= 1
+        if not self._normalized_usernames[normalized_username]:
+            del self._normalized_usernames[normalized_username]
+        del self._usernames[bisect_left(self._usernames, username)]
+        self._habits.pop(user_id, None)
+
+    def _user_habits(self, user_id: int) -> Dict[str, tuple]:
+        """The habit rows of a user, about to be changed (saved first inside a transaction)."""
+        habits = self._habits.get(user_id)
+        if habits is None:
+            raise sqlite3.IntegrityError(f"FOREIGN KEY constraint failed: no user with ID {user_id}")
+        if self._undo is not None and user_id not in self._saved_habits:
+            self._saved_habits[user_id] = dict(habits)
+        return habits
+
+    # -----
+    # Users
+    # -----
+    def load_users(self) -> List[User]:
+        """All users, in creation order."""
+        with self._lock:
+            return [User(user_id=user_id, username=username) for user_id, username in self._users.items()]
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        """One user by ID, or None."""
+        with self._lock:
+            username = self._users.get(user_id)
+            return User(user_id=user_id, username=username) if username is not None else None
+
+    def load_user_page(self, after: Optional[str] = None, prefix: str = "",
+                       limit: int = user_db.USER_PAGE_SIZE) -> List[User]:
+        """One page of the sorted usernames, found by bisection."""
+        prefix = prefix.title().strip()
+        with self._lock:
+            # Same bounds as the username index range of manager_user_db.load_user_page()
+            if after is not None and after >= prefix:
+                start = bisect_right(self._usernames, after)
+            else:
+                start = bisect_left(self._usernames, prefix)
+
+            usernames = []
+            for username in self._usernames[start:start + limit]:
+                if not username.startswith(prefix):
+                    break
+                usernames.append(username)
+            return [User(user_id=self._user_ids[username], username=username) for username in usernames]
+
+    def username_exists(self, username: str) -> bool:
+        """True if a user has this username, normalized like manager_user_db.username_exists()."""
+        with self._lock:
+            return normalize_name(username) in self._normalized_usernames
+
+    def save_user(self, user: User) -> None:
+        """Stores a new user under the next ID (IDs are never reused, like AUTOINCREMENT)."""
+        with self._lock:
+            if user.username in self._user_ids:
+                raise sqlite3.IntegrityError(f"UNIQUE constraint failed: users.username ({user.username})")
+            user_id = self._next_user_id
+            self._next_user_id += 1
+
+            self._add_user(user_id, user.username, {})
+            if self._undo is not None:
+                self._undo.append(partial(self._drop_user, user_id))
+            user.user_id = user_id
+
+    def delete_user(self, user: User) -> None:
+        """Deletes a user together with their habits."""
+        with self._lock:
+            username = self._users.get(user.user_id)
+            if username is None:
+                return
+            habits = self._habits.get(user.user_id, {})
+            self._drop_user(user.user_id)
+            if self._undo is not None:
+                self._undo.append(partial(self._add_user, user.user_id, username, habits))
+
+    # ------
+    # Habits
+    # ------
+    def load_habits(self, user: User) -> List[Habit]:
+        """Copies of the user's habits, in creation order."""
+        with self._lock:
+            rows = list(self._habits.get(user.user_id, {}).items())
+
+        habits = []
+        for name, (frequency, creation_date, dates, current, longest, history) in rows:
+            habit = Habit()
+            habit.name = name
+            habit.frequency = frequency
+            habit.creation_date = creation_date
+            habit.completion_dates = dates # Copied into a new CompletionDates
+            habit.streaks = Streaks()
+            habit.streaks.current_streak = current
+            habit.streaks.longest_streak = longest
+            habit.streaks.broken_streak_lengths = list(history)
+            habits.append(habit)
+        return habits
+
+    def habit_name_exists(self, user: User, habit_name: str) -> bool:
+        """True if the user has a habit with this name, normalized like manager_habit_db.habit_name_exists()."""
+        normalized_name = normalize_name(habit_name)
+        with self._lock:
+            return any(normalize_name(name) == normalized_name for name in self._habits.get(user.user_id, {}))
+
+    def save_habits(self, user: User, new_habit: Optional[Habit] = None) -> None:
+        """Stores a new habit, or copies the completions and streaks of all the user's habits."""
+        with self._lock:
+            habits = self._user_habits(user.user_id)
+
+            if new_habit:
+                if new_habit.name in habits:
+                    raise sqlite3.IntegrityError(f"UNIQUE constraint failed: habits.user_id, habits.habit_name "
+                                                 f"({new_habit.name})")
+                # Row: frequency, creation date, completion dates, current/longest streak, streak history
+                habits[new_habit.name] = (new_habit.frequency, new_habit.creation_date, (), 0, 0, ())
+                return
+
+            for habit in user.habits:
+                row = habits.get(habit.name)
+                if row is not None:
+                    habits[habit.name] = row[:2] + (
+                        tuple(habit.completion_dates), habit.streaks.current_streak,
+                        habit.streaks.longest_streak, tuple(habit.streaks.broken_streak_lengths)
+                    )
+
+    def delete_habit(self, user: User, habit_name: str) -> None:
+        """Deletes a habit with its completions and streaks."""
+        with self._lock:
+            if user.user_id in self._habits:
+                self._user_habits(user.user_id).pop(habit_name, None)
+
+    # -----------------------------
+    # Completions, streaks, batches
+    # -----------------------------
+    def save_habit_states(self, states: List[Tuple]) -> None:
+        """Decodes and stores the completions and streaks of many habits."""
+        with self._lock:
+            for user_id, habit_name, _, completion_dates, current, longest, history, _ in states:
+                row = self._habits.get(user_id, {}).get(habit_name)
+                if row is not None:
+                    # States carry the db column encoding
+                    self._user_habits(user_id)[habit_name] = row[:2] + (
+                        tuple(decode_dates(completion_dates)), current, longest, tuple(decode_lengths(history))
+                    )
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Replays the undo log if the with-block fails."""
+        with self._lock:
+            # Nested: the outer transaction undoes everything
+            if self._undo is not None:
+                yield
+                return
+
+            self._undo, self._saved_habits = [], {}
+            try:
+                yield
+            except BaseException:
+                for undo in reversed(self._undo):
+                    undo()
+                # Users deleted meanwhile are back, their habits as before the transaction
+                for user_id, habits in self._saved_habits.items():
+                    if user_id in self._habits:
+                        self._habits[user_id] = habits
+                raise
+            finally:
+                self._undo, self._saved_habits = None, {}
+
+    def close(self) -> None:
+        """Empties the store."""
+        with self._lock:
+            self._users, self._user_ids, self._usernames, self._habits = {}, {}, [], {}
+            self._normalized_usernames = Counter()
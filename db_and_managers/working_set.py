@@ -0,0 +1,176 @@
+"""
+In-memory working set module.
+
+Optional mode of the Database class for analytics-heavy sessions and demo kiosks:
+- the db file is copied into a :memory: SQLite db once (SQLite's backup API), which then serves every manager call
+  without a bound connection: reads and writes run at RAM speed, habit list refreshes included
+- changes are flushed back to the db file on a timer, on explicit save() and when the app exits
+- flushes copy the whole working set back with the backup API: the db file changes in one transaction
+- a flush is deferred while a transaction is open on the working set (the backup would wait for it forever):
+  the next timer tick, save() or close() writes it
+- conflicts are detected through PRAGMA data_version of the file connection: it only changes when another
+  connection commits, so a changed version means the db file was written since the working set was loaded.
+  Such a flush is refused (WorkingSetConflict) instead of overwriting the other writes.
+
+Connections bound explicitly (connection pools, ConcurrentDatabase) keep working on the db file.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+from helpers.db_retry import connect_with_retry
+from helpers.helper_functions import set_session_connection
+
+
+class WorkingSetConflict(Exception):
+    """
+    The db file was written by another connection since the working set was loaded or last flushed.
+
+    Attributes:
+        unsaved_filepath: A string as the path of the copy keeping the unsaved working set, or None.
+    """
+
+    def __init__(self, message: str, unsaved_filepath: Optional[str] = None) -> None:
+        """Initializes the WorkingSetConflict."""
+        super().__init__(message)
+        self.unsaved_filepath = unsaved_filepath
+
+
+class _TransactionOpen(Exception):
+    """A transaction was opened on the working set while a flush was starting (the flush is deferred)."""
+
+
+def _abort_if_busy(status: int, remaining: int, pages: int) -> None:
+    """Backup progress callback: aborts instead of retrying while the source is locked by a transaction."""
+    if status in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED):
+        raise _TransactionOpen
+
+
+class WorkingSet:
+    """
+    An in-memory copy of a db file, serving all manager calls, flushed back in the background.
+
+    Attributes:
+        db_filepath:    A string representing the path to the SQLite database file.
+        flush_interval: A float as the number of seconds between two background flushes, or None for no timer.
+        last_error:     The exception of the latest failed background flush, or None.
+    """
+
+    def __init__(self, db_filepath: str, flush_interval: Optional[float] = 30.0) -> None:
+        """
+        Loads the db file into memory, makes it the session connection and starts the flush timer.
+
+        Args:
+            db_filepath:    Path to the SQLite database file.
+            flush_interval: Seconds between two background flushes, None to flush only on save() and close().
+        """
+        self.db_filepath = db_filepath
+        self.flush_interval = flush_interval
+        self.last_error: Optional[Exception] = None
+
+        # File connection: kept open, its data_version tells if another connection committed
+        self._disk = connect_with_retry(db_filepath, check_same_thread=False)
+        # Working set: used by the app's thread and the flush thread
+        self._memory = connect_with_retry(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._load()
+
+        set_session_connection(self._memory)
+
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if flush_interval is not None:
+            self._thread = threading.Thread(target=self._run, name="working-set", daemon=True)
+            self._thread.start()
+
+    def _load(self) -> None:
+        """Copies the db file into the working set and records the file's data version."""
+        self._disk.backup(self._memory)
+        self._data_version = self._disk_version()
+        self._flushed_changes = self._memory.total_changes
+
+    def _disk_version(self) -> int:
+        """The data version of the file connection."""
+        return self._disk.execute("PRAGMA data_version").fetchone()[0]
+
+    def dirty(self) -> bool:
+        """True if the working set has changes which aren't flushed yet."""
+        return self._memory.total_changes != self._flushed_changes
+
+    def conflict(self) -> bool:
+        """True if another connection committed to the db file since the working set was loaded or flushed."""
+        with self._lock:
+            return self._disk_version() != self._data_version
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Writes the working set back to the db file, if it changed.
+
+        Args:
+            force: If True, the working set overwrites changes another connection committed meanwhile.
+        Returns:
+            True if the db file was written, False if there was nothing to flush
+            or a transaction is open on the working set (the flush is deferred).
+        Raises:
+            WorkingSetConflict: If another connection committed to the db file meanwhile (and force is False).
+        """
+        with self._lock:
+            if not self.dirty() or self._memory.in_transaction:
+                return False
+            if not force and self._disk_version() != self._data_version:
+                raise WorkingSetConflict(f"'{self.db_filepath}' was changed by another connection.")
+
+            changes = self._memory.total_changes
+            try:
+                # Another thread may open a transaction right after the check above
+                self._memory.backup(self._disk, progress=_abort_if_busy)
+            except _TransactionOpen:
+                return False
+            # Own writes don't change the data version, but the forced one has to take over the new version
+            self._data_version = self._disk_version()
+            self._flushed_changes = changes
+            return True
+
+    def reload(self) -> None:
+        """Discards the working set and loads the db file again (e.g. to resolve a conflict)."""
+        with self._lock:
+            self._load()
+
+    def close(self) -> None:
+        """
+        Stops the flush timer, flushes the working set and goes back to the db file.
+
+        Raises:
+            WorkingSetConflict: If the final flush found a conflict. The working set is kept in a copy next to
+                                the db file (see unsaved_filepath), so no change is lost.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        set_session_connection(None)
+        try:
+            self.flush()
+        except WorkingSetConflict as conflict:
+            unsaved_filepath = f"{self.db_filepath}.unsaved-{datetime.now():%Y%m%d-%H%M%S}"
+            target = sqlite3.connect(unsaved_filepath)
+            self._memory.backup(target)
+            target.close()
+            raise WorkingSetConflict(f"{conflict} The unsaved changes are kept in '{unsaved_filepath}'.",
+                                     unsaved_filepath) from None
+        finally:
+            self._memory.close()
+            self._disk.close()
+
+    def _run(self) -> None:
+        """Background loop: one flush every flush_interval until closed."""
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                self.last_error = None
+            except (WorkingSetConflict, sqlite3.Error) as error:
+                # Kept in memory: retried next interval, or saved aside by close()
+                self.last_error = error
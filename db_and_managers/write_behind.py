@@ -0,0 +1,230 @@
+"""
+Write-behind completion queue module.
+
+Optional mode of the Database class for check-offs:
+- completions are acknowledged in memory immediately
+- each pending write is appended to a journal file next to the db, so it survives a crash
+- a background thread drains the pending writes into grouped transactions (one commit per batch)
+- pending writes of the same habit are coalesced: only its latest state is written, with the completion changes
+  of all of them for the event log
+- leftover journal entries are replayed on the next start
+"""
+
+import base64
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from db_and_managers import manager_habit_db as habit_db
+
+
+class WriteBehindQueue:
+    """
+    A durable queue of pending habit writes, drained by a background thread.
+
+    Attributes:
+        journal_filepath: A string representing the path to the journal file of pending writes.
+        batch_size:       An integer as the number of pending habits which triggers an early drain.
+        flush_interval:   A float as the maximum number of seconds a write stays pending.
+    """
+
+    def __init__(self, journal_filepath: str, batch_size: int = 50, flush_interval: float = 1.0) -> None:
+        """
+        Initializes the queue, replays leftover journal entries and starts the background thread.
+
+        Args:
+            journal_filepath: Path to the journal file of pending writes.
+            batch_size:       Number of pending habits which wakes up the background thread early.
+            flush_interval:   Seconds between two background drains.
+        """
+        self.journal_filepath = journal_filepath
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Pending habit states keyed by (user_id, habit_name) -> latest state wins
+        self._pending: Dict[Tuple[int, str], Tuple] = {}
+        self._lock = threading.Lock()              # Guards pending writes and the journal file
+        self._flush_lock = threading.Lock()        # Keeps batches in order
+        self._wake_up = threading.Condition(self._lock)
+        self._closed = False
+
+        # Write anything a previous run left behind before accepting new writes
+        self._replay_journal()
+        self._journal = open(self.journal_filepath, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    @property
+    def _flushing_filepath(self) -> str:
+        """The journal of the batch currently being written."""
+        return self.journal_filepath + ".flushing"
+
+    def enqueue(self, state: Tuple) -> None:
+        """
+        Queues a habit state (see manager_habit_db.habit_state()) and returns immediately.
+
+        Args:
+            state: The habit state to write.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The write-behind queue is closed.")
+
+            # Journal first (no fsync: survives a process crash, not a power loss)
+            self._journal.write(_journal_line(state))
+            self._journal.flush()
+
+            self._coalesce(state)
+
+            # Wake up the background thread once a batch is ready
+            if len(self._pending) >= self.batch_size:
+                self._wake_up.notify()
+
+    def pending_count(self) -> int:
+        """Returns the number of habits waiting to be written."""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> None:
+        """Writes all pending habit states in one transaction."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch = list(self._pending.values())
+                self._pending = {}
+
+                # Rotate the journal: new writes go to a fresh file while this batch is written
+                self._journal.close()
+                os.replace(self.journal_filepath, self._flushing_filepath)
+                self._journal = open(self.journal_filepath, "a", encoding="utf-8")
+
+            try:
+                habit_db.save_habit_states(batch)
+            except Exception:
+                self._requeue(batch)
+                raise
+
+            # The batch is committed, its journal isn't needed anymore
+            os.remove(self._flushing_filepath)
+
+    def close(self) -> None:
+        """Stops the background thread and flushes all pending writes."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wake_up.notify()
+
+        self._thread.join()
+        self.flush()
+        self._journal.close()
+
+        # Nothing pending anymore
+        if os.path.exists(self.journal_filepath) and os.path.getsize(self.journal_filepath) == 0:
+            os.remove(self.journal_filepath)
+
+    def _requeue(self, batch: List[Tuple]) -> None:
+        """
+        Puts back a batch which failed to commit, keeping newer states queued meanwhile.
+
+        Args:
+            batch: The habit states which weren't written.
+        """
+        with self._lock:
+            for state in batch:
+                self._coalesce(state, older=True)
+
+            # Rebuild the journal in write order: failed batch first, newer writes after it
+            self._journal.close()
+            with open(self._flushing_filepath, "a", encoding="utf-8") as journal:
+                with open(self.journal_filepath, encoding="utf-8") as newer_writes:
+                    journal.write(newer_writes.read())
+            os.replace(self._flushing_filepath, self.journal_filepath)
+            self._journal = open(self.journal_filepath, "a", encoding="utf-8")
+
+    def _coalesce(self, state: Tuple, older: bool = False) -> None:
+        """Queues a habit state, merged with the pending state of the same habit (see habit_db.merge_habit_states())."""
+        key = (state[0], state[1])
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = state
+        elif older:
+            self._pending[key] = habit_db.merge_habit_states(state, pending)
+        else:
+            self._pending[key] = habit_db.merge_habit_states(pending, state)
+
+    def _run(self) -> None:
+        """Background loop: drains pending writes every flush_interval or when a batch is ready."""
+        while True:
+            with self._lock:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._wake_up.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # The batch stays queued and is retried on the next drain
+                continue
+
+    def _replay_journal(self) -> None:
+        """Writes the journal entries left behind by a previous run which didn't flush."""
+        states: Dict[Tuple[int, str], Tuple] = {}
+
+        # An interrupted batch is older than the current journal. It may have committed right before the crash,
+        # so the event log compares with the stored dates instead of appending the recorded changes again
+        for filepath in (self._flushing_filepath, self.journal_filepath):
+            for state in _read_journal(filepath):
+                states[(state[0], state[1])] = state[:7] + (None,)
+
+        if states:
+            habit_db.save_habit_states(list(states.values()))
+
+        for filepath in (self._flushing_filepath, self.journal_filepath):
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+def _journal_line(state: Tuple) -> str:
+    """
+    Serializes a habit state as one JSON journal line.
+
+    - BLOB column values (bytes) are stored as {"blob": "<base64>"}
+
+    Args:
+        state: The habit state to journal.
+    Returns:
+        The JSON line, newline included.
+    """
+    values = [{"blob": base64.b64encode(value).decode("ascii")} if isinstance(value, bytes) else value
+              for value in state]
+    return json.dumps(values) + "\n"
+
+def _state_from_journal(values: List) -> Tuple:
+    """Restores a habit state from its journal values (see _journal_line())."""
+    return tuple(base64.b64decode(value["blob"]) if isinstance(value, dict) else value for value in values)
+
+def _read_journal(filepath: str) -> List[Tuple]:
+    """
+    Reads the habit states of a journal file.
+
+    - ignores a torn last line from a crash in the middle of a write
+
+    Args:
+        filepath: Path to the journal file.
+    Returns:
+        A list of habit states in journal order.
+    """
+    states = []
+    if not os.path.exists(filepath):
+        return states
+
+    with open(filepath, encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                states.append(_state_from_journal(json.loads(line)))
+            except ValueError:
+                break
+    return states
@@ -0,0 +1,235 @@
+"""
+Database retry policy module.
+
+Turns write contention and transient connection failures into small delays instead of prompts or crashes:
+- retries sqlite3.connect() and statements failing with SQLITE_BUSY / "database is locked"
+- exponential backoff with full jitter, bounded by a maximum number of attempts and a maximum elapsed time
+- sets SQLite's own busy timeout on every connection, and enables foreign key enforcement
+- counts retries and give-ups in module-level metrics
+
+All settings come from config.py, so they can be changed at runtime through config.set_db_retry_policy().
+"""
+
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, TypeVar
+
+import config
+
+T = TypeVar("T")
+
+# SQLite result codes worth retrying
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+class RetryPolicy:
+    """
+    How often and how long db operations are retried.
+
+    Attributes:
+        busy_timeout: A float as the number of seconds SQLite itself waits on a lock before failing.
+        max_attempts: An integer as the maximum number of attempts per operation (first try included).
+        base_delay:   A float as the backoff delay in seconds before the first retry.
+        max_delay:    A float as the largest backoff delay in seconds.
+        max_elapsed:  A float as the maximum number of seconds spent on one operation, retries included.
+    """
+
+    def __init__(self, busy_timeout: float = 5.0, max_attempts: int = 6, base_delay: float = 0.05,
+                 max_delay: float = 1.0, max_elapsed: float = 30.0) -> None:
+        """Initializes the RetryPolicy."""
+        self.busy_timeout = busy_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        """Creates the policy from the current config settings."""
+        return cls(**config.DB_RETRY_POLICY)
+
+    def backoff(self, retry_nr: int) -> float:
+        """
+        The delay before a retry: exponential backoff with full jitter.
+
+        Args:
+            retry_nr: 1 for the first retry, 2 for the second, ...
+        Returns:
+            A random delay in seconds between 0 and the capped exponential delay.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry_nr - 1)))
+
+
+class RetryMetrics:
+    """
+    Thread-safe counters of db retries.
+
+    - retries:  how many retries were made, per operation kind ("connect", "execute", "commit", ...)
+    - give_ups: how many operations failed after exhausting the policy, per operation kind
+    - delay:    the total time spent sleeping between retries
+    """
+
+    def __init__(self) -> None:
+        """Initializes empty metrics."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Sets all counters back to zero."""
+        with self._lock:
+            self._retries: Dict[str, int] = {}
+            self._give_ups: Dict[str, int] = {}
+            self._delay = 0.0
+
+    def record_retry(self, operation: str, delay: float) -> None:
+        """Counts one retry of an operation and its backoff delay."""
+        with self._lock:
+            self._retries[operation] = self._retries.get(operation, 0) + 1
+            self._delay += delay
+
+    def record_give_up(self, operation: str) -> None:
+        """Counts one operation which failed after exhausting the policy."""
+        with self._lock:
+            self._give_ups[operation] = self._give_ups.get(operation, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns a copy of the counters.
+
+        Returns:
+            A dict with "retries" and "give_ups" per operation kind and the total "delay" in seconds.
+        """
+        with self._lock:
+            return {"retries": dict(self._retries), "give_ups": dict(self._give_ups), "delay": self._delay}
+
+# Process-wide retry metrics
+retry_metrics = RetryMetrics()
+
+def is_retryable(error: sqlite3.Error, operation: str) -> bool:
+    """
+    Decides if a failed db operation is worth retrying.
+
+    - connect: any OperationalError (e.g. the db file is briefly unavailable)
+    - statements: only lock contention (SQLITE_BUSY / SQLITE_LOCKED)
+
+    Args:
+        error:     The raised sqlite3 error.
+        operation: The operation kind ("connect", "execute", "commit", ...).
+    Returns:
+        True if the operation should be retried.
+    """
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    if operation == "connect":
+        return True
+
+    error_code = getattr(error, "sqlite_errorcode", None)
+    if error_code is not None:
+        return error_code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED) # Extended codes keep the primary code in the low byte
+
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+def run_with_retry(operation: str, function: Callable[[], T], policy: RetryPolicy = None) -> T:
+    """
+    Runs a db operation and retries it according to the retry policy.
+
+    Args:
+        operation: The operation kind, used for metrics ("connect", "execute", "commit", ...).
+        function:  The db operation without arguments.
+        policy:    The retry policy (defaults to the policy from config).
+    Returns:
+        The result of the operation.
+    Raises:
+        sqlite3.Error: If the error isn't retryable or the policy is exhausted.
+    """
+    policy = policy or RetryPolicy.from_config()
+    start = time.monotonic()
+    attempt = 1
+
+    while True:
+        try:
+            return function()
+        except sqlite3.Error as e:
+            if not is_retryable(e, operation):
+                raise
+
+            delay = policy.backoff(attempt)
+            elapsed = time.monotonic() - start
+            if attempt >= policy.max_attempts or elapsed + delay > policy.max_elapsed:
+                retry_metrics.record_give_up(operation)
+                raise
+
+            retry_metrics.record_retry(operation, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+class RetryingCursor(sqlite3.Cursor):
+    """A cursor whose statements are retried on lock contention."""
+
+    def execute(self, sql, parameters=()):
+        """Executes a statement with retries."""
+        return run_with_retry("execute", lambda: super(RetryingCursor, self).execute(sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        """Executes a statement for many parameter sets with retries."""
+        # Materialize generators so a retry can run them again
+        seq_of_parameters = list(seq_of_parameters)
+        return run_with_retry("execute", lambda: super(RetryingCursor, self).executemany(sql, seq_of_parameters))
+
+    def executescript(self, sql_script):
+        """Executes a script with retries."""
+        return run_with_retry("execute", lambda: super(RetryingCursor, self).executescript(sql_script))
+
+
+class RetryingConnection(sqlite3.Connection):
+    """A connection whose cursors, statements and commits are retried on lock contention."""
+
+    def cursor(self, factory=RetryingCursor):
+        """Returns a RetryingCursor by default."""
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        """Executes a statement on a new RetryingCursor."""
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        """Executes a statement for many parameter sets on a new RetryingCursor."""
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        """Executes a script on a new RetryingCursor."""
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        """Commits with retries."""
+        return run_with_retry("commit", super().commit)
+
+def connect_with_retry(db_filepath: str, **kwargs) -> RetryingConnection:
+    """
+    Opens a db connection with retries, the configured busy timeout and retrying statements.
+
+    - enables foreign key enforcement (PRAGMA foreign_keys = ON), so ON DELETE CASCADE applies on every connection
+
+    Args:
+        db_filepath: Path to the SQLite database file.
+        **kwargs:    Other sqlite3.connect() arguments (e.g. check_same_thread, a custom timeout).
+    Returns:
+        The open RetryingConnection.
+    Raises:
+        sqlite3.Error: If the connection still fails when the policy is exhausted.
+    """
+    policy = RetryPolicy.from_config()
+    kwargs.setdefault("timeout", policy.busy_timeout)
+    connection = run_with_retry(
+        "connect",
+        lambda: sqlite3.connect(db_filepath, factory=RetryingConnection, **kwargs),
+        policy
+    )
+    # Off by default in SQLite, per connection
+    connection.execute("PRAGMA foreign_keys = ON")
+    return connection
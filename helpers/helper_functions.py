@@ -10,9 +10,12 @@ import os
 import sys
 import time
 import sqlite3
-from typing import Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
 
-from config import DB_FILEPATH
+import config
+from helpers.db_retry import connect_with_retry
 from helpers.text_formating import GRAY, RES, RED, BLUE, GREEN, ITAL, YELLOW
 
 
@@ -54,52 +57,179 @@ def reload_cli():
     """
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def db_connection(instance) -> Optional[sqlite3.Connection]:
+class SharedConnection:
     """
-    Attempts to connect to the db.
-    If connection fails, provides retry options.
+    A db connection shared by several manager calls.
 
-    Parameters:
-        instance: The HabitTracker instance or DB_FILEPATH.
+    - behaves like the wrapped sqlite3.Connection
+    - close() leaves the connection open: its owner closes it
+    - inside a transaction() commit() is deferred: the transaction commits once at its end
+
+    Attributes:
+        connection:   The wrapped sqlite3.Connection.
+        defer_commit: True if the connection belongs to a transaction().
+    """
+
+    def __init__(self, connection: sqlite3.Connection, defer_commit: bool = False) -> None:
+        """Initializes the SharedConnection around an open connection."""
+        self.connection = connection
+        self.defer_commit = defer_commit
+
+    def __getattr__(self, name):
+        """Delegates everything else to the wrapped connection."""
+        return getattr(self.connection, name)
+
+    def commit(self) -> None:
+        """Commits, unless the commit is deferred to the end of the transaction."""
+        if not self.defer_commit:
+            self.connection.commit()
+
+    def close(self) -> None:
+        """Keeps the connection open for the next manager call."""
+
+# Connection bound to the current thread/task through bound_connection()
+_bound_connection: ContextVar[Optional[SharedConnection]] = ContextVar("bound_connection", default=None)
+
+@contextmanager
+def bound_connection(connection: sqlite3.Connection, defer_commit: bool = False) -> Iterator[SharedConnection]:
+    """
+    Makes db_connection() return the given connection inside the with-block.
+
+    - lets manager functions run on a pooled or otherwise managed connection
+    - bound per thread/task: other threads keep opening their own connections
+
+    Args:
+        connection:   The open connection to use.
+        defer_commit: If True, the managers' commits are skipped (see transaction()).
     Returns:
-        Connection object to the db, or exits if unable to connect.
+        The SharedConnection handed out to manager functions.
     """
-    # Try to connect to the db
+    # Rebinding the connection of a running transaction keeps its commit deferred
+    current = _bound_connection.get()
+    if current is not None and current.connection is connection:
+        defer_commit = defer_commit or current.defer_commit
+
+    shared = SharedConnection(connection, defer_commit)
+    token = _bound_connection.set(shared)
     try:
-        return sqlite3.connect(DB_FILEPATH)
-
-    # Handle connection error
-    except sqlite3.Error as e:
-        # Provides options to retry, return to main menu, or exit
-        while True:
-            reload_cli()
-            print(f"""\nDatabase connection error: {e}
-            Failed to connect to the database.
-            
-            Options:
-            1. Retry database connection
-            2. Return to main menu
-            3. Exit the application
-            """)
-
-            choice = input("\nEnter your choice (1-3): ").strip()
-
-            if choice == "1":
-                print("Trying to re-establish your connection...")
-                return db_connection(instance)
-            elif choice == "2":
-                # Return to main menu
-                from cli.main_menu import main_menu
-                print("Returning to main menu...")
-                time.sleep(1)
-                main_menu(instance)
-            elif choice == "3":
-                # Exit the application
-                print("Goodbye! Remember to stay on track!")
-                time.sleep(1)
-                sys.exit(0)
-            else:
-                invalid_input()
+        yield shared
+    finally:
+        _bound_connection.reset(token)
+
+@contextmanager
+def transaction(immediate: bool = False) -> Iterator[SharedConnection]:
+    """
+    Runs all manager calls inside the with-block in one transaction.
+
+    - the manager calls share one connection and commit once at the end (one fsync)
+    - rolls back everything if an exception leaves the with-block
+    - nested transactions join the outer one
+    - reuses the connection bound to this thread/task (e.g. a pooled one) or the session connection,
+      otherwise opens one
+
+    Args:
+        immediate: If True, takes the db write lock up front (BEGIN IMMEDIATE), so reads inside the
+                   with-block stay current until the commit (read-modify-write). Ignored when joining.
+    Returns:
+        The SharedConnection of the transaction.
+    """
+    shared = _current_connection()
+
+    # Nested: the outer transaction commits or rolls back
+    if shared is not None and shared.defer_commit:
+        yield shared
+        return
+
+    owned = shared is None
+    connection = connect_with_retry(config.DB_FILEPATH) if owned else shared.connection
+
+    try:
+        if immediate and not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+        with bound_connection(connection, defer_commit=True) as transaction_connection:
+            yield transaction_connection
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        if owned:
+            connection.close()
+
+# Connection of the whole process, used wherever no connection is bound (see set_session_connection())
+_session_connection: Optional[SharedConnection] = None
+
+def set_session_connection(connection: Optional[sqlite3.Connection]) -> None:
+    """
+    Makes db_connection() return the given connection in every thread/task without a bound connection.
+
+    - used by the in-memory working set mode (db_and_managers/working_set.py)
+    - connections bound through bound_connection() still take precedence
+
+    Args:
+        connection: The open connection to use, or None to open connections to the db file again.
+    """
+    global _session_connection
+    _session_connection = SharedConnection(connection) if connection is not None else None
+
+def _current_connection() -> Optional[SharedConnection]:
+    """The connection bound to this thread/task, else the session connection, else None."""
+    shared = _bound_connection.get()
+    return shared if shared is not None else _session_connection
+
+def has_bound_connection() -> bool:
+    """
+    True if manager calls of this thread/task run on a bound connection (see bound_connection())
+    or on the session connection (see set_session_connection()).
+    """
+    return _current_connection() is not None
+
+def db_connection(instance) -> sqlite3.Connection:
+    """
+    Connects to the db.
+
+    - returns the connection bound through bound_connection() if there is one,
+      else the session connection set through set_session_connection()
+    - otherwise opens a new connection with the retry policy from config (helpers/db_retry.py):
+      failed connects and locked/busy statements are retried with backoff instead of prompting the user
+
+    Parameters:
+        instance: The DB_FILEPATH (kept for the managers' call signature, config.DB_FILEPATH is used).
+    Returns:
+        Connection object to the db.
+    Raises:
+        sqlite3.Error: If the db is still unavailable when the retry policy is exhausted.
+    """
+    # Use the connection bound to this thread/task, or the session's
+    shared = _current_connection()
+    if shared is not None:
+        return shared
+
+    # config.DB_FILEPATH is read at call time so set_db_filepath() takes effect
+    return connect_with_retry(config.DB_FILEPATH)
+
+# Functions to run before the app exits through check_exit_cmd() (e.g. flushing pending db writes)
+_exit_hooks: List[Callable[[], None]] = []
+
+def register_exit_hook(hook: Callable[[], None]) -> None:
+    """
+    Registers a function to run before the app exits through check_exit_cmd().
+
+    Args:
+        hook: A function without arguments.
+    """
+    if hook not in _exit_hooks:
+        _exit_hooks.append(hook)
+
+def unregister_exit_hook(hook: Callable[[], None]) -> None:
+    """
+    Removes a function registered through register_exit_hook().
+
+    Args:
+        hook: The function to remove.
+    """
+    if hook in _exit_hooks:
+        _exit_hooks.remove(hook)
 
 def check_exit_cmd(command: str) -> bool:
     """
@@ -111,6 +241,10 @@ def check_exit_cmd(command: str) -> bool:
         True if the command is an exit command, False otherwise
     """
     if command.lower().strip() == "quit":
+        # Let registered components finish their work (e.g. pending db writes)
+        for hook in list(_exit_hooks):
+            hook()
+
         print(f"\nGoodbye! {GREEN}(^_^)/{RES}")
         time.sleep(0.40)
         print("           .")
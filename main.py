@@ -4,10 +4,14 @@ Habit Tracker Application - Main Entry Point
 - it initializes the application and starts the main menu
 """
 
+import sqlite3
+import sys
+
 from cli.main_menu import main_menu
 from core.analytics import Analytics
 from db_and_managers.database import Database
 from helpers.helper_functions import reload_cli, wavey_mctrackface
+from helpers.text_formating import RED, RES
 
 
 class HabitTracker:
@@ -23,11 +27,16 @@ class HabitTracker:
         analytics (Analytics): Initializes the Analytics instance.
     """
 
-    def __init__(self):
-        """Initializes the habit tracker."""
-        self.db = Database()       # Local SQLite db access
-        self.logged_in_user = None # Will be set during user selection
-        self.analytics = None      # Will be initialized after user selection
+    def __init__(self, in_memory: bool = False):
+        """
+        Initializes the habit tracker.
+
+        Args:
+            in_memory: If True, the db is served from memory and flushed back to the file (python main.py --in-memory).
+        """
+        self.db = Database(in_memory=in_memory) # Local SQLite db access
+        self.logged_in_user = None               # Will be set during user selection
+        self.analytics = None                    # Will be initialized after user selection
 
     def start(self):
         """
@@ -56,5 +65,11 @@ class HabitTracker:
 
 if __name__ == "__main__":
     # Create and start the habit tracker
-    tracker = HabitTracker()
-    tracker.start()
\ No newline at end of file
+    try:
+        tracker = HabitTracker(in_memory="--in-memory" in sys.argv[1:])
+        tracker.start()
+    except sqlite3.Error as e:
+        # The db stayed unavailable after all retries (see helpers/db_retry.py)
+        print(f"\n{RED}Database error:{RES} {e}")
+        print("Failed to reach the database. Please try again later!")
+        sys.exit(1)
\ No newline at end of file
@@ -14,6 +14,7 @@ import random
 from datetime import datetime, timedelta, date
 from typing import List
 
+from core.periods import get_period
 from core.streaks import Streaks
 from core.user import User
 from core.habit import Habit
@@ -39,24 +40,21 @@ def _generate_completions(habit: Habit, start_date: date, end_date: date) -> Lis
 
     # Reset completions
     completions = []
-    last_week_completion = None
+    last_completed_period = None
+
+    # Daily habits: 80% chance per day, other frequencies: 90% chance per day until completed for the period
+    chance = 8 if habit.frequency == "daily" else 9
+    period = get_period(habit.frequency)
 
     # Iterate through the 4-week period from the start until the end dates
     completion_date = start_date
     while completion_date <= end_date:
-        # Determine if habit should be completed on this date (random probability)
-        if habit.frequency == "daily":
-            if random.randint(1, 10) <= 8:  # 80% chance
-                # Check-off the habit as completed for the date
-                completions.append(completion_date)
-
-        elif habit.frequency == "weekly":
-            week_start = completion_date - timedelta(days=completion_date.weekday())
-            if last_week_completion is None or week_start != last_week_completion:
-                if random.randint(1, 10) <= 9:  # 90% chance
-                    # Check-off the habit as completed for the date
-                    completions.append(completion_date)
-                    last_week_completion = week_start
+        # Determine if habit should be completed on this date (random probability), once per period
+        current_period = period.period_id(completion_date)
+        if current_period != last_completed_period and random.randint(1, 10) <= chance:
+            # Check-off the habit as completed for the date
+            completions.append(completion_date)
+            last_completed_period = current_period
 
         # Move to next day
         completion_date += timedelta(days=1)
@@ -96,19 +94,21 @@ def sample_data_generator():
     db.load_habits(sample_user)
     existing_habit_names = [habit.name for habit in sample_user.habits]
 
-    for habit_info in sample_habits:
-        # If sample habit names exist
-        if habit_info["name"] in existing_habit_names:
-            print(f"Skipping Habit creation... '{habit_info['name']}' already exists...")
-        else:
-            # Create new sample habit
-            new_habit = Habit()
-            new_habit.name = habit_info["name"]
-            new_habit.frequency = habit_info["frequency"]
-            new_habit.create_date()
-            # Add to db
-            db.save_habits(sample_user, new_habit)
-            print(f"Created sample habit '{habit_info['name']}'!")
+    # Create all sample habits in one transaction
+    with db.transaction():
+        for habit_info in sample_habits:
+            # If sample habit names exist
+            if habit_info["name"] in existing_habit_names:
+                print(f"Skipping Habit creation... '{habit_info['name']}' already exists...")
+            else:
+                # Create new sample habit
+                new_habit = Habit()
+                new_habit.name = habit_info["name"]
+                new_habit.frequency = habit_info["frequency"]
+                new_habit.create_date()
+                # Add to db
+                db.save_habits(sample_user, new_habit)
+                print(f"Created sample habit '{habit_info['name']}'!")
 
     # Reload existing habits
     db.load_habits(sample_user)
@@ -117,38 +117,40 @@ def sample_data_generator():
     end_date = datetime.now().date()           # Today
     start_date = end_date - timedelta(days=28) # 4 weeks ago
 
-    # Process each habit
-    for habit in sample_user.habits:
-        # Only process our sample habits
-        if habit.name not in [h["name"] for h in sample_habits]:
-            continue
-
-        else:
-            print(f"\nGenerating completions for '{habit.name}'...")
-
-            # Generate completions for habit using helper function
-            habit.completion_dates = _generate_completions(habit, start_date, end_date)
-
-            # Calculate streaks
-            completions = habit.completion_dates
-            habit.streaks.get_current_streak(habit.frequency, completions, sample_data=True)
-
-            # Perform checks
-            print(f"\nHabit: {habit.name}")
-            print(f"Completions: {habit.completion_dates}")
-            print(f"Current Streak: {habit.streaks.current_streak}")
-            print(f"Longest Streak: {habit.streaks.longest_streak}")
-            print(f"Broken Streaks Lengths: {habit.streaks.broken_streak_lengths}")
-
-            # Count completions for display
-            completion_count = len(completions)
-            if habit.frequency == "daily":
-                print(f"Completions count:  added {completion_count}!")
-            elif habit.frequency == "weekly":
-                print(f"Completions count: added {completion_count}!")
-
-            # Save the newly generated completions to the db
-            db.save_habits(sample_user)
+    # Process each habit, saving all generated completions in one transaction
+    with db.transaction():
+        for habit in sample_user.habits:
+            # Only process our sample habits
+            if habit.name not in [h["name"] for h in sample_habits]:
+                continue
+
+            else:
+                print(f"\nGenerating completions for '{habit.name}'...")
+
+                # Generate completions for habit using helper function
+                habit.completion_dates = _generate_completions(habit, start_date, end_date)
+
+                # Calculate streaks
+                completions = habit.completion_dates
+                habit.streaks.get_current_streak(habit.frequency, completions, sample_data=True)
+
+                # Perform checks
+                print(f"\nHabit: {habit.name}")
+                print(f"Completions: {habit.completion_dates}")
+                print(f"Current Streak: {habit.streaks.current_streak}")
+                print(f"Longest Streak: {habit.streaks.longest_streak}")
+                print(f"Broken Streaks Lengths: {habit.streaks.broken_streak_lengths}")
+
+                # Count completions for display
+                completion_count = len(completions)
+                if habit.frequency == "daily":
+                    print(f"Completions count:  added {completion_count}!")
+                elif habit.frequency == "weekly":
+                    print(f"Completions count: added {completion_count}!")
+
+        # Save the newly generated completions of all habits to the db at once
+        db.save_habits(sample_user)
+
 
 def instructions():
     print(f"""
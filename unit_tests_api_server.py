@@ -0,0 +1,217 @@
+"""
+Unit testing module for the JSON API server.
+
+Coverage:
+- users, habits, completions and analytics endpoints
+- error responses
+- request latency metrics
+
+Note: The server runs on a free local port against a temporary db file, no external services are needed.
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+import config
+from api.server import ApiServer
+
+
+class TestApiServer(unittest.TestCase):
+    """Tests the API server end to end over HTTP."""
+
+    def setUp(self):
+        # Temporary db file (the server's Database points the global db filepath at it)
+        self.previous_filepath = config.DB_FILEPATH
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.server = ApiServer(os.path.join(self.db_dir.name, "test_api.db"), port=0, max_workers=4)
+
+        # Run the server's event loop in a background thread
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.server.start())
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait(5)
+
+        # One keep-alive client connection for all requests
+        self.client = http.client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+
+        # Restore the db filepath for other test modules, without opening (and migrating) that db
+        config.set_db_filepath(self.previous_filepath)
+        self.db_dir.cleanup()
+
+    def request(self, method, path, body=None):
+        """Sends a request and returns (status, decoded JSON)."""
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.client.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = self.client.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_api_server(self):
+        print(f"\n===================================")
+        print("Testing JSON API Server")
+        print("-----------------------------------")
+
+        today = datetime.now().date()
+        yesterday = today - timedelta(days=1)
+
+        # Users
+        # -----
+        status, user = self.request("POST", "/users", {"username": "api user"})
+        self.assertEqual(status, 201)
+        self.assertEqual(user["username"], "Api User")
+        user_id = user["user_id"]
+
+        status, _ = self.request("POST", "/users", {"username": "Api User"})
+        self.assertEqual(status, 409)
+
+        status, users = self.request("GET", "/users")
+        self.assertEqual(status, 200)
+        self.assertEqual(users, [user])
+        print(f"✓ User endpoints verified!")
+
+        # Habits
+        # ------
+        status, habit = self.request("POST", f"/users/{user_id}/habits", {"name": "drink water", "frequency": "daily"})
+        self.assertEqual(status, 201)
+        self.assertEqual(habit["name"], "Drink Water")
+
+        status, _ = self.request("POST", f"/users/{user_id}/habits", {"name": "Plan", "frequency": "yearly"})
+        self.assertEqual(status, 400)
+
+        self.request("POST", f"/users/{user_id}/habits", {"name": "Plan Week", "frequency": "weekly"})
+        status, habits = self.request("GET", f"/users/{user_id}/habits?frequency=weekly")
+        self.assertEqual([h["name"] for h in habits], ["Plan Week"])
+        print(f"✓ Habit endpoints verified!")
+
+        # Completions
+        # -----------
+        status, habit = self.request("POST", f"/users/{user_id}/habits/Drink%20Water/completions",
+                                     {"date": yesterday.isoformat()})
+        self.assertEqual(status, 201)
+        status, habit = self.request("POST", f"/users/{user_id}/habits/Drink%20Water/completions")
+        self.assertEqual(status, 201)
+        self.assertEqual(habit["completions_count"], 2)
+
+        status, _ = self.request("POST", f"/users/{user_id}/habits/Drink%20Water/completions")
+        self.assertEqual(status, 409)
+
+        status, habit = self.request("GET", f"/users/{user_id}/habits/Drink%20Water")
+        self.assertEqual(habit["completion_dates"], [yesterday.isoformat(), today.isoformat()])
+
+        status, habit = self.request("DELETE", f"/users/{user_id}/habits/Drink%20Water/completions/{today}")
+        self.assertEqual(status, 200)
+        self.assertEqual(habit["completions_count"], 1)
+        print(f"✓ Completion endpoints verified!")
+
+        # Analytics
+        # ---------
+        status, analytics = self.request("GET", f"/users/{user_id}/analytics")
+        self.assertEqual(status, 200)
+        self.assertEqual(analytics["habits"], 2)
+        self.assertEqual(analytics["most_completed"], {"habit": "Drink Water", "completions": 1})
+        print(f"✓ Analytics endpoint verified!")
+
+        # Errors and metrics
+        # ------------------
+        self.assertEqual(self.request("GET", "/users/999")[0], 404)
+        self.assertEqual(self.request("DELETE", "/users")[0], 405)
+        self.assertEqual(self.request("GET", "/nowhere")[0], 404)
+
+        # Malformed headers are answered, not dropped
+        with socket.create_connection(("127.0.0.1", self.server.port), timeout=5) as raw:
+            raw.sendall(b"POST /users HTTP/1.1\r\nContent-Length: ten\r\n\r\n")
+            response = http.client.HTTPResponse(raw)
+            response.begin()
+            self.assertEqual(response.status, 400)
+            self.assertIn("error", json.loads(response.read()))
+
+        status, metrics = self.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertEqual(metrics["create_user"]["count"], 2)
+        self.assertIn("p95_ms", metrics["add_completion"])
+        print(f"✓ Error responses and latency metrics verified!")
+
+    def test_concurrent_requests(self):
+        print(f"\n===================================")
+        print("Testing Concurrent API Requests")
+        print("-----------------------------------")
+
+        today = datetime.now().date()
+
+        def run_parallel(requests):
+            """Sends the (method, path, body) requests at once, one client connection each."""
+            results = [None] * len(requests)
+            start = threading.Barrier(len(requests))
+
+            def send(index, method, path, body):
+                client = http.client.HTTPConnection("127.0.0.1", self.server.port, timeout=10)
+                start.wait()
+                headers = {"Content-Type": "application/json"} if body is not None else {}
+                client.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = client.getresponse()
+                results[index] = (response.status, json.loads(response.read()))
+                client.close()
+
+            threads = [threading.Thread(target=send, args=(index, *request)) for index, request in enumerate(requests)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+            return results
+
+        # Users
+        # -----
+        results = run_parallel([("POST", "/users", {"username": "Race"})] * 6)
+        self.assertEqual(sorted(status for status, _ in results), [201] + [409] * 5)
+        user_id = next(body["user_id"] for status, body in results if status == 201)
+        print(f"✓ Concurrent user creation verified!")
+
+        # Completions
+        # -----------
+        self.request("POST", f"/users/{user_id}/habits", {"name": "Read", "frequency": "daily"})
+        dates = [today - timedelta(days=days) for days in range(1, 17)]
+        path = f"/users/{user_id}/habits/Read/completions"
+
+        results = run_parallel([("POST", path, {"date": day.isoformat()}) for day in dates])
+        self.assertEqual([status for status, _ in results], [201] * len(dates))
+        _, habit = self.request("GET", f"/users/{user_id}/habits/Read")
+        self.assertEqual(habit["completion_dates"], sorted(day.isoformat() for day in dates))
+        self.assertEqual(habit["current_streak"], len(dates))
+
+        results = run_parallel([("DELETE", f"{path}/{day}", None) for day in dates[:8]])
+        self.assertEqual([status for status, _ in results], [200] * 8)
+        _, habit = self.request("GET", f"/users/{user_id}/habits/Read")
+        self.assertEqual(habit["completion_dates"], sorted(day.isoformat() for day in dates[8:]))
+        print(f"✓ No completion lost by concurrent requests verified!")
+
+        # Analytics
+        # ---------
+        self.request("POST", f"/users/{user_id}/habits", {"name": "Budget", "frequency": "monthly"})
+        self.request("POST", f"/users/{user_id}/habits", {"name": "Water Plants", "frequency": "3-day"})
+        _, analytics = self.request("GET", f"/users/{user_id}/analytics")
+        self.assertEqual(list(analytics["by_periodicity"]), ["daily", "monthly", "3-day"])
+        print(f"✓ Analytics grouped by the present frequencies verified!")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,12 @@ Unit testing module for the HabitTracker application.
 
 Coverage:
 - user and habit functionality: creation, completion, streaks
+- completion dates period index
+- day bitmaps: counts, calendar cells and streak runs from bit operations
+- period id engine and streaks of monthly, quarterly and custom frequencies
+- memory-lean model layout: slots, array-backed streak history, shared date objects
 - analytics functionality: all methods of the analytics module
+- sorted habit indexes: keyset pages, filters and incremental updates
 
 Note: Some functions (like habit deletion through CLI) require user input
       and have been tested manually due to their interactive nature and db dependencies.
@@ -14,8 +19,11 @@ from datetime import datetime, timedelta
 
 from core.user import User
 from core.habit import Habit
-from core.streaks import Streaks
+from core.streaks import Streaks, StreakLengths
 from core.analytics import Analytics
+from core.completion_dates import CompletionDates
+from core.day_bitmap import DayBitmap
+from core.periods import MAX_CYCLE_DAYS, Period, get_period, is_frequency, period_id
 
 # --------------------------
 # User related tests
@@ -57,7 +65,7 @@ class TestHabitAndCompletions(unittest.TestCase):
         self.habit = Habit()
         self.habit.name = "Test Habit"
         self.habit.frequency = "daily"
-        self.habit.creation = datetime.now().date()
+        self.habit.creation_date = datetime.now().date()
         self.habit.completion_dates = []
 
         # Get current day for testing
@@ -123,6 +131,176 @@ class TestHabitAndCompletions(unittest.TestCase):
         self.assertFalse(_is_habit_completed(weekly_habit))
         print(f"✓ Habit weekly completion verified!")
 
+# --------------------------
+# Completion dates related tests
+# --------------------------
+
+class TestCompletionDates(unittest.TestCase):
+    """Tests the period index of CompletionDates."""
+
+    def test_completion_dates(self):
+        print(f"\n======================================")
+        print("Testing Completion Dates Period Index")
+        print("--------------------------------------")
+
+        # Setup: a Monday and the Sunday of the same week
+        # -----------------------------------------------
+        monday = datetime(2025, 3, 3).date()
+        sunday = monday + timedelta(days=6)
+        dates = CompletionDates([monday])
+
+        self.assertEqual(dates, [monday])
+        self.assertIn(monday, dates)
+        self.assertTrue(dates.has_period("weekly", sunday))
+        self.assertFalse(dates.has_period("daily", sunday))
+        self.assertFalse(dates.has_period("weekly", sunday + timedelta(days=1)))
+        print(f"✓ Daily and weekly lookups verified!")
+
+        # Index follows every list change
+        # -------------------------------
+        dates.append(sunday)
+        dates.remove(monday)
+        self.assertNotIn(monday, dates)
+        self.assertTrue(dates.has_period("weekly", monday))
+
+        dates.extend([sunday + timedelta(days=1)])
+        dates[:] = [d for d in dates if d != sunday]
+        self.assertFalse(dates.has_period("weekly", monday))
+        self.assertTrue(dates.has_period("weekly", sunday + timedelta(days=3)))
+
+        # Habits wrap assigned lists
+        habit = Habit()
+        habit.completion_dates = [monday]
+        self.assertIsInstance(habit.completion_dates, CompletionDates)
+        self.assertTrue(habit.completion_dates.has_period("weekly", sunday))
+        print(f"✓ Index updates on changes verified!")
+
+        # Sorted invariant and latest date
+        # --------------------------------
+        dates = CompletionDates([sunday, monday])
+        self.assertEqual(dates, [monday, sunday])
+        dates.append(monday + timedelta(days=2)) # Older than the latest date
+        dates.extend([sunday + timedelta(days=7), monday - timedelta(days=7)])
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(dates.last, sunday + timedelta(days=7))
+        self.assertIsNone(CompletionDates().last)
+        print(f"✓ Sorted order and latest date verified!")
+
+class TestDayBitmap(unittest.TestCase):
+    """Tests the day bitmap of daily completion histories."""
+
+    def test_day_bitmap(self):
+        print(f"\n==========================")
+        print("Testing Day Bitmaps")
+        print("--------------------------")
+
+        # Setup: runs of 2, 3 and 1 days around a month boundary
+        # ------------------------------------------------------
+        first = datetime(2025, 1, 28).date()
+        dates = [first + timedelta(days=offset) for offset in [0, 1, 3, 4, 5, 8]]
+        bitmap = DayBitmap.from_dates(reversed(dates))
+
+        self.assertEqual(bitmap.to_dates(), dates)
+        self.assertEqual(len(bitmap), 6)
+        self.assertIn(first + timedelta(days=3), bitmap)
+        self.assertNotIn(first + timedelta(days=2), bitmap)
+        self.assertNotIn(first - timedelta(days=1), bitmap)
+        self.assertEqual(DayBitmap.from_bytes(bitmap.origin, bitmap.to_bytes()).to_dates(), dates)
+        print(f"✓ Conversion to and from dates verified!")
+
+        # Counts, calendar cells and streak runs
+        # --------------------------------------
+        self.assertEqual(bitmap.count_in_month(2025, 1), 3)
+        self.assertEqual(bitmap.days_in_month(2025, 2), [1, 2, 5])
+        self.assertEqual(bitmap.count_between(first - timedelta(days=5), first + timedelta(days=3)), 3)
+        self.assertEqual(bitmap.runs(), [2, 3, 1])
+        self.assertEqual(bitmap.last_day(), dates[-1])
+
+        # Earlier days move the origin back
+        bitmap.add(first - timedelta(days=1))
+        bitmap.discard(first + timedelta(days=8))
+        self.assertEqual(bitmap.runs(), [3, 3])
+        print(f"✓ Counts, calendar cells and runs verified!")
+
+        # CompletionDates keep their bitmap current, streaks use its runs
+        # ----------------------------------------------------------------
+        completion_dates = CompletionDates(dates)
+        self.assertEqual(completion_dates.bitmap().runs(), [2, 3, 1])
+        completion_dates.append(first + timedelta(days=2))
+        completion_dates.append(first + timedelta(days=2)) # Duplicate
+        completion_dates.remove(first + timedelta(days=2))
+        self.assertEqual(completion_dates.bitmap().runs(), [6, 1])
+
+        streaks = Streaks()
+        streaks.get_current_streak("daily", CompletionDates(dates), sample_data=True)
+        self.assertEqual((streaks.current_streak, streaks.longest_streak), (1, 3))
+        self.assertEqual(streaks.broken_streak_lengths, [2, 3])
+
+        # Duplicates fall back to the period id loop (a duplicate breaks the streak)
+        completion_dates.append(first + timedelta(days=2))
+        streaks.get_current_streak("daily", completion_dates, sample_data=True)
+        self.assertEqual(streaks.broken_streak_lengths, [3, 4])
+        print(f"✓ Bitmap updates and streak runs verified!")
+
+# --------------------------
+# Period engine related tests
+# --------------------------
+
+class TestPeriods(unittest.TestCase):
+    """Tests the period id engine."""
+
+    def test_periods(self):
+        print(f"\n============================")
+        print("Testing Period Id Engine")
+        print("----------------------------")
+
+        monday = datetime(2025, 3, 3).date()
+
+        # Period ids
+        # ----------
+        self.assertEqual(period_id("daily", monday + timedelta(days=1)) - period_id("daily", monday), 1)
+        self.assertEqual(period_id("weekly", monday), period_id("weekly", monday + timedelta(days=6)))
+        self.assertEqual(period_id("weekly", monday + timedelta(days=7)) - period_id("weekly", monday), 1)
+        self.assertEqual(period_id("monthly", datetime(2025, 1, 31).date()) + 1, period_id("monthly", datetime(2025, 2, 1).date()))
+        self.assertEqual(period_id("quarterly", datetime(2025, 1, 1).date()), period_id("quarterly", datetime(2025, 3, 31).date()))
+        self.assertEqual(period_id("quarterly", datetime(2024, 12, 31).date()) + 1, period_id("quarterly", datetime(2025, 1, 1).date()))
+        self.assertEqual(period_id("3-day", monday + timedelta(days=3)) - period_id("3-day", monday), 1)
+
+        # Period starts
+        for frequency in ["daily", "weekly", "monthly", "quarterly", "10-day"]:
+            period = get_period(frequency)
+            start = period.period_start(period.period_id(monday))
+            self.assertEqual(period.period_id(start), period.period_id(monday))
+            self.assertNotEqual(period.period_id(start - timedelta(days=1)), period.period_id(monday))
+        self.assertEqual(get_period("weekly").period_start(period_id("weekly", monday + timedelta(days=4))), monday)
+
+        self.assertFalse(is_frequency("yearly"))
+        self.assertFalse(is_frequency("0-day"))
+        self.assertTrue(is_frequency(f"{MAX_CYCLE_DAYS}-day"))
+        self.assertFalse(is_frequency(f"{MAX_CYCLE_DAYS + 1}-day")) # Custom cycles stay bounded
+        with self.assertRaises(TypeError):
+            Period("abstract")
+        print(f"✓ Period ids verified!")
+
+        # Streaks of new frequencies
+        # --------------------------
+        streaks = Streaks()
+        months = [datetime(2024, month, 15).date() for month in [1, 2, 3, 5, 6]]
+        streaks.get_current_streak("monthly", months, sample_data=True)
+        self.assertEqual(streaks.current_streak, 2)
+        self.assertEqual(streaks.broken_streak_lengths, [3])
+
+        quarters = [datetime(2024, 2, 1).date(), datetime(2024, 6, 30).date(), datetime(2024, 7, 1).date()]
+        streaks.get_current_streak("quarterly", quarters, sample_data=True)
+        self.assertEqual(streaks.longest_streak, 3)
+
+        habit = Habit()
+        habit.frequency = "monthly"
+        habit.completion_dates = [monday]
+        self.assertTrue(habit.completion_dates.has_period("monthly", datetime(2025, 3, 31).date()))
+        self.assertFalse(habit.completion_dates.has_period("monthly", datetime(2025, 4, 1).date()))
+        print(f"✓ Monthly, quarterly and custom streaks verified!")
+
 # --------------------------
 # Streaks related tests
 # --------------------------
@@ -140,7 +318,7 @@ class TestStreaks(unittest.TestCase):
         self.streaks = Streaks()
         self.streaks.current_streak = 0
         self.streaks.longest_streak = 0
-        self.streaks.broken_streak_length = []
+        self.streaks.broken_streak_lengths = []
 
         # Test the is_streak_broken method for daily habits
         # -------------------------------------------------
@@ -256,6 +434,46 @@ class TestStreaks(unittest.TestCase):
         self.assertEqual(self.streaks.broken_streak_lengths, [1])
         print(f"✓ Current streak non-consecutive weekly completions verified!")
 
+# --------------------------
+# Memory layout related tests
+# --------------------------
+
+class TestMemoryLayout(unittest.TestCase):
+    """Tests the memory-lean layout of the core models."""
+
+    def test_memory_layout(self):
+        print(f"\n============================")
+        print("Testing Memory-Lean Models")
+        print("----------------------------")
+
+        # Slots: no per-instance __dict__, unknown attributes are rejected
+        # ---------------------------------------------------------------
+        for model in [User(), Habit(), Streaks()]:
+            self.assertFalse(hasattr(model, "__dict__"))
+        with self.assertRaises(AttributeError):
+            Habit().creation = datetime.now().date()
+        print(f"✓ Slots verified!")
+
+        # Array-backed broken streak history
+        # ----------------------------------
+        streaks = Streaks()
+        streaks.broken_streak_lengths = [3, 5]
+        self.assertIsInstance(streaks.broken_streak_lengths, StreakLengths)
+        self.assertEqual(streaks.broken_streak_lengths, [3, 5])
+        self.assertEqual(repr(streaks.broken_streak_lengths), "[3, 5]")
+        streaks.broken_streak_lengths.append(8)
+        self.assertEqual(max(streaks.broken_streak_lengths), 8)
+        self.assertEqual(streaks.broken_streak_lengths.itemsize, 4)
+        print(f"✓ Array-backed streak history verified!")
+
+        # Habits share date objects
+        # -------------------------
+        first, second = Habit(), Habit()
+        first.completion_dates = [datetime(2025, 3, 3).date()]
+        second.completion_dates = [datetime(2025, 3, 3).date()]
+        self.assertIs(first.completion_dates[0], second.completion_dates[0])
+        print(f"✓ Shared date objects verified!")
+
 # --------------------------
 # Analytics related tests
 # --------------------------
@@ -427,5 +645,64 @@ class TestAnalytics(unittest.TestCase):
         self.assertEqual(weekly_avg, 3)
         print(f"✓ Average streak length by periodicity verified!")
 
+# --------------------------
+# Habit index related tests
+# --------------------------
+
+class TestHabitIndex(unittest.TestCase):
+    """Tests the sorted habit indexes of paged habit lists."""
+
+    def test_habit_index(self):
+        print(f"\n===============================")
+        print("Testing Sorted Habit Indexes")
+        print("-------------------------------")
+
+        # Setup: 25 habits, every 5th one weekly
+        # --------------------------------------
+        user = User(username="Test User")
+        for nr in range(25):
+            habit = Habit()
+            habit.name = f"Habit {nr:02d}"
+            habit.frequency = "weekly" if nr % 5 == 0 else "daily"
+            habit.streaks.current_streak = nr % 7
+            user.habits.append(habit)
+        index = Analytics(user).habit_index()
+
+        # Keyset pages in name order
+        # --------------------------
+        first_page, cursor = index.page("name", limit=10)
+        second_page, cursor = index.page("name", cursor, limit=10)
+        last_page, cursor = index.page("name", cursor, limit=10)
+        self.assertEqual([habit.name for habit in first_page + second_page + last_page],
+                         [habit.name for habit in Analytics(user).list_all_habits()])
+        self.assertEqual(len(last_page), 5)
+        self.assertIsNone(cursor)
+        print(f"✓ Keyset pages verified!")
+
+        # Filters and sort orders
+        # -----------------------
+        weekly, _ = index.page("name", frequency="weekly")
+        self.assertEqual([habit.name for habit in weekly], ["Habit 00", "Habit 05", "Habit 10", "Habit 15", "Habit 20"])
+        matching, _ = index.page("name", contains="habit 1")
+        self.assertEqual(len(matching), 10)
+        by_streak, _ = index.page("streak", limit=3)
+        self.assertEqual([habit.name for habit in by_streak], ["Habit 06", "Habit 13", "Habit 20"])
+        print(f"✓ Filters and sort orders verified!")
+
+        # Incremental updates: changed streaks, added and removed habits
+        # --------------------------------------------------------------
+        user.habits[24].streaks.current_streak = 50
+        new_habit = Habit()
+        new_habit.name = "Aardvark Care"
+        new_habit.frequency = "daily"
+        user.habits.append(new_habit)
+        del user.habits[6]
+
+        by_streak, _ = index.page("streak", limit=3)
+        self.assertEqual([habit.name for habit in by_streak], ["Habit 24", "Habit 13", "Habit 20"])
+        first_page, _ = index.page("name", limit=2)
+        self.assertEqual([habit.name for habit in first_page], ["Aardvark Care", "Habit 00"])
+        print(f"✓ Incremental index updates verified!")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,1646 @@
+"""
+Unit testing module for the database layer.
+
+Coverage:
+- loading of users and habits through the Database class and its managers
+- lazy loading of completion dates
+- write-behind completion queue
+- concurrency-safe database facade
+- retry policy for locked db files
+- transaction batching
+- bulk completions for many habits and users
+- date range completions and deletions
+- binary column encoding with legacy text fallback, day bitmap BLOBs
+- query plans: no manager statement with a WHERE clause scans a whole table
+- session name cache revalidated through PRAGMA data_version
+- paginated user picker: keyset pages and prefix search
+- cascading deletes: legacy schema rebuild, chunked user deletion
+- schema migrations: versioned steps, startup without DDL, resumable chunked conversions
+- hot backups: throttled backup API copies during live writes, compression, retention, restore and verify
+- in-memory working set: flushes on save/timer/close, data_version conflict detection
+- storage backends: one conformance suite run against the SQLite, the in-memory and the sharded backend
+- completion event log: appended events, snapshot plus tail replay, baseline snapshots, restore from the log
+- sharding: routing, scatter-gather statistics, online moves during concurrent writes, rebalancing, import
+
+Note: Every test runs against a temporary db file, so the submission sample data is never touched.
+      Interactive manager functions (prompts, confirmations) are tested manually.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import config
+from core.user import User
+from core.habit import Habit
+from db_and_managers.concurrent_database import ConcurrentDatabase
+from db_and_managers.backup import BackupScheduler, backup_db, list_backups, restore_backup, verify_backup
+from db_and_managers.blob_codec import DAY_BITMAP, PACKED_UINT32, encode_dates
+from db_and_managers.database import Database
+from db_and_managers.db_structure import DB_INDEXES, delete_in_chunks
+from db_and_managers.event_log import (diverged_habits, log_habits_deleted, replay_habit, replay_user,
+                                       restore_aggregates, take_snapshots)
+from db_and_managers import manager_habit_db as habit_db
+from db_and_managers import manager_user_db as user_db
+from db_and_managers.manager_habit_db import habit_state
+from db_and_managers.migrations import SCHEMA_VERSION, encode_columns, migrate
+from db_and_managers.name_cache import close_name_caches, name_cache
+from db_and_managers.sharding import ShardedBackend
+from db_and_managers.storage import MemoryBackend, SQLiteBackend
+from db_and_managers.working_set import WorkingSetConflict
+from db_and_managers.write_behind import WriteBehindQueue, _journal_line
+from helpers.db_retry import connect_with_retry, retry_metrics
+from helpers.helper_functions import bound_connection
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Base test case which creates a Database instance on a temporary db file."""
+
+    def setUp(self):
+        # Temporary db file (Database() points the global db filepath at it)
+        self.previous_filepath = config.DB_FILEPATH
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.db_dir.name, "test_habit_tracker.db"))
+
+        # Test user with one daily habit
+        self.user = User(username="Test User")
+        self.db.save_user(self.user)
+
+        habit = Habit()
+        habit.name = "Test Habit"
+        habit.frequency = "daily"
+        habit.create_date()
+        self.db.save_habits(self.user, habit)
+
+    def tearDown(self):
+        # Restore the db filepath for other test modules, without opening (and migrating) that db
+        config.set_db_filepath(self.previous_filepath)
+        close_name_caches()
+        self.db_dir.cleanup()
+
+# --------------------------
+# Lazy loading related tests
+# --------------------------
+
+class TestLazyLoading(DatabaseTestCase):
+    """Tests the lazy loading of completion dates."""
+
+    def test_lazy_loading(self):
+        print(f"\n===================================")
+        print("Testing Lazy Completion Loading")
+        print("-----------------------------------")
+
+        # Setup
+        # -----
+        today = datetime.now().date()
+        completions = [today - timedelta(days=2), today - timedelta(days=1), today]
+
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        habit.completion_dates = list(completions)
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, sample_data=True)
+        self.db.save_habits(self.user)
+
+        # Reload habits: completion dates should not be fetched yet
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+
+        self.assertFalse(habit.completions_loaded)
+        self.assertEqual(habit.completions_count, 3)
+        self.assertEqual(habit.streaks.current_streak, 3)
+        print(f"✓ Habit metadata and streaks loaded without completions verified!")
+
+        # First access fetches the completion dates
+        self.assertEqual(habit.completion_dates, completions)
+        self.assertTrue(habit.completions_loaded)
+        print(f"✓ Completion dates fetched on first access verified!")
+
+        # Saving with unloaded habits keeps their stored completions
+        self.db.load_habits(self.user)
+        self.db.save_habits(self.user)
+        self.db.load_habits(self.user)
+        self.assertEqual(self.user.habits[0].completion_dates, completions)
+        print(f"✓ Unloaded habits preserved on save verified!")
+
+# --------------------------
+# Write-behind related tests
+# --------------------------
+
+class TestWriteBehind(DatabaseTestCase):
+    """Tests the write-behind completion queue."""
+
+    def test_write_behind(self):
+        print(f"\n===================================")
+        print("Testing Write-Behind Queue")
+        print("-----------------------------------")
+
+        # Setup
+        # -----
+        today = datetime.now().date()
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        journal_filepath = os.path.join(self.db_dir.name, "test.pending")
+
+        # Queued writes are committed in one batch on flush
+        # -------------------------------------------------
+        queue = WriteBehindQueue(journal_filepath, flush_interval=60)
+        habit.completion_dates.append(today)
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates)
+        queue.enqueue(habit_state(self.user, habit))
+
+        self.assertEqual(queue.pending_count(), 1)
+        self.assertTrue(os.path.exists(journal_filepath))
+
+        queue.close()
+        self.assertEqual(queue.pending_count(), 0)
+        self.db.load_habits(self.user)
+        self.assertEqual(self.user.habits[0].completion_dates, [today])
+        self.assertEqual(self.user.habits[0].streaks.current_streak, 1)
+        print(f"✓ Queued completion committed on close verified!")
+
+        # Leftover journal entries are replayed on start
+        # ----------------------------------------------
+        habit = self.user.habits[0]
+        habit.completion_dates = []
+        habit.streaks.current_streak = 0
+        with open(journal_filepath, "w", encoding="utf-8") as journal:
+            journal.write(json.dumps(habit_state(self.user, habit)) + "\n")
+            journal.write('[1, "Torn line')
+
+        queue = WriteBehindQueue(journal_filepath, flush_interval=60)
+        queue.close()
+        self.db.load_habits(self.user)
+        self.assertEqual(self.user.habits[0].completion_dates, [])
+        self.assertFalse(os.path.exists(journal_filepath))
+        print(f"✓ Journal replay after a crash verified!")
+
+# --------------------------
+# Concurrency related tests
+# --------------------------
+
+class TestConcurrentDatabase(DatabaseTestCase):
+    """Tests the thread-safe database facade with parallel workers."""
+
+    def test_concurrent_database(self):
+        print(f"\n===================================")
+        print("Testing Concurrent Database")
+        print("-----------------------------------")
+
+        # Setup
+        # -----
+        concurrent_db = ConcurrentDatabase(self.db.db_filepath)
+        today = datetime.now().date()
+        thread_connections = set()
+        lock = threading.Lock()
+
+        def work(user_nr):
+            # Each worker handles one user end to end
+            with lock:
+                thread_connections.add(id(concurrent_db._thread_connection()))
+            user = concurrent_db.create_user(f"worker {user_nr}")
+            habit = concurrent_db.create_habit(user, "Parallel Habit", "daily")
+            for days_ago in range(5, 0, -1):
+                concurrent_db.add_completion(user, habit, today - timedelta(days=days_ago))
+            return user.user_id
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            user_ids = list(pool.map(work, range(8)))
+
+        # Every user's data was written completely
+        for user_id in user_ids:
+            user = concurrent_db.load_user(user_id)
+            habits = concurrent_db.load_habits(user)
+            self.assertEqual(habits[0].completions_count, 5)
+            self.assertEqual(habits[0].streaks.longest_streak, 5)
+        self.assertEqual(len(concurrent_db.load_users()), 9) # 8 workers + test user
+        self.assertGreater(len(thread_connections), 1)
+        print(f"✓ Parallel users' operations verified!")
+
+        # Duplicates are rejected without prompting
+        self.assertIsNone(concurrent_db.create_user("Worker 0"))
+        user = concurrent_db.load_user(user_ids[0])
+        habit = concurrent_db.load_habits(user)[0]
+        self.assertFalse(concurrent_db.add_completion(user, habit, today - timedelta(days=1)))
+        self.assertTrue(concurrent_db.remove_completion(user, habit, today - timedelta(days=1)))
+        print(f"✓ Explicit user context and validation verified!")
+
+        # Two threads checking off the same habit, each on its own copy, don't lose each other's dates
+        start = threading.Barrier(2)
+
+        def check_off(first_day):
+            own_user = concurrent_db.load_user(user_ids[1])
+            own_habit = concurrent_db.load_habits(own_user)[0]
+            own_habit.completion_dates # Loaded before the other thread writes
+            start.wait()
+            for days_ago in range(first_day, 40, 2):
+                concurrent_db.add_completion(own_user, own_habit, today - timedelta(days=days_ago))
+            start.wait()
+            for days_ago in range(first_day + 20, 40, 2):
+                concurrent_db.remove_completion(own_user, own_habit, today - timedelta(days=days_ago))
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(check_off, [10, 11]))
+
+        user = concurrent_db.load_user(user_ids[1])
+        habit = concurrent_db.load_habits(user)[0]
+        expected = {today - timedelta(days=days_ago) for days_ago in list(range(1, 6)) + list(range(10, 30))}
+        self.assertEqual(set(habit.completion_dates), expected)
+
+        # Same for bulk completions
+        def bulk_check_off(first_day):
+            own_user = concurrent_db.load_user(user_ids[2])
+            own_habit = concurrent_db.load_habits(own_user)[0]
+            own_habit.completion_dates # Loaded before the other thread writes
+            start.wait()
+            for days_ago in range(first_day, 40, 4):
+                concurrent_db.complete_habits([(own_user, own_habit, today - timedelta(days=days_ago)),
+                                               (own_user, own_habit, today - timedelta(days=days_ago + 2))])
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(bulk_check_off, [10, 11]))
+
+        user = concurrent_db.load_user(user_ids[2])
+        habit = concurrent_db.load_habits(user)[0]
+        expected = {today - timedelta(days=days_ago) for days_ago in list(range(1, 6)) + list(range(10, 42))}
+        self.assertEqual(set(habit.completion_dates), expected)
+        self.assertEqual(habit.completions_count, len(expected))
+        print(f"✓ Concurrent check-offs of one habit verified!")
+
+        concurrent_db.close()
+
+# --------------------------
+# Retry policy related tests
+# --------------------------
+
+class TestRetryPolicy(DatabaseTestCase):
+    """Tests the retry policy on a db file locked by another writer."""
+
+    def setUp(self):
+        super().setUp()
+        # Short busy timeout so the retry policy does the waiting
+        self.saved_policy = dict(config.DB_RETRY_POLICY)
+        config.set_db_retry_policy(busy_timeout=0.01, base_delay=0.02, max_delay=0.1, max_attempts=50)
+        retry_metrics.reset()
+
+    def tearDown(self):
+        config.DB_RETRY_POLICY.update(self.saved_policy)
+        super().tearDown()
+
+    def lock_db(self):
+        """Opens a second connection holding the write lock."""
+        locker = sqlite3.connect(self.db.db_filepath, check_same_thread=False)
+        locker.execute("BEGIN EXCLUSIVE")
+        return locker
+
+    def test_retry_policy(self):
+        print(f"\n===================================")
+        print("Testing DB Retry Policy")
+        print("-----------------------------------")
+
+        # Contention degrades into small delays
+        # -------------------------------------
+        locker = self.lock_db()
+        threading.Timer(0.2, locker.rollback).start()
+
+        self.db.save_user(User(username="Patient User"))
+        self.assertIn("Patient User", [user.username for user in self.db.load_users()])
+        self.assertGreater(sum(retry_metrics.snapshot()["retries"].values()), 0)
+        locker.close()
+        print(f"✓ Write retried until the lock was released verified!")
+
+        # The policy gives up after the maximum elapsed time
+        # --------------------------------------------------
+        config.set_db_retry_policy(max_elapsed=0.2)
+        locker = self.lock_db()
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.save_user(User(username="Impatient User"))
+        locker.rollback()
+        locker.close()
+        self.assertGreater(sum(retry_metrics.snapshot()["give_ups"].values()), 0)
+        print(f"✓ Bounded retries without user prompts verified!")
+
+        with self.assertRaises(ValueError):
+            config.set_db_retry_policy(retries=3)
+
+# ---------------------------
+# Transaction related tests
+# ---------------------------
+
+class TestTransaction(DatabaseTestCase):
+    """Tests the Database.transaction() context manager."""
+
+    def count_rows(self, table):
+        """Counts the rows of a table on a separate connection (sees only committed data)."""
+        connection = sqlite3.connect(self.db.db_filepath)
+        try:
+            return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_transaction(self):
+        print(f"\n===================================")
+        print("Testing Transaction Batching")
+        print("-----------------------------------")
+
+        # Commit once at the end
+        # ----------------------
+        with self.db.transaction():
+            for name in ["Alpha", "Beta"]:
+                self.db.save_user(User(username=name))
+            # Nested transactions join the outer one
+            with self.db.batch():
+                self.db.save_user(User(username="Gamma"))
+            # Nothing is visible to other connections before the commit
+            self.assertEqual(self.count_rows("users"), 1)
+
+        self.assertEqual(self.count_rows("users"), 4)
+        print(f"✓ Single commit and nesting verified!")
+
+        # Roll back on exception
+        # ----------------------
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.save_user(User(username="Delta"))
+                habit = Habit()
+                habit.name = "Rolled Back"
+                habit.frequency = "weekly"
+                habit.create_date()
+                self.db.save_habits(self.user, habit)
+                raise RuntimeError("Failure mid-batch")
+
+        self.assertEqual(self.count_rows("users"), 4)
+        self.assertEqual(self.count_rows("habits"), 1)
+        print(f"✓ Rollback on exception verified!")
+
+        # Concurrent facade
+        # -----------------
+        concurrent_db = ConcurrentDatabase(self.db.db_filepath)
+        try:
+            with self.assertRaises(RuntimeError):
+                with concurrent_db.transaction():
+                    concurrent_db.create_user("Epsilon")
+                    raise RuntimeError("Failure mid-batch")
+            self.assertEqual(self.count_rows("users"), 4)
+
+            with concurrent_db.transaction():
+                concurrent_db.create_user("Epsilon")
+            self.assertEqual(self.count_rows("users"), 5)
+        finally:
+            concurrent_db.close()
+        print(f"✓ ConcurrentDatabase transactions verified!")
+
+# -----------------------------
+# Bulk completion related tests
+# -----------------------------
+
+class TestBulkCompletions(DatabaseTestCase):
+    """Tests bulk completions across habits and users."""
+
+    def test_bulk_completions(self):
+        print(f"\n===================================")
+        print("Testing Bulk Completions")
+        print("-----------------------------------")
+
+        # Setup: a second user with a weekly habit
+        # ----------------------------------------
+        today = datetime.now().date()
+        monday = today - timedelta(days=today.weekday())
+
+        other_user = User(username="Other User")
+        self.db.save_user(other_user)
+        weekly_habit = Habit()
+        weekly_habit.name = "Weekly Habit"
+        weekly_habit.frequency = "weekly"
+        weekly_habit.create_date()
+        self.db.save_habits(other_user, weekly_habit)
+
+        self.db.load_habits(self.user)
+        self.db.load_habits(other_user)
+        daily = self.user.habits[0]
+        weekly = other_user.habits[0]
+
+        # Bulk completion
+        # ---------------
+        rejected = self.db.complete_habits([
+            (self.user, daily, today - timedelta(days=2)),
+            (self.user, daily, today - timedelta(days=1)),
+            (self.user, daily, today),
+            (self.user, daily, today),                          # Duplicate date in the batch
+            (self.user, daily, today + timedelta(days=1)),      # Future date
+            (other_user, weekly, monday - timedelta(days=7)),
+            (other_user, weekly, monday),
+            (other_user, weekly, monday + timedelta(days=1)),   # Same week as Monday
+        ])
+
+        self.assertEqual(len(rejected), 3)
+        self.assertEqual(daily.streaks.current_streak, 3)
+        self.assertEqual(weekly.streaks.current_streak, 2)
+        print(f"✓ Validation and streaks verified!")
+
+        # Saved for both users
+        self.db.load_habits(self.user)
+        self.db.load_habits(other_user)
+        self.assertEqual(len(self.user.habits[0].completion_dates), 3)
+        self.assertEqual(self.user.habits[0].streaks.current_streak, 3)
+        self.assertEqual(other_user.habits[0].completion_dates, [monday - timedelta(days=7), monday])
+        print(f"✓ Bulk save verified!")
+
+        # Complete all due today
+        # ----------------------
+        extra = Habit()
+        extra.name = "Extra Habit"
+        extra.frequency = "daily"
+        extra.create_date()
+        self.db.save_habits(self.user, extra)
+        self.db.load_habits(self.user)
+
+        completed = self.db.complete_all_due_today(self.user)
+        self.assertEqual([habit.name for habit in completed], ["Extra Habit"])
+        self.assertEqual(self.db.complete_all_due_today(self.user), [])
+        print(f"✓ Complete all due today verified!")
+
+class TestDateRanges(DatabaseTestCase):
+    """Tests completing and deleting date ranges."""
+
+    def test_date_ranges(self):
+        print(f"\n===================================")
+        print("Testing Date Range Completions")
+        print("-----------------------------------")
+
+        today = datetime.now().date()
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+
+        # Complete a range
+        # ----------------
+        added = self.db.add_completion_range(self.user, habit, today - timedelta(days=13), today + timedelta(days=3))
+        self.assertEqual(len(added), 14) # Future dates skipped
+        self.assertEqual(habit.streaks.current_streak, 14)
+
+        # Already completed dates are skipped
+        self.assertEqual(self.db.add_completion_range(self.user, habit, today - timedelta(days=2), today), [])
+        print(f"✓ Range completion verified!")
+
+        # Delete with a weekday mask
+        # --------------------------
+        removed = self.db.remove_completion_range(self.user, habit, today - timedelta(days=13), today, weekdays=[5, 6])
+        self.assertEqual(len(removed), 4) # 2 weekends
+        self.assertTrue(all(d.weekday() in (5, 6) for d in removed))
+        self.assertLess(habit.streaks.current_streak, 14)
+
+        # Saved once per range, as one change
+        self.db.load_habits(self.user)
+        reloaded = self.user.habits[0]
+        self.assertEqual(reloaded.completion_dates, sorted(set(added) - set(removed)))
+        self.assertEqual(reloaded.streaks.current_streak, habit.streaks.current_streak)
+        print(f"✓ Range deletion with weekday mask verified!")
+
+        # Weekly range vs single dates
+        # ----------------------------
+        weekly_habits = []
+        for name in ["Weekly Range", "Weekly Dates"]:
+            weekly = Habit()
+            weekly.name = name
+            weekly.frequency = "weekly"
+            weekly.create_date()
+            self.db.save_habits(self.user, weekly)
+            weekly_habits.append(weekly)
+        range_habit, dates_habit = weekly_habits
+
+        start_date = today - timedelta(days=31)
+        added = self.db.add_completion_range(self.user, range_habit, start_date, start_date + timedelta(days=6))
+        single = [start_date + timedelta(days=offset) for offset in range(7)
+                  if self.db.add_completion(self.user, dates_habit, start_date + timedelta(days=offset))]
+
+        # One completion per week either way (a 7-day range spans one or two weeks)
+        self.assertEqual(added, single)
+        self.assertEqual(len({d.isocalendar()[:2] for d in added}), len(added))
+        self.assertEqual(range_habit.completion_dates, dates_habit.completion_dates)
+        print(f"✓ Same duplicate rule for range and single-date completions verified!")
+
+class TestBlobEncoding(DatabaseTestCase):
+    """Tests the binary column encoding of completions and streak histories."""
+
+    def tearDown(self):
+        config.set_db_blob_encoding(False)
+        config.set_db_day_bitmap_encoding(False)
+        super().tearDown()
+
+    def column_types(self):
+        """The SQLite storage classes of the encoded columns of the test habit."""
+        connection = sqlite3.connect(self.db.db_filepath)
+        try:
+            return connection.execute("""
+                SELECT typeof(habits.completion_dates), typeof(streaks.streak_length_history)
+                FROM habits JOIN streaks ON streaks.habit_id = habits.id
+                WHERE habits.habit_name = 'Test Habit'
+            """).fetchone()
+        finally:
+            connection.close()
+
+    def test_blob_encoding(self):
+        print(f"\n===================================")
+        print("Testing Binary Column Encoding")
+        print("-----------------------------------")
+
+        today = datetime.now().date()
+        completions = [today - timedelta(days=offset) for offset in [9, 8, 5, 4, 3, 1, 0]]
+
+        # Legacy text rows
+        # ----------------
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        habit.completion_dates = completions
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, sample_data=True)
+        self.db.save_habits(self.user)
+        self.assertEqual(self.column_types(), ("text", "text"))
+
+        # Switching on: text rows are still read, new writes are BLOBs
+        # -------------------------------------------------------------
+        config.set_db_blob_encoding(True)
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        self.assertEqual(habit.completion_dates, completions)
+        self.assertEqual(habit.streaks.broken_streak_lengths, [2, 3])
+
+        self.db.save_habits(self.user)
+        self.assertEqual(self.column_types(), ("blob", "blob"))
+
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        self.assertEqual(habit.completion_dates, completions)
+        self.assertEqual(habit.streaks.broken_streak_lengths, [2, 3])
+        self.assertEqual(habit.streaks.current_streak, 2)
+        print(f"✓ BLOB round trip and legacy text fallback verified!")
+
+        # Switching off: BLOB rows are still read
+        # ---------------------------------------
+        config.set_db_blob_encoding(False)
+        self.db.load_habits(self.user)
+        self.assertEqual(self.user.habits[0].completion_dates, completions)
+        print(f"✓ Reading BLOBs with text encoding verified!")
+
+        # Write-behind journal with BLOB states
+        # -------------------------------------
+        config.set_db_blob_encoding(True)
+        journal_filepath = os.path.join(self.db_dir.name, "test.pending")
+        habit = self.user.habits[0]
+        habit.completion_dates.append(today - timedelta(days=2))
+        with open(journal_filepath, "w", encoding="utf-8") as journal:
+            journal.write(_journal_line(habit_state(self.user, habit)))
+
+        WriteBehindQueue(journal_filepath, flush_interval=60).close()
+        self.db.load_habits(self.user)
+        self.assertEqual(self.user.habits[0].completion_dates, sorted(completions + [today - timedelta(days=2)]))
+        print(f"✓ Write-behind journal with BLOBs verified!")
+
+        # Day bitmap BLOBs: smaller than packed dates for dense daily histories
+        # ---------------------------------------------------------------------
+        config.set_db_day_bitmap_encoding(True)
+        history = [today - timedelta(days=offset) for offset in range(364, -1, -1) if offset % 10]
+        habit = self.user.habits[0]
+        habit.completion_dates = history
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, sample_data=True)
+        self.db.save_habits(self.user)
+
+        connection = sqlite3.connect(self.db.db_filepath)
+        blob = connection.execute("SELECT completion_dates FROM habits WHERE habit_name = 'Test Habit'").fetchone()[0]
+        connection.close()
+        self.assertEqual(blob[0], DAY_BITMAP)
+        self.assertLess(len(blob), 60) # 365 days: 46 bitmap bytes + header, instead of 1,313 packed bytes
+
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        self.assertEqual(habit.completion_dates, history)
+        self.assertEqual(habit.completion_dates.bitmap().runs()[-1], habit.streaks.current_streak)
+        self.assertEqual(encode_dates([today], bitmap=True)[0], PACKED_UINT32) # Packed is smaller
+        print(f"✓ Day bitmap BLOBs verified!")
+
+# --------------------------
+# Query plan related tests
+# --------------------------
+
+def full_scans(connection: sqlite3.Connection, statement: str) -> list:
+    """The full table (or index) scans in the query plan of a statement."""
+    plan = connection.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    # Plan rows are (id, parent, notused, detail): "SEARCH ... USING INDEX" is indexed, "SCAN ..." reads everything
+    return [row[3] for row in plan if row[3].startswith("SCAN")]
+
+class TestQueryPlans(DatabaseTestCase):
+    """Tests that the managers' statements use indexes instead of full table scans."""
+
+    def test_query_plans(self):
+        print(f"\n===================================")
+        print("Testing Query Plans")
+        print("-----------------------------------")
+
+        # Indexes are created idempotently
+        # --------------------------------
+        Database(self.db.db_filepath)
+        connection = sqlite3.connect(self.db.db_filepath)
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue(set(DB_INDEXES) <= indexes)
+        print(f"✓ Index set verified!")
+
+        # Record every statement issued by the managers
+        # ---------------------------------------------
+        statements = []
+        connection.set_trace_callback(statements.append)
+        today = datetime.now().date()
+
+        with bound_connection(connection), \
+                patch("builtins.input", return_value="delete"), \
+                patch("db_and_managers.manager_user_db.time.sleep"):
+            self.db.load_users()
+            self.db.load_user(self.user.user_id)
+            self.db.save_user(User(username="Other User"))
+            self.db.load_habits(self.user)
+            habit = self.user.habits[0]
+            self.db.add_completion(self.user, habit, today)
+            self.db.add_completion_range(self.user, habit, today - timedelta(days=9), today - timedelta(days=2))
+            self.db.remove_completion(self.user, habit, today - timedelta(days=5))
+            self.db.complete_habits([(self.user, habit, today - timedelta(days=1))])
+            self.db.save_habits(self.user)
+
+            extra_habit = Habit()
+            extra_habit.name = "Extra Habit"
+            extra_habit.frequency = "weekly"
+            extra_habit.create_date()
+            self.db.save_habits(self.user, extra_habit)
+            self.db.load_habits(self.user)
+            habit_db.habit_name_exists(self.user, "Extra Habit")
+            user_db.username_exists("Test User")
+            user_db.load_user_page(after="Other User", prefix="", limit=5)
+            user_db.load_user_page(after=None, prefix="te", limit=5)
+            habit_db.delete_habit(self.user, self.user.habits[-1])
+            user_db.delete_user(self.user)
+
+        connection.set_trace_callback(None)
+
+        # The session name cache's queries, on its own connection
+        cache = name_cache()
+        cache.close()
+        cache.revalidate() # Opens the cache connection
+        cache._connection.set_trace_callback(statements.append)
+        user_db.username_exists("Other User")
+        habit_db.habit_name_exists(self.user, "Test Habit")
+        self.db.load_users()
+        cache._connection.set_trace_callback(None)
+
+        # Every query and every statement with a WHERE clause must be an index lookup
+        # ----------------------------------------------------------------------------
+        # Deliberate full scans: the user list (the whole table is asked for)
+        user_lists = {"SELECT id, username FROM users", "SELECT id, username FROM users ORDER BY id"}
+        lookups = {statement for statement in statements
+                   if statement.lstrip().upper().startswith("SELECT") or "WHERE" in statement.upper()}
+        self.assertGreaterEqual(len(lookups), 8)
+        for statement in lookups - user_lists:
+            self.assertEqual(full_scans(connection, statement), [], statement)
+        connection.close()
+        print(f"✓ No full table scans in {len(lookups - user_lists)} lookup statements!")
+
+# --------------------------
+# Name cache related tests
+# --------------------------
+
+class TestNameCache(DatabaseTestCase):
+    """Tests the session name cache of username and habit name validation."""
+
+    def test_name_cache(self):
+        print(f"\n===================================")
+        print("Testing Session Name Cache")
+        print("-----------------------------------")
+
+        # Filled lookup by lookup, then only data_version checks
+        # ------------------------------------------------------
+        statements = []
+        name_cache().close() # Forgets the setup's own writes
+        name_cache().users() # Opens the cache connection
+        name_cache()._connection.set_trace_callback(statements.append)
+        self.assertTrue(user_db.username_exists("test user")) # Normalized lookup
+        self.assertFalse(user_db.username_exists("Nobody"))
+        self.assertTrue(habit_db.habit_name_exists(self.user, "test habit"))
+        self.assertFalse(habit_db.habit_name_exists(self.user, "Other Habit"))
+        # One index probe per username, one query of the user's habit names - no table scans
+        self.assertEqual([statement for statement in statements if not statement.startswith("PRAGMA")], [
+            "SELECT 1 FROM users WHERE username = 'Test User' COLLATE NOCASE LIMIT 1",
+            "SELECT 1 FROM users WHERE username = 'Nobody' COLLATE NOCASE LIMIT 1",
+            f"SELECT habit_name FROM habits WHERE user_id = {self.user.user_id}",
+        ])
+
+        statements.clear()
+        self.assertFalse(user_db.username_exists("Nobody"))
+        self.assertFalse(habit_db.habit_name_exists(self.user, "Other Habit"))
+        self.assertEqual([user.username for user in self.db.load_users()], ["Test User"])
+        self.assertEqual(statements, ["PRAGMA data_version"] * 3)
+        print(f"✓ Lookups without queries verified!")
+
+        # Own creations and deletions are applied in place
+        # ------------------------------------------------
+        other_user = User(username="Other User")
+        self.db.save_user(other_user)
+        habit = Habit()
+        habit.name = "Other Habit"
+        habit.frequency = "weekly"
+        habit.create_date()
+        habit_db.save_habits(self.user, habit)
+
+        statements.clear()
+        self.assertTrue(user_db.username_exists("Other User"))
+        self.assertTrue(habit_db.habit_name_exists(self.user, "Other Habit"))
+        self.assertEqual([user.username for user in self.db.load_users()], ["Test User", "Other User"])
+        self.assertEqual(statements, ["PRAGMA data_version"] * 3)
+
+        with patch("builtins.input", return_value="delete"), patch("db_and_managers.manager_user_db.time.sleep"):
+            self.db.load_habits(self.user)
+            habit_db.delete_habit(self.user, self.user.habits[-1])
+            user_db.delete_user(other_user)
+
+        statements.clear()
+        self.assertFalse(habit_db.habit_name_exists(self.user, "Other Habit"))
+        self.assertFalse(user_db.username_exists("Other User"))
+        self.assertEqual([user.username for user in self.db.load_users()], ["Test User"])
+        self.assertEqual(statements, ["PRAGMA data_version"] * 3)
+
+        # Another connection's commit landing before an own write isn't taken for the own one
+        connection = sqlite3.connect(self.db.db_filepath)
+        connection.execute("INSERT INTO users (username) VALUES ('Racer')")
+        connection.commit()
+        connection.close()
+        self.db.save_user(User(username="Own User"))
+        self.assertTrue(user_db.username_exists("Racer"))
+        self.assertTrue(user_db.username_exists("Own User"))
+        print(f"✓ Own writes verified!")
+
+        # Commits of other connections are picked up
+        # ------------------------------------------
+        connection = sqlite3.connect(self.db.db_filepath)
+        connection.execute("INSERT INTO users (username) VALUES ('Elsewhere')")
+        connection.commit()
+        connection.close()
+        self.assertTrue(user_db.username_exists("Elsewhere"))
+
+        # Bound connections (transactions) query the db directly and see their own writes
+        with self.db.transaction():
+            self.db.save_user(User(username="In Transaction"))
+            self.assertTrue(user_db.username_exists("In Transaction"))
+
+            # Normalized like the cache lookups
+            self.assertTrue(user_db.username_exists(" in transaction "))
+            self.assertTrue(habit_db.habit_name_exists(self.user, "test habit"))
+        self.assertTrue(user_db.username_exists("In Transaction"))
+        print(f"✓ Revalidation through data_version verified!")
+
+# --------------------------
+# User picker related tests
+# --------------------------
+
+class TestUserPicker(DatabaseTestCase):
+    """Tests the paginated, searchable user picker."""
+
+    def test_user_picker(self):
+        print(f"\n===================================")
+        print("Testing Paginated User Picker")
+        print("-----------------------------------")
+
+        # Setup: 24 more users
+        # --------------------
+        with self.db.transaction():
+            for letter in "ABCDEFGHIJKL":
+                self.db.save_user(User(username=f"{letter}lpha"))
+                self.db.save_user(User(username=f"{letter}eta"))
+
+        # Keyset pages in username order
+        # ------------------------------
+        pages, after = [], None
+        while True:
+            page = user_db.load_user_page(after, limit=10)
+            if not page:
+                break
+            pages.append([user.username for user in page])
+            after = page[-1].username
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), sorted(user.username for user in self.db.load_users()))
+        print(f"✓ Keyset pagination verified!")
+
+        # Prefix search, also combined with paging
+        # ----------------------------------------
+        self.assertEqual([user.username for user in user_db.load_user_page(prefix="b")], ["Beta", "Blpha"])
+        self.assertEqual([user.username for user in user_db.load_user_page("Beta", prefix="b")], ["Blpha"])
+        self.assertEqual(user_db.load_user_page(prefix="Zz"), [])
+        print(f"✓ Prefix search verified!")
+
+        # Picker: next page, previous page, search, then pick
+        # ---------------------------------------------------
+        choices = iter(["N", "P", "N", "1"])
+        with patch("builtins.input", lambda prompt="": next(choices)), \
+                patch("db_and_managers.manager_user_db.reload_cli"), patch("builtins.print"):
+            self.assertEqual(user_db.select_user().username, pages[1][0])
+
+        choices = iter(["S", "te", "1"])
+        with patch("builtins.input", lambda prompt="": next(choices)), \
+                patch("db_and_managers.manager_user_db.reload_cli"), patch("builtins.print"):
+            self.assertEqual(user_db.select_user().username, "Test User")
+        print(f"✓ Picker navigation verified!")
+
+        # The Database picker lists the users of its storage backend
+        # ----------------------------------------------------------
+        memory_db = Database(backend=MemoryBackend())
+        memory_db.save_user(User(username="Memory User"))
+        choices = iter(["1"])
+        with patch("builtins.input", lambda prompt="": next(choices)), \
+                patch("db_and_managers.manager_user_db.reload_cli"), patch("builtins.print"):
+            self.assertEqual(memory_db.select_user().username, "Memory User")
+        self.assertEqual(memory_db.user_id, memory_db.storage.load_user_page()[0].user_id)
+        print(f"✓ Picker on the storage backend verified!")
+
+# ------------------------------
+# Cascading delete related tests
+# ------------------------------
+
+class TestCascadingDeletes(DatabaseTestCase):
+    """Tests ON DELETE CASCADE foreign keys and chunked deletes."""
+
+    def table_counts(self):
+        """The number of rows of the users, habits and streaks tables."""
+        connection = sqlite3.connect(self.db.db_filepath)
+        try:
+            return tuple(connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                         for table in ["users", "habits", "streaks"])
+        finally:
+            connection.close()
+
+    def test_cascading_deletes(self):
+        print(f"\n===================================")
+        print("Testing Cascading Deletes")
+        print("-----------------------------------")
+
+        # Foreign keys are enforced on every connection
+        # ---------------------------------------------
+        connection = connect_with_retry(self.db.db_filepath)
+        self.assertEqual(connection.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        connection.close()
+
+        # Legacy tables without ON DELETE CASCADE are rebuilt, rows and IDs kept
+        # ----------------------------------------------------------------------
+        legacy_filepath = os.path.join(self.db_dir.name, "legacy.db")
+        connection = sqlite3.connect(legacy_filepath)
+        connection.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE);
+            CREATE TABLE habits (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, habit_name TEXT NOT NULL,
+                frequency TEXT NOT NULL, creation_date TEXT NOT NULL, completions_count INTEGER, completion_dates TEXT,
+                FOREIGN KEY (user_id) REFERENCES users(id));
+            CREATE TABLE streaks (id INTEGER PRIMARY KEY AUTOINCREMENT, habit_id INTEGER, current_streak INTEGER,
+                longest_streak INTEGER, streak_length_history TEXT, FOREIGN KEY (habit_id) REFERENCES habits(id));
+            INSERT INTO users (id, username) VALUES (7, 'Legacy User');
+            INSERT INTO habits VALUES (42, 7, 'Legacy Habit', 'daily', '2025-01-01', 0, '');
+            INSERT INTO streaks VALUES (3, 42, 0, 0, '');
+        """)
+        connection.close()
+
+        Database(legacy_filepath)
+        connection = sqlite3.connect(legacy_filepath)
+        for table in ["habits", "streaks"]:
+            self.assertEqual(connection.execute(f"PRAGMA foreign_key_list({table})").fetchone()[6], "CASCADE")
+        self.assertEqual(connection.execute("SELECT id, user_id FROM habits").fetchall(), [(42, 7)])
+        self.assertEqual(connection.execute("SELECT id, habit_id FROM streaks").fetchall(), [(3, 42)])
+        connection.close()
+        Database(self.db.db_filepath)
+        print(f"✓ Legacy schema rebuild verified!")
+
+        # Deleting a habit deletes its streak record
+        # ------------------------------------------
+        with self.db.transaction():
+            for nr in range(11):
+                habit = Habit()
+                habit.name = f"Habit {nr}"
+                habit.frequency = "daily"
+                habit.create_date()
+                self.db.save_habits(self.user, habit)
+        self.assertEqual(self.table_counts(), (1, 12, 12))
+
+        self.db.load_habits(self.user)
+        with patch("builtins.input", return_value="delete"), patch("db_and_managers.manager_habit_db.time.sleep"):
+            habit_db.delete_habit(self.user, self.user.habits[0])
+        self.assertEqual(self.table_counts(), (1, 11, 11))
+        print(f"✓ Habit deletion cascade verified!")
+
+        # Chunked deletes commit chunk by chunk
+        # -------------------------------------
+        self.assertEqual(delete_in_chunks("habits", "habit_name LIKE ?", ("Habit 1%",), chunk_size=1), 2)
+        self.assertEqual(self.table_counts(), (1, 9, 9))
+
+        with patch("builtins.input", return_value="delete"), \
+                patch("db_and_managers.manager_user_db.time.sleep"), \
+                patch("db_and_managers.db_structure.DELETE_CHUNK_SIZE", 4):
+            user_db.delete_user(self.user)
+        self.assertEqual(self.table_counts(), (0, 0, 0))
+        print(f"✓ Chunked user deletion verified!")
+
+class TestMigrations(DatabaseTestCase):
+    """Tests the versioned schema migrations."""
+
+    def query(self, statement):
+        """The rows of a statement on the test db."""
+        connection = sqlite3.connect(self.db.db_filepath)
+        try:
+            return connection.execute(statement).fetchall()
+        finally:
+            connection.close()
+
+    def test_migrations(self):
+        print(f"\n===================================")
+        print("Testing Schema Migrations")
+        print("-----------------------------------")
+
+        # New dbs are at the current version, startup then skips all DDL
+        # ----------------------------------------------------------------
+        self.assertEqual(self.query("PRAGMA user_version"), [(SCHEMA_VERSION,)])
+        with patch("db_and_managers.migrations.migrate") as migrate_call:
+            Database(self.db.db_filepath)
+        migrate_call.assert_not_called()
+        print(f"✓ Startup without DDL at the current version verified!")
+
+        # Unversioned db with habits missing their streak records
+        # --------------------------------------------------------
+        with self.db.transaction():
+            for nr in range(5):
+                habit = Habit()
+                habit.name = f"Habit {nr}"
+                habit.frequency = "daily"
+                habit.create_date()
+                self.db.save_habits(self.user, habit)
+        connection = sqlite3.connect(self.db.db_filepath)
+        connection.execute("DELETE FROM streaks WHERE habit_id % 2 = 0")
+        connection.execute("PRAGMA user_version = 0")
+        connection.commit()
+        connection.close()
+        self.assertEqual(self.query("SELECT COUNT(*) FROM streaks"), [(3,)])
+
+        # Interrupted after the first chunk: the chunk and its position are committed together
+        reports = []
+        def interrupt(name, last_id, max_id):
+            reports.append((name, last_id, max_id))
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            migrate(chunk_size=2, progress=interrupt)
+        self.assertEqual(reports, [("v4", 2, 6)])
+        self.assertEqual(self.query("PRAGMA user_version"), [(3,)])
+        self.assertEqual(self.query("SELECT name, last_id FROM migration_progress"), [("v4", 2)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM streaks"), [(4,)])
+
+        # Resumed with the next chunk
+        reports.clear()
+        self.assertEqual(migrate(chunk_size=2, progress=lambda *report: reports.append(report)), SCHEMA_VERSION)
+        self.assertEqual(reports, [("v4", 4, 6), ("v4", 6, 6)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM streaks"), [(6,)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM migration_progress"), [(0,)])
+        self.assertEqual(self.query("PRAGMA user_version"), [(SCHEMA_VERSION,)])
+        print(f"✓ Resumable chunked conversion verified!")
+
+        # Column conversion to BLOBs, without changing the loaded data
+        # --------------------------------------------------------------
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        habit.completion_dates = [datetime.now().date() - timedelta(days=1), datetime.now().date()]
+        habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, sample_data=True)
+        self.db.save_habits(self.user)
+
+        encode_columns(binary=True, chunk_size=4)
+        self.assertEqual(self.query("SELECT DISTINCT typeof(completion_dates) FROM habits"), [("blob",)])
+        self.db.load_habits(self.user)
+        self.assertEqual(len(self.user.habits[0].completion_dates), 2)
+        self.assertEqual(self.user.habits[0].streaks.current_streak, 2)
+        print(f"✓ Online column conversion verified!")
+
+class TestBackup(DatabaseTestCase):
+    """Tests hot backups, retention and restores."""
+
+    def habit_names(self, db_filepath):
+        """The habit names stored in a db file."""
+        connection = sqlite3.connect(db_filepath)
+        try:
+            return [row[0] for row in connection.execute("SELECT habit_name FROM habits ORDER BY id")]
+        finally:
+            connection.close()
+
+    def test_backup(self):
+        print(f"\n===================================")
+        print("Testing Hot Backups")
+        print("-----------------------------------")
+
+        backup_dir = os.path.join(self.db_dir.name, "backups")
+        with self.db.transaction():
+            for nr in range(200):
+                habit = Habit()
+                habit.name = f"Habit {nr}"
+                habit.frequency = "daily"
+                habit.create_date()
+                self.db.save_habits(self.user, habit)
+
+        # Backup in steps of one page while another connection commits: the copy is a consistent snapshot
+        # ------------------------------------------------------------------------------------------------
+        writer = connect_with_retry(self.db.db_filepath)
+        steps = []
+        def write_between_steps(remaining, total):
+            steps.append(remaining)
+            if len(steps) == 2:
+                writer.execute("UPDATE habits SET habit_name = 'Renamed Habit' WHERE habit_name = 'Test Habit'")
+                writer.commit()
+
+        backup_filepath = backup_db(backup_dir, pages=1, pause=0, progress=write_between_steps)
+        writer.close()
+        self.assertGreater(len(steps), 2)
+        self.assertTrue(verify_backup(backup_filepath))
+        self.assertEqual(self.habit_names(backup_filepath), self.habit_names(self.db.db_filepath))
+        self.assertEqual(self.habit_names(backup_filepath)[0], "Renamed Habit")
+        print(f"✓ Throttled backup during live writes verified!")
+
+        # Compressed backups and retention
+        # --------------------------------
+        compressed_filepath = backup_db(backup_dir, compress=True, keep=2)
+        self.assertTrue(compressed_filepath.endswith(".db.gz"))
+        self.assertLess(os.path.getsize(compressed_filepath), os.path.getsize(backup_filepath))
+        self.assertTrue(verify_backup(compressed_filepath))
+
+        newest_filepath = backup_db(backup_dir, compress=True, keep=2)
+        self.assertEqual(list_backups(backup_dir), [compressed_filepath, newest_filepath])
+        self.assertFalse(any(name.endswith(".partial") for name in os.listdir(backup_dir)))
+        print(f"✓ Compression and retention verified!")
+
+        # Restore and verify
+        # ------------------
+        self.db.load_habits(self.user)
+        with patch("builtins.input", return_value="delete"), patch("db_and_managers.manager_habit_db.time.sleep"):
+            habit_db.delete_habit(self.user, self.user.habits[0])
+        self.assertEqual(len(self.habit_names(self.db.db_filepath)), 200)
+
+        restore_backup(newest_filepath)
+        self.assertEqual(len(self.habit_names(self.db.db_filepath)), 201)
+        self.db.load_habits(self.user)
+        self.assertEqual(self.user.habits[0].name, "Renamed Habit")
+
+        # Damaged backups are refused, the db stays untouched
+        damaged_filepath = os.path.join(backup_dir, "damaged.db.gz")
+        with open(newest_filepath, "rb") as backup, open(damaged_filepath, "wb") as damaged:
+            damaged.write(backup.read()[:100])
+        self.assertFalse(verify_backup(damaged_filepath))
+        with self.assertRaises(ValueError):
+            restore_backup(damaged_filepath)
+        self.assertEqual(len(self.habit_names(self.db.db_filepath)), 201)
+        print(f"✓ Restore and verify verified!")
+
+        # Scheduled backups
+        # -----------------
+        scheduler = BackupScheduler(self.db.db_filepath, os.path.join(self.db_dir.name, "scheduled"), interval=60)
+        scheduler.start()
+        scheduler.stop()
+        self.assertIsNone(scheduler.last_error)
+        self.assertTrue(verify_backup(scheduler.last_backup))
+        print(f"✓ Scheduled backups verified!")
+
+class TestWorkingSet(DatabaseTestCase):
+    """Tests the in-memory working set mode."""
+
+    def file_habit_names(self, db_filepath=None):
+        """The habit names stored in a db file (defaults to the test db)."""
+        connection = sqlite3.connect(db_filepath or self.db.db_filepath)
+        try:
+            return [row[0] for row in connection.execute("SELECT habit_name FROM habits ORDER BY id")]
+        finally:
+            connection.close()
+
+    def new_habit(self, db, name):
+        """Saves a new daily habit of the test user through a Database."""
+        habit = Habit()
+        habit.name = name
+        habit.frequency = "daily"
+        habit.create_date()
+        db.save_habits(self.user, habit)
+
+    def test_working_set(self):
+        print(f"\n===================================")
+        print("Testing In-Memory Working Set")
+        print("-----------------------------------")
+
+        # The write-behind thread can't share the working set's connection
+        with self.assertRaises(ValueError):
+            Database(self.db.db_filepath, write_behind=True, in_memory=True, flush_interval=None)
+        self.assertFalse(os.path.exists(self.db.db_filepath + ".pending"))
+
+        memory_db = Database(self.db.db_filepath, in_memory=True, flush_interval=None)
+        self.addCleanup(memory_db.close)
+
+        # Reads and writes are served from memory until saved
+        # ----------------------------------------------------
+        self.assertIsNone(name_cache())
+        self.new_habit(memory_db, "Memory Habit")
+        memory_db.load_habits(self.user)
+        self.assertEqual([habit.name for habit in self.user.habits], ["Test Habit", "Memory Habit"])
+        self.assertEqual(self.file_habit_names(), ["Test Habit"])
+
+        self.assertTrue(memory_db.save())
+        self.assertEqual(self.file_habit_names(), ["Test Habit", "Memory Habit"])
+        self.assertFalse(memory_db.save())
+        print(f"✓ Flush on save verified!")
+
+        # Writes of other connections are detected, never overwritten silently
+        # ---------------------------------------------------------------------
+        other = sqlite3.connect(self.db.db_filepath)
+        other.execute("UPDATE habits SET habit_name = 'Other Habit' WHERE habit_name = 'Test Habit'")
+        other.commit()
+        other.close()
+
+        self.new_habit(memory_db, "Second Habit")
+        with self.assertRaises(WorkingSetConflict):
+            memory_db.save()
+        self.assertEqual(self.file_habit_names(), ["Other Habit", "Memory Habit"])
+
+        # Forced: the working set wins
+        self.assertTrue(memory_db.save(force=True))
+        self.assertEqual(self.file_habit_names(), ["Test Habit", "Memory Habit", "Second Habit"])
+
+        # Reloaded: the other connection wins
+        other = sqlite3.connect(self.db.db_filepath)
+        other.execute("DELETE FROM habits WHERE habit_name = 'Second Habit'")
+        other.commit()
+        other.close()
+        memory_db.working_set.reload()
+        memory_db.load_habits(self.user)
+        self.assertEqual([habit.name for habit in self.user.habits], ["Test Habit", "Memory Habit"])
+        print(f"✓ Conflict detection through data_version verified!")
+
+        # A conflict on close keeps the working set in a copy
+        # ----------------------------------------------------
+        self.new_habit(memory_db, "Unsaved Habit")
+        other = sqlite3.connect(self.db.db_filepath)
+        other.execute("DELETE FROM habits WHERE habit_name = 'Memory Habit'")
+        other.commit()
+        other.close()
+
+        with self.assertRaises(WorkingSetConflict) as conflict:
+            memory_db.close()
+        self.assertIn("Unsaved Habit", self.file_habit_names(conflict.exception.unsaved_filepath))
+        self.assertEqual(self.file_habit_names(), ["Test Habit"])
+        self.assertTrue(self.db.load_habits(self.user)) # Back on the db file
+        print(f"✓ Unsaved copy on conflicting close verified!")
+
+        # Background flushes
+        # ------------------
+        memory_db = Database(self.db.db_filepath, in_memory=True, flush_interval=0.01)
+        self.addCleanup(memory_db.close)
+        self.new_habit(memory_db, "Timed Habit")
+        for _ in range(500):
+            if "Timed Habit" in self.file_habit_names():
+                break
+            threading.Event().wait(0.01)
+        self.assertIn("Timed Habit", self.file_habit_names())
+
+        # Deferred while a transaction is open on the working set (timer ticks included)
+        with memory_db.transaction():
+            self.new_habit(memory_db, "Transaction Habit")
+            threading.Event().wait(0.05)
+            self.assertFalse(memory_db.save())
+            self.assertFalse(memory_db.working_set.conflict()) # The flush thread doesn't keep the lock
+        self.assertNotIn("Transaction Habit", self.file_habit_names())
+        self.assertTrue(memory_db.save())
+        self.assertIn("Transaction Habit", self.file_habit_names())
+
+        # Deleting a habit asks for confirmation before its transaction starts
+        prompts = []
+
+        def confirm(prompt):
+            prompts.append(memory_db.working_set._memory.in_transaction)
+            return "delete"
+
+        memory_db.load_habits(self.user)
+        with patch("builtins.input", side_effect=confirm), patch("db_and_managers.manager_habit_db.time.sleep"):
+            memory_db.delete_habit(self.user, self.user.habits[-1])
+        self.assertEqual(prompts, [False, False]) # Confirmation and "return" prompts
+        self.assertNotIn("Transaction Habit", [habit.name for habit in self.user.habits])
+
+        memory_db.close()
+        self.assertIsNotNone(name_cache())
+        print(f"✓ Background flushes verified!")
+
+class TestEventLog(DatabaseTestCase):
+    """Tests the completion event log, its snapshots and replays."""
+
+    def setUp(self):
+        config.set_db_event_log(True)
+        super().setUp()
+
+    def tearDown(self):
+        config.set_db_event_log(False)
+        super().tearDown()
+
+    def query(self, statement):
+        """The rows of a statement on the test db."""
+        connection = sqlite3.connect(self.db.db_filepath)
+        try:
+            return connection.execute(statement).fetchall()
+        finally:
+            connection.close()
+
+    def test_event_log(self):
+        print(f"\n===================================")
+        print("Testing Completion Event Log")
+        print("-----------------------------------")
+
+        today = datetime.now().date()
+
+        # Every write path appends its events in the transaction of the table update
+        # --------------------------------------------------------------------------
+        self.db.load_habits(self.user)
+        habit = self.user.habits[0]
+        self.assertEqual(len(habit.completion_dates), 0) # Lazy load before the trace
+        statements = []
+        connection = connect_with_retry(self.db.db_filepath)
+        connection.set_trace_callback(statements.append)
+        with bound_connection(connection):
+            self.db.add_completion_range(self.user, habit, today - timedelta(days=4), today)
+            self.db.remove_completion(self.user, habit, today - timedelta(days=2))
+        connection.close()
+        self.assertEqual(self.query("SELECT event, event_date FROM habit_events ORDER BY id"), [
+            ("created", today.strftime("%Y-%m-%d")),
+            *[("completed", (today - timedelta(days=days)).strftime("%Y-%m-%d")) for days in range(4, -1, -1)],
+            ("uncompleted", (today - timedelta(days=2)).strftime("%Y-%m-%d")),
+        ])
+        # The changes come from the in-memory habit: the stored dates aren't read back
+        self.assertFalse([statement for statement in statements if "SELECT completion_dates" in statement])
+
+        # Dates replaced as a whole are compared with the stored ones
+        habit.completion_dates = list(habit.completion_dates) + [today - timedelta(days=7)]
+        self.db.save_habits(self.user)
+        self.assertEqual(self.query("SELECT event, event_date FROM habit_events ORDER BY id DESC LIMIT 1"),
+                         [("completed", (today - timedelta(days=7)).strftime("%Y-%m-%d"))])
+        self.db.remove_completion(self.user, habit, today - timedelta(days=7))
+
+        # Coalesced states (write-behind queue) carry the changes of all of them
+        draft = Habit()
+        draft.completion_dates.append(today - timedelta(days=1))
+        older = habit_state(self.user, draft)
+        draft.completion_dates.remove(today - timedelta(days=1))
+        draft.completion_dates.append(today)
+        newer = habit_state(self.user, draft)
+        self.assertEqual(habit_db.merge_habit_states(older, newer)[7], ([today.strftime("%Y-%m-%d")], []))
+        print(f"✓ Appended events verified!")
+
+        # Replay rebuilds the stored completions and streaks
+        # --------------------------------------------------
+        replayed = replay_habit(self.user.user_id, "Test Habit")
+        self.db.load_habits(self.user)
+        stored = self.user.habits[0]
+        self.assertEqual(replayed.completion_dates, stored.completion_dates)
+        self.assertEqual(replayed.streaks.current_streak, stored.streaks.current_streak)
+        self.assertEqual(replayed.streaks.longest_streak, stored.streaks.longest_streak)
+        self.assertEqual(replayed.streaks.broken_streak_lengths, stored.streaks.broken_streak_lengths)
+        self.assertEqual(diverged_habits(), [])
+        print(f"✓ Replay from the log verified!")
+
+        # Snapshots bound the replay; pruning keeps the state
+        # ---------------------------------------------------
+        self.assertEqual(take_snapshots(prune=True), 1)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM habit_events"), [(0,)])
+        self.db.remove_completion(self.user, stored, today)
+        self.assertEqual(self.query("SELECT event FROM habit_events"), [("uncompleted",)]) # The whole tail
+        replayed = replay_habit(self.user.user_id, "Test Habit")
+        self.assertEqual(len(replayed.completion_dates), 3)
+        self.assertNotIn(today, replayed.completion_dates)
+        print(f"✓ Snapshot plus tail verified!")
+
+        # Habits created before the log was switched on get a baseline snapshot
+        # ----------------------------------------------------------------------
+        config.set_db_event_log(False)
+        legacy = Habit()
+        legacy.name = "Legacy Habit"
+        legacy.frequency = "weekly"
+        legacy.create_date()
+        self.db.save_habits(self.user, legacy)
+        config.set_db_event_log(True)
+        self.assertIsNone(replay_habit(self.user.user_id, "Legacy Habit"))
+        Database(self.db.db_filepath)
+        self.assertEqual([habit.name for habit in replay_user(self.user.user_id)], ["Test Habit", "Legacy Habit"])
+        print(f"✓ Baseline snapshots verified!")
+
+        # Recovery: corrupted and deleted rows are rewritten from the log
+        # ----------------------------------------------------------------
+        self.db.load_habits(self.user)
+        with patch("builtins.input", return_value="delete"), patch("db_and_managers.manager_habit_db.time.sleep"):
+            habit_db.delete_habit(self.user, self.user.habits[1])
+        connection = sqlite3.connect(self.db.db_filepath)
+        connection.execute("UPDATE habits SET completion_dates = '', completions_count = 0")
+        connection.execute("INSERT INTO habits (user_id, habit_name, frequency, creation_date) "
+                           "VALUES (?, 'Legacy Habit', 'weekly', '2024-01-01')", (self.user.user_id,))
+        connection.commit()
+        connection.close()
+        self.assertEqual(diverged_habits(), [(self.user.user_id, "Test Habit"), (self.user.user_id, "Legacy Habit")])
+
+        self.assertEqual(restore_aggregates(), 2)
+        self.assertEqual(diverged_habits(), [])
+        self.db.load_habits(self.user)
+        self.assertEqual([habit.name for habit in self.user.habits], ["Test Habit"])
+        self.assertEqual(len(self.user.habits[0].completion_dates), 3)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM streaks"), [(1,)])
+        print(f"✓ Restore from the log verified!")
+
+        # Deleting the user closes the history of all their habits
+        # --------------------------------------------------------
+        self.db.storage.delete_user(self.user)
+        self.assertEqual(replay_user(self.user.user_id), [])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM habits"), [(0,)])
+
+        # Interrupted and concurrent user deletions keep log and tables in step
+        heavy_user = User(username="Heavy User")
+        self.db.save_user(heavy_user)
+        for name in ["Habit A", "Habit B", "Habit C"]:
+            heavy_habit = Habit()
+            heavy_habit.name = name
+            heavy_habit.frequency = "daily"
+            heavy_habit.create_date()
+            self.db.save_habits(heavy_user, heavy_habit)
+
+        chunks = []
+
+        def interrupt_second_chunk(cursor, habit_ids):
+            chunks.append(habit_ids)
+            if len(chunks) == 2:
+                raise RuntimeError("Interrupted")
+            log_habits_deleted(cursor, habit_ids)
+
+        with patch("db_and_managers.db_structure.DELETE_CHUNK_SIZE", 1), \
+                patch("db_and_managers.manager_user_db.log_habits_deleted", interrupt_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.db.storage.delete_user(heavy_user)
+        self.assertEqual([habit.name for habit in replay_user(heavy_user.user_id)], ["Habit B", "Habit C"])
+        self.assertEqual(diverged_habits(), [])
+
+        def chunks_then_new_habit(*args, **kwargs):
+            deleted = delete_in_chunks(*args, **kwargs)
+            # Another writer adds a habit between the chunks and the user delete
+            late_habit = Habit()
+            late_habit.name = "Late Habit"
+            late_habit.frequency = "weekly"
+            late_habit.create_date()
+            habit_db.save_habits(heavy_user, late_habit)
+            return deleted
+
+        with patch("db_and_managers.manager_user_db.delete_in_chunks", chunks_then_new_habit):
+            self.db.storage.delete_user(heavy_user)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM habits"), [(0,)])
+        self.assertEqual(replay_user(heavy_user.user_id), [])
+        self.assertEqual(diverged_habits(), [])
+        print(f"✓ User deletion events verified!")
+
+class StorageConformance:
+    """Tests every storage backend has to pass (mixed into one test case per backend)."""
+
+    def make_backend(self):
+        """Creates the empty backend under test."""
+        raise NotImplementedError
+
+    def new_habit(self, backend, user, name, frequency="daily"):
+        """Stores a new habit of a user."""
+        habit = Habit()
+        habit.name = name
+        habit.frequency = frequency
+        habit.create_date()
+        backend.save_habits(user, habit)
+
+    def test_storage_conformance(self):
+        print(f"\n===================================")
+        print(f"Testing Storage Backend: {type(self.make_backend()).__name__}")
+        print("-----------------------------------")
+
+        backend = self.make_backend()
+        today = datetime.now().date()
+
+        # Users
+        # -----
+        users = [User(username=username) for username in ["Bob", "Alice", "Alina"]]
+        for user in users:
+            backend.save_user(user)
+        bob, alice, alina = users
+        self.assertEqual(len({user.user_id for user in users}), 3)
+        self.assertEqual(sorted(user.username for user in backend.load_users()), ["Alice", "Alina", "Bob"])
+        self.assertEqual(backend.load_user(alice.user_id).username, "Alice")
+        self.assertIsNone(backend.load_user(alina.user_id + 100))
+        self.assertTrue(backend.username_exists("Bob"))
+        self.assertTrue(backend.username_exists(" bob ")) # Normalized lookup
+        self.assertFalse(backend.username_exists("Carol"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            backend.save_user(User(username="Bob"))
+
+        self.assertEqual([user.username for user in backend.load_user_page(limit=2)], ["Alice", "Alina"])
+        self.assertEqual([user.username for user in backend.load_user_page(after="Alina")], ["Bob"])
+        self.assertEqual([user.username for user in backend.load_user_page(prefix="al")], ["Alice", "Alina"])
+        self.assertEqual([user.username for user in backend.load_user_page(after="Alice", prefix="Al")], ["Alina"])
+        print(f"✓ Users verified!")
+
+        # Habits with completions and streaks
+        # -----------------------------------
+        for name in ["Read", "Run"]:
+            self.new_habit(backend, alice, name)
+        self.new_habit(backend, bob, "Read", "weekly")
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.new_habit(backend, alice, "Run")
+        self.assertTrue(backend.habit_name_exists(alice, "Run"))
+        self.assertTrue(backend.habit_name_exists(alice, "run ")) # Normalized lookup
+        self.assertFalse(backend.habit_name_exists(alina, "Run"))
+
+        alice.habits = backend.load_habits(alice)
+        self.assertEqual([(habit.name, habit.frequency) for habit in alice.habits], [("Read", "daily"), ("Run", "daily")])
+        self.assertEqual([habit.completions_count for habit in alice.habits], [0, 0])
+
+        read = alice.habits[0]
+        read.completion_dates = [today - timedelta(days=offset) for offset in (5, 2, 1, 0)]
+        read.streaks.get_current_streak(read.frequency, read.completion_dates, sample_data=True)
+        backend.save_habits(alice)
+
+        reloaded = backend.load_habits(alice)[0]
+        self.assertEqual(list(reloaded.completion_dates), list(read.completion_dates))
+        self.assertEqual(reloaded.completions_count, 4)
+        self.assertEqual((reloaded.streaks.current_streak, reloaded.streaks.longest_streak), (3, 3))
+        self.assertEqual(reloaded.streaks.broken_streak_lengths, read.streaks.broken_streak_lengths)
+        print(f"✓ Habits, completions and streaks verified!")
+
+        # Batch writes
+        # ------------
+        bob.habits = backend.load_habits(bob)
+        states = []
+        for user, habit in [(alice, alice.habits[1]), (bob, bob.habits[0])]:
+            habit.completion_dates = [today]
+            habit.streaks.get_current_streak(habit.frequency, habit.completion_dates, sample_data=True)
+            states.append(habit_state(user, habit))
+        backend.save_habit_states(states)
+        self.assertEqual([habit.completions_count for habit in backend.load_habits(alice)], [4, 1])
+        self.assertEqual(backend.load_habits(bob)[0].streaks.current_streak, 1)
+        print(f"✓ Batch writes verified!")
+
+        # Transactions
+        # ------------
+        with self.assertRaises(RuntimeError):
+            with backend.transaction():
+                backend.save_user(User(username="Carol"))
+                with backend.transaction():
+                    self.new_habit(backend, alina, "Swim")
+                raise RuntimeError("Rolled back")
+        self.assertFalse(backend.username_exists("Carol"))
+        self.assertEqual(backend.load_habits(alina), [])
+
+        with backend.transaction():
+            self.new_habit(backend, alina, "Swim")
+        self.assertEqual([habit.name for habit in backend.load_habits(alina)], ["Swim"])
+        print(f"✓ Transactions verified!")
+
+        # Deletes
+        # -------
+        backend.delete_habit(alice, "Run")
+        self.assertEqual([habit.name for habit in backend.load_habits(alice)], ["Read"])
+        backend.delete_user(alice)
+        self.assertIsNone(backend.load_user(alice.user_id))
+        self.assertEqual(backend.load_habits(alice), [])
+        self.assertEqual([habit.name for habit in backend.load_habits(bob)], ["Read"])
+        print(f"✓ Deletes verified!")
+
+        # The Database facade on the backend
+        # ----------------------------------
+        db = Database(backend=self.make_backend())
+        carol = User(username="Carol")
+        db.save_user(carol)
+        habit = Habit()
+        habit.name = "Stretch"
+        habit.frequency = "daily"
+        habit.create_date()
+        db.save_habits(carol, habit)
+        db.load_habits(carol)
+
+        added = db.add_completion_range(carol, carol.habits[0], today - timedelta(days=6), today)
+        self.assertEqual(len(added), 7)
+        self.assertEqual(db.load_habits(carol)[0].streaks.current_streak, 7)
+        db.close()
+        print(f"✓ Database facade verified!")
+
+class TestSQLiteBackend(StorageConformance, DatabaseTestCase):
+    """Runs the storage conformance tests against the SQLite backend (a new temporary db file)."""
+
+    def make_backend(self):
+        return SQLiteBackend(os.path.join(self.db_dir.name, f"conformance_{len(os.listdir(self.db_dir.name))}.db"))
+
+class TestMemoryBackend(StorageConformance, unittest.TestCase):
+    """Runs the storage conformance tests against the in-memory backend."""
+
+    def make_backend(self):
+        return MemoryBackend()
+
+    def test_backend_modes(self):
+        # Write-behind and in-memory mode belong to the db file
+        with self.assertRaises(ValueError):
+            Database(backend=MemoryBackend(), write_behind=True)
+
+class TestShardedBackend(StorageConformance, DatabaseTestCase):
+    """Runs the storage conformance tests against the sharded backend, and tests routing and moves."""
+
+    def make_backend(self):
+        self.sharded_filepath = os.path.join(self.db_dir.name, f"sharded_{len(os.listdir(self.db_dir.name))}.db")
+        backend = ShardedBackend(self.sharded_filepath, shards=3)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_sharding(self):
+        print(f"\n===================================")
+        print("Testing Sharding")
+        print("-----------------------------------")
+
+        backend = self.make_backend()
+        today = datetime.now().date()
+
+        # Users are placed by username hash, every shard keeps its own users
+        # ------------------------------------------------------------------
+        users = [User(username=f"User {nr:02}") for nr in range(12)]
+        for user in users:
+            backend.save_user(user)
+            self.new_habit(backend, user, "Read")
+        self.assertEqual(sum(backend.shard_sizes()), 12)
+        self.assertGreater(min(backend.shard_sizes()), 0)
+        for user in users:
+            connection = sqlite3.connect(backend.shard_filepaths[backend.shard_of(user.user_id)])
+            self.assertEqual(connection.execute("SELECT username FROM users WHERE id = ?", (user.user_id,)).fetchall(),
+                             [(user.username,)])
+            connection.close()
+        print(f"✓ Routing by username hash verified!")
+
+        # Scatter-gather reads across shards
+        # ----------------------------------
+        db = Database(backend=backend)
+        for user in users[:3]:
+            db.load_habits(user)
+            db.add_completion_range(user, user.habits[0], today - timedelta(days=4), today)
+        statistics = backend.statistics()
+        self.assertEqual((statistics["users"], statistics["habits"], statistics["completions"]), (12, 12, 15))
+        self.assertEqual(statistics["by_frequency"], {"daily": {"habits": 12, "completions": 15}})
+        self.assertEqual(statistics["longest_streak"][2], 5)
+        self.assertEqual([user.username for user in backend.load_user_page(after="User 03", limit=3)],
+                         ["User 04", "User 05", "User 06"])
+        print(f"✓ Scatter-gather statistics and user pages verified!")
+
+        # Online move while another router (with the old route cached) keeps writing the user's habit
+        # ---------------------------------------------------------------------------------------------
+        mover = users[0]
+        source = backend.shard_of(mover.user_id)
+        target = (source + 1) % 3
+        router = ShardedBackend(self.sharded_filepath, shards=3)
+        self.addCleanup(router.close)
+        self.assertEqual(router.shard_of(mover.user_id), source)
+
+        def complete(offsets):
+            writer = User(user_id=mover.user_id, username=mover.username)
+            for offset in offsets:
+                habit = router.load_habits(writer)[0]
+                habit.completion_dates.append(today - timedelta(days=offset))
+                router.save_habit_states([habit_state(writer, habit)])
+
+        with ThreadPoolExecutor(max_workers=1) as writers:
+            writing = writers.submit(complete, range(10, 40))
+            self.assertTrue(backend.move_user(mover.user_id, target))
+            writing.result()
+        complete([40]) # Whenever the writer finished: this write follows the directory
+
+        self.assertEqual(router.shard_of(mover.user_id), target)
+        self.assertEqual(backend.load_user(mover.user_id).username, mover.username)
+        self.assertEqual(len(backend.load_habits(mover)[0].completion_dates), 5 + 31) # No write lost
+        connection = sqlite3.connect(backend.shard_filepaths[source])
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM users WHERE id = ?", (mover.user_id,)).fetchall(),
+                         [(0,)])
+        connection.close()
+        print(f"✓ Online move during writes verified!")
+
+        # Rebalancing after adding shards, and importing an unsharded db
+        # ---------------------------------------------------------------
+        backend.close()
+        router.close()
+        grown = ShardedBackend(self.sharded_filepath, shards=5)
+        self.addCleanup(grown.close)
+        self.assertEqual(grown.shard_sizes()[3:], [0, 0])
+        moves = grown.plan_rebalance()
+        self.assertEqual(grown.rebalance(), len(moves))
+        self.assertLessEqual(max(grown.shard_sizes()) - min(grown.shard_sizes()), 1)
+        self.assertEqual(len(grown.load_users()), 12)
+        self.assertEqual(sum(len(grown.load_habits(user)) for user in users), 12)
+
+        imported = ShardedBackend(self.db.db_filepath, shards=2)
+        self.addCleanup(imported.close)
+        self.assertEqual(imported.import_db(self.db.db_filepath), 1)
+        self.assertEqual(imported.import_db(self.db.db_filepath), 0)
+        self.assertEqual([habit.name for habit in imported.load_habits(self.user)], ["Test Habit"])
+        print(f"✓ Rebalancing and import verified!")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,18 +2,39 @@
 Unit testing module for Streaks and Analytics on submission data.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
 
+import config
 from core.analytics import Analytics
 from db_and_managers.database import Database
+from db_and_managers.name_cache import close_name_caches
 
-class TestStreaksSampleData(unittest.TestCase):
+class SampleDataTestCase(unittest.TestCase):
+    """Base test case which opens a temporary copy of the submission db (opening a db upgrades its tables)."""
+
+    def setUp(self):
+        self.previous_filepath = config.DB_FILEPATH
+        self.db_dir = tempfile.TemporaryDirectory()
+        db_filepath = os.path.join(self.db_dir.name, "habit_tracker.db")
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "habit_tracker.db"), db_filepath)
+        self.db = Database(db_filepath)
+
+    def tearDown(self):
+        # Restore the db filepath for other test modules
+        config.set_db_filepath(self.previous_filepath)
+        close_name_caches()
+        self.db_dir.cleanup()
+
+class TestStreaksSampleData(SampleDataTestCase):
     """Tests streaks functions with submission sample data."""
     def test_streaks_with_sample_data(self):
         print(f"\n==========================================")
         print("Testing Streaks for Submission Sample Data")
         print("------------------------------------------")
-        db = Database()
+        db = self.db
         users = db.load_users()
 
         # Find SampleUser in the list -> it exists as per task requirement
@@ -64,14 +85,14 @@ class TestStreaksSampleData(unittest.TestCase):
                 self.assertEqual(habit.streaks.broken_streak_lengths, expected["broken_streak_lengths"])
                 print(f"✓ Broken streak lengths for sample habit {habit.name} verified!")
 
-class TestAnalyticsSampleData(unittest.TestCase):
+class TestAnalyticsSampleData(SampleDataTestCase):
     """Tests analytics functions with submission sample data."""
 
     def test_analytics_with_sample_data(self):
         print(f"\n============================================")
         print("Testing Analytics for Submission Sample Data")
         print("--------------------------------------------")
-        db = Database()
+        db = self.db
         users = db.load_users()
 
         # Find SampleUser in the list -> it exists as per task requirement